@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+A local stand-in of the Enedis DataConnect API used by the benchmarks.
+It serves the OAuth2 tokens, the daily consumption, the load curve, the daily max power and the contracts with deterministic values,
+with a configurable latency and rates of errors and throttled requests (HTTP 429).
+"""
+import asyncio
+import json
+import logging
+import random
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+TOKEN_PATH: str = '/oauth2/v3/token'
+DAILY_CONSUMPTION_PATH: str = '/metering_data_dc/v5/daily_consumption'
+CONSUMPTION_LOAD_CURVE_PATH: str = '/metering_data_clc/v5/consumption_load_curve'
+DAILY_CONSUMPTION_MAX_POWER_PATH: str = '/metering_data_dcmp/v5/daily_consumption_max_power'
+CONTRACTS_PATH: str = '/customers_upc/v5/usage_points/contracts'
+DATE_FORMAT: str = '%Y-%m-%d'
+DATE_TIME_FORMAT: str = '%Y-%m-%d %H:%M:%S'
+TOKEN_LIFETIME: int = 3600
+
+
+def _value(pdl: str, key: str, low: int, high: int) -> int:
+    """
+    Return a deterministic value, so the same period is served with the same content
+    :param pdl: the PDL
+    :param key: the key of the reading
+    :param low: the minimum value
+    :param high: the maximum value
+    :return: the value
+    """
+    return low + zlib.crc32(f"{pdl}{key}".encode()) % (high - low)
+
+
+def _dates(start: str, end: str) -> list[date]:
+    """
+    Return the days of a period, the data of the current day is never available
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive)
+    :return: the days
+    """
+    first: date = datetime.strptime(start, DATE_FORMAT).date()
+    last: date = min(datetime.strptime(end, DATE_FORMAT).date(), date.today())
+    return [first + timedelta(days=i) for i in range((last - first).days)]
+
+
+def _meter_reading(pdl: str, start: str, end: str, unit: str, readings: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Build the envelope of the readings
+    :param pdl: the PDL
+    :param start: the start date
+    :param end: the end date
+    :param unit: the unit of the values
+    :param readings: the readings
+    :return: the response
+    """
+    return {
+        'meter_reading': {
+            'usage_point_id': pdl,
+            'start': start,
+            'end': end,
+            'quality': 'BRUT',
+            'reading_type': {'measurement_kind': 'energy' if unit == 'Wh' else 'power', 'unit': unit, 'aggregate': 'sum' if unit == 'Wh' else 'average'},
+            'interval_reading': readings
+        }
+    }
+
+
+def build_daily_consumption(pdl: str, start: str, end: str) -> dict[str, Any]:
+    """
+    Build a daily consumption response
+    :param pdl: the PDL
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive)
+    :return: the response, values in Wh
+    """
+    readings: list[dict[str, Any]] = [{'value': str(_value(pdl, d.isoformat(), 4000, 30000)), 'date': d.strftime(DATE_FORMAT)} for d in _dates(start, end)]
+    return _meter_reading(pdl, start, end, 'Wh', readings)
+
+
+def build_load_curve(pdl: str, start: str, end: str) -> dict[str, Any]:
+    """
+    Build a load curve response: the average power in W of each 30 minutes interval, dated at the end of the interval
+    :param pdl: the PDL
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive)
+    :return: the response
+    """
+    readings: list[dict[str, Any]] = []
+    for day in _dates(start, end):
+        midnight: datetime = datetime.combine(day, datetime.min.time())
+        for i in range(1, 49):
+            time: str = (midnight + timedelta(minutes=30 * i)).strftime(DATE_TIME_FORMAT)
+            readings.append({'value': str(_value(pdl, time, 100, 6000)), 'date': time, 'interval_length': 'PT30M', 'measure_type': 'B'})
+    return _meter_reading(pdl, start, end, 'W', readings)
+
+
+def build_max_power(pdl: str, start: str, end: str) -> dict[str, Any]:
+    """
+    Build a daily maximum power response
+    :param pdl: the PDL
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive)
+    :return: the response, values in VA
+    """
+    readings: list[dict[str, Any]] = []
+    for day in _dates(start, end):
+        time: datetime = datetime.combine(day, datetime.min.time()) + timedelta(minutes=_value(pdl, day.isoformat(), 0, 1440))
+        readings.append({'value': str(_value(pdl, time.isoformat(), 1000, 9000)), 'date': time.strftime(DATE_TIME_FORMAT)})
+    return _meter_reading(pdl, start, end, 'VA', readings)
+
+
+def build_contracts(pdl: str) -> dict[str, Any]:
+    """
+    Build a contracts response
+    :param pdl: the PDL
+    :return: the response
+    """
+    return {
+        'customer': {
+            'customer_id': '1358019319',
+            'usage_points': [{
+                'usage_point': {'usage_point_id': pdl, 'usage_point_status': 'com', 'meter_type': 'AMM'},
+                'contracts': {
+                    'segment': 'C5',
+                    'subscribed_power': '9 kVA',
+                    'last_activation_date': '2020-01-01+01:00',
+                    'distribution_tariff': 'BTINFCUST',
+                    'offpeak_hours': 'HC (22H00-6H00)',
+                    'contract_status': 'SERVC'
+                }
+            }]
+        }
+    }
+
+
+class FakeEnedisServer:  # pylint: disable=too-many-instance-attributes
+    """
+    The fake server, started on a free port of the loopback interface
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1, seed: int = 0):
+        """
+        Constructor
+        :param latency: the latency added to each response in seconds
+        :param error_rate: the ratio of the requests answered by an HTTP 500
+        :param throttle_rate: the ratio of the requests answered by an HTTP 429
+        :param retry_after: the delay in seconds given with the HTTP 429
+        :param seed: the seed of the random generator deciding the errors
+        """
+        self._latency: float = latency
+        self._error_rate: float = error_rate
+        self._throttle_rate: float = throttle_rate
+        self._retry_after: int = retry_after
+        self._random: random.Random = random.Random(seed)
+        self._calls: dict[str, int] = {}
+        self._errors: int = 0
+        self._throttled: int = 0
+        self._not_modified: int = 0
+        self._bytes_sent: int = 0
+        # noinspection PyTypeChecker
+        self._runner: web.AppRunner = None
+        # noinspection PyTypeChecker
+        self._url: str = None
+
+    def get_url(self) -> str:
+        """
+        Return the URL of the server
+        :return: the URL
+        """
+        return self._url
+
+    def get_calls(self) -> dict[str, int]:
+        """
+        Return the number of requests received by path
+        :return: the numbers of requests
+        """
+        return dict(self._calls)
+
+    def get_metrics(self) -> dict[str, Any]:
+        """
+        Return the counters of the server
+        :return: the counters
+        """
+        return {
+            'calls': self.get_calls(),
+            'total_calls': sum(self._calls.values()),
+            'errors': self._errors,
+            'throttled': self._throttled,
+            'not_modified': self._not_modified,
+            'bytes_sent': self._bytes_sent
+        }
+
+    def reset_metrics(self) -> None:
+        """
+        Reset the counters
+        """
+        self._calls = {}
+        self._errors = 0
+        self._throttled = 0
+        self._not_modified = 0
+        self._bytes_sent = 0
+
+    async def start(self) -> str:
+        """
+        Start the server
+        :return: the URL of the server
+        """
+        app: web.Application = web.Application()
+        app.router.add_post(TOKEN_PATH, self._handle_token)
+        app.router.add_get(DAILY_CONSUMPTION_PATH, self._handle_daily_consumption)
+        app.router.add_get(CONSUMPTION_LOAD_CURVE_PATH, self._handle_load_curve)
+        app.router.add_get(DAILY_CONSUMPTION_MAX_POWER_PATH, self._handle_max_power)
+        app.router.add_get(CONTRACTS_PATH, self._handle_contracts)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site: web.TCPSite = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port: int = self._runner.addresses[0][1]
+        self._url = f"http://127.0.0.1:{port}"
+        _LOGGER.debug("Fake server listening on %s", self._url)
+        return self._url
+
+    async def stop(self) -> None:
+        """
+        Stop the server
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            # noinspection PyTypeChecker
+            self._runner = None
+
+    async def _before(self, request: web.Request) -> web.Response | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Count the request, apply the latency and decide if the request fails
+        :param request: the request
+        :return: the error response or None
+        """
+        self._calls[request.path] = self._calls.get(request.path, 0) + 1
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+        draw: float = self._random.random()
+        if draw < self._throttle_rate:
+            self._throttled += 1
+            return web.json_response({'error': 'too_many_requests'}, status=429, headers={'Retry-After': str(self._retry_after)})
+        if draw < self._throttle_rate + self._error_rate:
+            self._errors += 1
+            return web.json_response({'error': 'internal_server_error'}, status=500)
+        return None
+
+    def _respond(self, request: web.Request, payload: dict[str, Any]) -> web.Response:
+        """
+        Send a payload with its entity tag, or an HTTP 304 if the client has the same content
+        :param request: the request
+        :param payload: the payload
+        :return: the response
+        """
+        body: bytes = json.dumps(payload).encode()
+        etag: str = f'"{zlib.crc32(body):08x}"'
+        if request.headers.get('If-None-Match') == etag:
+            self._not_modified += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        self._bytes_sent += len(body)
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    async def _handle_token(self, request: web.Request) -> web.Response:
+        """
+        Serve an access token
+        :param request: the request
+        :return: the response
+        """
+        error: web.Response = await self._before(request)
+        if error is not None:
+            return error
+        form = await request.post()
+        if not form.get('client_id') or not form.get('client_secret'):
+            return web.json_response({'error': 'invalid_client'}, status=401)
+        return web.json_response({'access_token': f"token-{self._random.getrandbits(64):016x}", 'token_type': 'Bearer', 'expires_in': TOKEN_LIFETIME})
+
+    async def _handle_daily_consumption(self, request: web.Request) -> web.Response:
+        """
+        Serve the daily consumption
+        :param request: the request
+        :return: the response
+        """
+        error: web.Response = await self._before(request)
+        if error is not None:
+            return error
+        return self._respond(request, build_daily_consumption(request.query['usage_point_id'], request.query['start'], request.query['end']))
+
+    async def _handle_load_curve(self, request: web.Request) -> web.Response:
+        """
+        Serve the load curve
+        :param request: the request
+        :return: the response
+        """
+        error: web.Response = await self._before(request)
+        if error is not None:
+            return error
+        return self._respond(request, build_load_curve(request.query['usage_point_id'], request.query['start'], request.query['end']))
+
+    async def _handle_max_power(self, request: web.Request) -> web.Response:
+        """
+        Serve the daily maximum power
+        :param request: the request
+        :return: the response
+        """
+        error: web.Response = await self._before(request)
+        if error is not None:
+            return error
+        return self._respond(request, build_max_power(request.query['usage_point_id'], request.query['start'], request.query['end']))
+
+    async def _handle_contracts(self, request: web.Request) -> web.Response:
+        """
+        Serve the contract of the usage point
+        :param request: the request
+        :return: the response
+        """
+        error: web.Response = await self._before(request)
+        if error is not None:
+            return error
+        return self._respond(request, build_contracts(request.query['usage_point_id']))
@@ -0,0 +1,448 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The benchmarks of the custom component, run against a local stand-in of the API (see fake_enedis_server).
+It measures the import time of the component, the decoding and aggregation throughput and, for each number of PDL, the latency of the refreshes of the coordinators,
+the number of API calls by refresh and the memory used by PDL. The results are written as JSON, so they can be compared between versions.
+
+Usage: python benchmarks/run_benchmarks.py --pdls 1,10,100 --output results.json
+Home Assistant and aiohttp must be installed, the recorder is not started so the statistics are computed but not sent.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics as stats
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import date, timedelta
+from inspect import signature
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any
+
+REPOSITORY_PATH: Path = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPOSITORY_PATH))
+sys.path.insert(0, str(REPOSITORY_PATH.joinpath('benchmarks')))
+
+# pylint: disable=wrong-import-position
+import aiohttp
+from fake_enedis_server import FakeEnedisServer, build_load_curve, TOKEN_PATH
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.config_entries import ConfigEntry, SOURCE_USER
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import frame
+
+from custom_components.ha_enedis_dataconnect import enedis_client, token_manager
+from custom_components.ha_enedis_dataconnect.aggregates import PrefixIndex
+from custom_components.ha_enedis_dataconnect.const import DOMAIN, DEFAULT_REDIRECT_URI, SCAN_INTERVAL_KEY, MIN_SCAN_INTERVAL
+from custom_components.ha_enedis_dataconnect.coordinators import EnedisDataUpdateCoordinator
+from custom_components.ha_enedis_dataconnect.enedis_client import EnedisClient
+from custom_components.ha_enedis_dataconnect.long_term_statistics import EnedisStatisticsImporter
+from custom_components.ha_enedis_dataconnect.models import MeterReadings
+from custom_components.ha_enedis_dataconnect.rate_limiter import DATA_RATE_LIMITERS, TokenBucketLimiter
+from custom_components.ha_enedis_dataconnect.readings_decoder import ReadingsDecoder
+from custom_components.ha_enedis_dataconnect.token_manager import DATA_TOKEN_MANAGER, EnedisTokenManager
+from custom_components.ha_enedis_dataconnect.utils import get_numpy
+
+_LOGGER = logging.getLogger(__name__)
+CLIENT_ID: str = 'benchmark-client'
+CLIENT_SECRET: str = 'benchmark-secret'
+FIRST_PDL: int = 10000000000000
+CHUNK_SIZE: int = 16 * 1024
+INTEGRATION_PACKAGE: str = 'custom_components.ha_enedis_dataconnect'
+# the modules already imported by Home Assistant when it loads the component, their import time is not counted
+PRELOADED_MODULES: tuple[str, ...] = (
+    'aiohttp',
+    'voluptuous',
+    'homeassistant.core',
+    'homeassistant.config_entries',
+    'homeassistant.helpers.update_coordinator',
+    'homeassistant.helpers.restore_state',
+    'homeassistant.components.sensor',
+    'homeassistant.components.recorder.statistics',
+    'homeassistant.components.websocket_api'
+)
+
+
+class OfflineStatisticsImporter(EnedisStatisticsImporter):
+    """
+    The importer used while the recorder is not started: the statistics are computed and counted but not sent
+    """
+
+    def __init__(self, *args):
+        """
+        Constructor
+        :param args: the arguments of the importer
+        """
+        super().__init__(*args)
+        self._count: int = 0
+
+    def get_count(self) -> int:
+        """
+        Return the number of statistics computed
+        :return: the number of statistics
+        """
+        return self._count
+
+    def _add(self, metadata: StatisticMetaData, statistics: list[StatisticData]) -> None:
+        """
+        Count the statistics
+        :param metadata: the metadata
+        :param statistics: the statistics
+        """
+        self._count += len(statistics)
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    """
+    Return a percentile of the values
+    :param values: the values
+    :param percent: the percentile
+    :return: the value
+    """
+    if len(values) == 1:
+        return values[0]
+    return stats.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def _summarize(durations: list[float]) -> dict[str, float]:
+    """
+    Return the distribution of durations in milliseconds
+    :param durations: the durations in seconds
+    :return: the distribution
+    """
+    return {
+        'min_ms': round(min(durations) * 1000, 3),
+        'p50_ms': round(_percentile(durations, 50) * 1000, 3),
+        'p95_ms': round(_percentile(durations, 95) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3)
+    }
+
+
+def benchmark_decode(days: int, iterations: int) -> dict[str, Any]:
+    """
+    Measure the streaming decoding of a load curve response
+    :param days: the number of days of the response
+    :param iterations: the number of times the response is decoded
+    :return: the results
+    """
+    end: date = date.today()
+    body: bytes = json.dumps(build_load_curve(str(FIRST_PDL), (end - timedelta(days=days)).isoformat(), end.isoformat())).encode()
+    chunks: list[bytes] = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+    count: int = 0
+    started: float = time.perf_counter()
+    for _ in range(iterations):
+        decoder: ReadingsDecoder = ReadingsDecoder(load_curve=True)
+        for chunk in chunks:
+            decoder.feed(chunk)
+        count += len(decoder.close())
+    elapsed: float = time.perf_counter() - started
+    return {
+        'days': days,
+        'response_bytes': len(body),
+        'readings': count // iterations,
+        'megabytes_per_second': round(len(body) * iterations / elapsed / 1e6, 3),
+        'readings_per_second': round(count / elapsed)
+    }
+
+
+def benchmark_aggregate(days: int, queries: int) -> dict[str, Any]:
+    """
+    Measure the building of the hourly index of a load curve and the queries of windows
+    :param days: the number of days of the load curve
+    :param queries: the number of windows queried
+    :return: the results
+    """
+    readings: MeterReadings = MeterReadings()
+    for i in range(days * 48):
+        readings.append(i * 1800, 100 + i % 900)
+    index: PrefixIndex = PrefixIndex(3600)
+    started: float = time.perf_counter()
+    index.update(readings.timestamps, readings.values)
+    build: float = time.perf_counter() - started
+    # the last day is written again, as by a poll
+    started = time.perf_counter()
+    index.update(readings.timestamps, readings.values, since=(days - 1) * 86400)
+    increment: float = time.perf_counter() - started
+    span: int = days * 86400
+    started = time.perf_counter()
+    for i in range(queries):
+        start: int = (i * 7919 * 3600) % span
+        index.get_total(start, start + 30 * 86400)
+    query: float = time.perf_counter() - started
+    return {
+        'days': days,
+        'readings': len(readings),
+        'build_ms': round(build * 1000, 3),
+        'increment_ms': round(increment * 1000, 3),
+        'queries_per_second': round(queries / query)
+    }
+
+
+def benchmark_import(iterations: int) -> dict[str, Any]:
+    """
+    Measure the import of the component by a new interpreter in which the modules of Home Assistant are already imported
+    :param iterations: the number of interpreters started, the fastest import is kept
+    :return: the results
+    """
+    code: str = (
+        f"import importlib, sys\n"
+        f"for name in {PRELOADED_MODULES!r}:\n"
+        f"    importlib.import_module(name)\n"
+        f"before = set(sys.modules)\n"
+        f"import {INTEGRATION_PACKAGE}.sensor, {INTEGRATION_PACKAGE}.config_flow\n"
+        f"print(len(set(sys.modules) - before), 'numpy' in sys.modules)"
+    )
+    durations: list[int] = []
+    modules: int = 0
+    numpy_loaded: bool = False
+    for _ in range(iterations):
+        process: subprocess.CompletedProcess = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True)
+        # the lines of -X importtime: self [us] | cumulative [us] | module indented by depth, the imports of the top level are summed
+        cumulative: int = 0
+        for line in process.stderr.splitlines():
+            fields: list[str] = line.split('|')
+            if len(fields) == 3 and fields[2].startswith(' ' + INTEGRATION_PACKAGE.split('.', maxsplit=1)[0]):
+                cumulative += int(fields[1])
+        durations.append(cumulative)
+        count, loaded = process.stdout.split()
+        modules, numpy_loaded = int(count), loaded == 'True'
+    return {
+        'import_ms': round(min(durations) / 1000, 3),
+        'modules_imported': modules,
+        'numpy_imported': numpy_loaded
+    }
+
+
+def _create_hass(config_dir: str) -> HomeAssistant:
+    """
+    Create a Home Assistant instance using a temporary configuration directory, with the helpers set up by its bootstrap and used by the component
+    :param config_dir: the configuration directory
+    :return: the instance
+    """
+    try:
+        hass: HomeAssistant = HomeAssistant(config_dir)
+    except TypeError:
+        # versions before 2024.3
+        hass = HomeAssistant()  # pylint: disable=no-value-for-parameter
+        hass.config.config_dir = config_dir
+    frame.async_setup(hass)
+    return hass
+
+
+def _create_config_entry(data: dict[str, Any]) -> ConfigEntry:
+    """
+    Create the configuration entry given to the coordinators, it is not added to the configuration entries of Home Assistant
+    :param data: the data of the entry
+    :return: the entry
+    """
+    arguments: dict[str, Any] = {
+        'data': data,
+        'discovery_keys': MappingProxyType({}),
+        'domain': DOMAIN,
+        'entry_id': 'benchmark',
+        'minor_version': 1,
+        'options': {},
+        'source': SOURCE_USER,
+        'subentries_data': None,
+        'title': 'Benchmark',
+        'unique_id': None,
+        'version': 1
+    }
+    # the arguments of the constructor change between the versions of Home Assistant
+    parameters: set[str] = set(signature(ConfigEntry).parameters)
+    return ConfigEntry(**{k: v for k, v in arguments.items() if k in parameters})
+
+
+async def _async_timed(function: Callable[[], Awaitable[Any]]) -> float:
+    """
+    Run a coroutine and return its duration
+    :param function: the function returning the coroutine
+    :return: the duration in seconds
+    """
+    started: float = time.perf_counter()
+    await function()
+    return time.perf_counter() - started
+
+
+async def async_benchmark_refresh(pdl_count: int, refreshes: int, server: FakeEnedisServer, rate: float, trace_memory: bool) -> dict[str, Any]:
+    """
+    Measure the refreshes of the coordinators of several PDL sharing a client, as in a configuration entry
+    :param pdl_count: the number of PDL
+    :param refreshes: the number of refreshes, the first one fetches the whole history and the next ones use the caches
+    :param server: the fake server
+    :param rate: the number of requests per second allowed by the limiter of the application
+    :param trace_memory: true to measure the memory allocated, which slows down the refreshes
+    :return: the results
+    """
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass: HomeAssistant = _create_hass(config_dir)
+        hass.data[DATA_RATE_LIMITERS] = {CLIENT_ID: TokenBucketLimiter(rate, max(1, int(rate)))}
+        # the shared session of Home Assistant needs the helpers of its bootstrap, the token manager uses its own session
+        session: aiohttp.ClientSession = aiohttp.ClientSession()
+        manager: EnedisTokenManager = EnedisTokenManager(hass, session)
+        hass.data[DATA_TOKEN_MANAGER] = manager
+        if trace_memory:
+            tracemalloc.start()
+        allocated: int = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        client: EnedisClient = EnedisClient(hass, CLIENT_ID, CLIENT_SECRET, DEFAULT_REDIRECT_URI)
+        entry: ConfigEntry = _create_config_entry({SCAN_INTERVAL_KEY: MIN_SCAN_INTERVAL})
+        coordinators: list[EnedisDataUpdateCoordinator] = []
+        importers: list[OfflineStatisticsImporter] = []
+        for i in range(pdl_count):
+            pdl: str = str(FIRST_PDL + i)
+            coordinator: EnedisDataUpdateCoordinator = EnedisDataUpdateCoordinator(hass, entry, client, pdl)
+            importer: OfflineStatisticsImporter = OfflineStatisticsImporter(hass, pdl, coordinator.get_history_store(), coordinator.get_fetch_state())
+            # noinspection PyProtectedMember
+            coordinator._statistics_importer = importer  # pylint: disable=protected-access
+            coordinators.append(coordinator)
+            importers.append(importer)
+        await asyncio.gather(*(c.async_setup() for c in coordinators))
+        results: list[dict[str, Any]] = []
+        memory: int = 0
+        try:
+            for i in range(refreshes):
+                server.reset_metrics()
+                started: float = time.perf_counter()
+                durations: list[float] = await asyncio.gather(*(_async_timed(c.async_refresh) for c in coordinators))
+                elapsed: float = time.perf_counter() - started
+                metrics: dict[str, Any] = server.get_metrics()
+                results.append({
+                    'refresh': i,
+                    'wall_time_ms': round(elapsed * 1000, 3),
+                    'latency': _summarize(durations),
+                    'failed_pdls': sum(1 for c in coordinators if not c.last_update_success),
+                    'api_calls': metrics['total_calls'],
+                    'api_calls_per_pdl': round(metrics['total_calls'] / pdl_count, 3),
+                    'token_calls': metrics['calls'].get(TOKEN_PATH, 0),
+                    'server': metrics
+                })
+                if trace_memory and i == 0:
+                    memory = tracemalloc.get_traced_memory()[0] - allocated
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            await asyncio.gather(*(c.async_shutdown() for c in coordinators))
+            await client.close()
+            await manager.async_shutdown()
+            await session.close()
+            await hass.async_stop(force=True)
+    result: dict[str, Any] = {
+        'pdls': pdl_count,
+        'refreshes': results,
+        'statistics': sum(i.get_count() for i in importers),
+        'limiter': hass.data[DATA_RATE_LIMITERS][CLIENT_ID].get_metrics()
+    }
+    if trace_memory:
+        result['memory_bytes_per_pdl'] = memory // pdl_count
+    return result
+
+
+async def async_main(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    Run the benchmarks
+    :param args: the arguments of the command line
+    :return: the results
+    """
+    server: FakeEnedisServer = FakeEnedisServer(args.latency, args.error_rate, args.throttle_rate, args.retry_after, args.seed)
+    url: str = await server.start()
+    # the client and the token manager call the fake server instead of the API
+    enedis_client.ENDPOINT_URL = url
+    token_manager.ENDPOINT_TOKEN_URL = url + TOKEN_PATH[:-len('token')]
+    scenarios: list[dict[str, Any]] = []
+    try:
+        for pdl_count in args.pdls:
+            _LOGGER.info("Benchmarking the refresh of %s PDL", pdl_count)
+            scenario: dict[str, Any] = await async_benchmark_refresh(pdl_count, args.refreshes, server, args.rate, False)
+            if not args.no_memory:
+                scenario['memory_bytes_per_pdl'] = (await async_benchmark_refresh(pdl_count, 1, server, args.rate, True))['memory_bytes_per_pdl']
+            scenarios.append(scenario)
+    finally:
+        await server.stop()
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': get_numpy() is not None
+        },
+        'config': {
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'rate': args.rate,
+            'refreshes': args.refreshes
+        },
+        'import': benchmark_import(args.import_iterations),
+        'decode': benchmark_decode(args.decode_days, args.iterations),
+        'aggregate': benchmark_aggregate(args.aggregate_days, args.iterations * 1000),
+        'scenarios': scenarios
+    }
+
+
+def get_failures(results: dict[str, Any]) -> list[str]:
+    """
+    Return the failures of the scenarios: the results of a scenario are meaningless if a PDL failed to refresh or if the API was never called
+    :param results: the results
+    :return: the descriptions of the failures
+    """
+    failures: list[str] = []
+    for scenario in results['scenarios']:
+        for refresh in scenario['refreshes']:
+            if refresh['failed_pdls'] > 0:
+                failures.append(f"{refresh['failed_pdls']} of {scenario['pdls']} PDL failed on refresh {refresh['refresh']}")
+        if sum(r['api_calls'] for r in scenario['refreshes']) == 0:
+            failures.append(f"No API call with {scenario['pdls']} PDL")
+    return failures
+
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Parse the command line
+    :return: the arguments
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdls', type=lambda v: [int(p) for p in v.split(',')], default=[1, 10, 100], help='the numbers of PDL, comma-separated')
+    parser.add_argument('--refreshes', type=int, default=3, help='the number of refreshes by number of PDL')
+    parser.add_argument('--latency', type=float, default=0.05, help='the latency of the fake server in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='the ratio of requests failing with an HTTP 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='the ratio of requests rejected with an HTTP 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='the delay in seconds given with the HTTP 429')
+    parser.add_argument('--rate', type=float, default=1000.0, help='the requests per second allowed by the limiter, 5 for the quota of the API')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the errors of the fake server')
+    parser.add_argument('--decode-days', type=int, default=7, help='the days of the load curve decoded')
+    parser.add_argument('--aggregate-days', type=int, default=365, help='the days of the load curve indexed')
+    parser.add_argument('--import-iterations', type=int, default=5, help='the interpreters started to measure the import of the component')
+    parser.add_argument('--iterations', type=int, default=20, help='the iterations of the decoding benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure the memory by PDL')
+    parser.add_argument('--output', type=Path, help='the JSON file receiving the results, the standard output by default')
+    parser.add_argument('--verbose', action='store_true', help='log the progress')
+    return parser.parse_args()
+
+
+def main() -> None:
+    """
+    The entry point, the exit status is 1 if a scenario failed
+    """
+    args: argparse.Namespace = _parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    results: dict[str, Any] = asyncio.run(async_main(args))
+    output: str = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output, encoding='utf-8')
+    else:
+        print(output)
+    failures: list[str] = get_failures(results)
+    for failure in failures:
+        _LOGGER.error(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,8 @@
 """
 The initialisation of the custom component
 """
+import asyncio
 import logging
-from datetime import timedelta
 
 try:
     from homeassistant.helpers.typing import ConfigType
@@ -22,9 +22,14 @@ from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, EVENT_HOMEASSISTANT
 from homeassistant.core import HomeAssistant, Event, CALLBACK_TYPE, CoreState
 from homeassistant.exceptions import ConfigEntryNotReady
 
-from .const import CLIENT_ID_KEY, CLIENT_SECRET_KEY, COORDINATOR_KEY, DOMAIN, EVENT_UNLISTENER_KEY, PLATFORMS, REDIRECT_URI_KEY, UPDATE_ENEDIS_EVENT_TYPE, UPDATE_UNLISTENER_KEY, PDL_KEY, DEFAULT_REDIRECT_URI, DEFAULT_SCAN_INTERVAL, DATA_HASS_CONFIG
+from .const import CLIENT_ID_KEY, CLIENT_SECRET_KEY, CLIENT_KEY, COORDINATORS_KEY, DOMAIN, EVENT_UNLISTENER_KEY, PLATFORMS, REDIRECT_URI_KEY, UPDATE_ENEDIS_EVENT_TYPE, UPDATE_UNLISTENER_KEY, PDL_KEY, DEFAULT_REDIRECT_URI, DATA_HASS_CONFIG
 from .coordinators import EnedisDataUpdateCoordinator
-from .enedis_client import EnedisClient, InvalidClientId, InvalidClientSecret, InvalidPdl
+from .defaults import async_load_defaults
+from .enedis_client import EnedisClient, InvalidClientId, InvalidClientSecret, InvalidPdl, split_pdls
+from .response_cache import get_response_cache
+from .services import async_setup_services
+from .utils import get_numpy
+from .websocket_api import async_setup_websocket_api
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -36,11 +41,27 @@ async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry):
     await hass.config_entries.async_reload(entry.entry_id)
 
 
+async def _async_release(client: EnedisClient, coordinators: dict[str, EnedisDataUpdateCoordinator]) -> None:
+    """
+    Release the resources of an entry: the listeners and the local history of the coordinators, the session of the client
+    :param client: the client
+    :param coordinators: the coordinators
+    """
+    await asyncio.gather(*(c.async_shutdown() for c in coordinators.values()))
+    if client:
+        await client.close()
+
+
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """
     Set up the custom component
     """
     hass.data[DATA_HASS_CONFIG] = config
+    # the files and the optional dependencies are loaded in an executor, not when the component is imported
+    await async_load_defaults(hass)
+    await hass.async_add_executor_job(get_numpy)
+    async_setup_services(hass)
+    async_setup_websocket_api(hass)
     return True
 
 
@@ -70,20 +91,24 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     else:
         raise InvalidClientSecret
     if PDL_KEY in entry.options:
-        pdl: str = entry.options[PDL_KEY]
+        pdls: list[str] = split_pdls(entry.options[PDL_KEY])
     elif PDL_KEY in entry.data:
-        pdl: str = entry.data[PDL_KEY]
+        pdls: list[str] = split_pdls(entry.data[PDL_KEY])
     else:
         raise InvalidPdl
+    if not pdls:
+        raise InvalidPdl
     if REDIRECT_URI_KEY in entry.options:
         redirect_uri: str = entry.options[REDIRECT_URI_KEY]
     elif REDIRECT_URI_KEY in entry.data:
         redirect_uri: str = entry.data[REDIRECT_URI_KEY]
     else:
         redirect_uri = DEFAULT_REDIRECT_URI
-    client: EnedisClient = EnedisClient(hass, pdl, client_id, client_secret, redirect_uri)
-    coordinator: EnedisDataUpdateCoordinator = EnedisDataUpdateCoordinator(hass, entry, client)
-    await coordinator.async_setup()
+    await get_response_cache(hass).async_load()
+    # one client (session and token) for all the PDL of the entry, one coordinator (device) by PDL
+    client: EnedisClient = EnedisClient(hass, client_id, client_secret, redirect_uri)
+    coordinators: dict[str, EnedisDataUpdateCoordinator] = {pdl: EnedisDataUpdateCoordinator(hass, entry, client, pdl) for pdl in pdls}
+    await asyncio.gather(*(c.async_setup() for c in coordinators.values()))
 
     async def _async_event_listener(event: Event):
         """
@@ -94,19 +119,19 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             return
         _LOGGER.info("Event received: %s", event.data)
         if event.event_type == UPDATE_ENEDIS_EVENT_TYPE:
-            await coordinator.async_update_data()
+            await asyncio.gather(*(c.async_request_update() for c in coordinators.values()))
 
     async def _async_scheduled_refresh(*_):
         """
-        Activate the data update coordinator
+        Activate the data update coordinators, their requests are interleaved by the client
         """
-        if coordinator:
-            coordinator.update_interval = timedelta(seconds=DEFAULT_SCAN_INTERVAL)
-            await coordinator.async_refresh()
+        await asyncio.gather(*(c.async_refresh() for c in coordinators.values()))
 
     if hass.state == CoreState.running:
         await _async_scheduled_refresh()
-        if not coordinator.last_update_success:
+        if not any(c.last_update_success for c in coordinators.values()):
+            # the setup is retried later with a new client and new coordinators
+            await _async_release(client, coordinators)
             raise ConfigEntryNotReady
     else:
         hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, _async_scheduled_refresh)
@@ -128,7 +153,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # noinspection SpellCheckingInspection
     event_unlistener: CALLBACK_TYPE = hass.bus.async_listen(UPDATE_ENEDIS_EVENT_TYPE, _async_event_listener)
     hass.data[DOMAIN][entry.entry_id] = {
-        COORDINATOR_KEY: coordinator,
+        CLIENT_KEY: client,
+        COORDINATORS_KEY: coordinators,
         UPDATE_UNLISTENER_KEY: update_unlistener,
         EVENT_UNLISTENER_KEY: event_unlistener
     }
@@ -147,12 +173,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     _LOGGER.debug("Unloading up the entry...")
     result: bool = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if result:
-        if COORDINATOR_KEY in hass.data[DOMAIN][entry.entry_id]:
-            coordinator: EnedisDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR_KEY]
-            if coordinator:
-                client: EnedisClient = coordinator.get_client()
-                if client:
-                    await client.close()
+        await _async_release(hass.data[DOMAIN][entry.entry_id].get(CLIENT_KEY), hass.data[DOMAIN][entry.entry_id].get(COORDINATORS_KEY, {}))
         hass.data[DOMAIN][entry.entry_id][UPDATE_UNLISTENER_KEY]()
         hass.data[DOMAIN][entry.entry_id][EVENT_UNLISTENER_KEY]()
         hass.data[DOMAIN].pop(entry.entry_id)
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The aggregates of the local history, maintained incrementally when readings are written
+"""
+import logging
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """
+    The prefix sums of a series by period (day, hour...): the sum and the number of readings of all the periods before each period.
+    The periods are dense from the first reading, so the total of any window aligned on the periods is a difference of two items.
+    The index is updated from the first period changed by a write, the arrays are replaced at once so readers of the event loop see either the previous or the new sums.
+    """
+    EMPTY: tuple[None, array, array] = (None, array('q', [0]), array('q', [0]))
+
+    def __init__(self, period: int):
+        """
+        Constructor
+        :param period: the length of the periods in seconds
+        """
+        self._period: int = period
+        # the first period, the sums and the numbers of readings: item i is the sum of the periods before the period first + i
+        self._state: tuple[int, array, array] = PrefixIndex.EMPTY
+
+    def __len__(self) -> int:
+        """
+        Return the number of periods indexed
+        :return: the number of periods
+        """
+        return len(self._state[1]) - 1
+
+    def get_period(self) -> int:
+        """
+        Return the length of the periods
+        :return: the seconds
+        """
+        return self._period
+
+    def update(self, timestamps: Sequence[int], values: Sequence[int], since: int = None) -> None:
+        """
+        Update the sums from the readings of a series (blocking)
+        :param timestamps: the timestamps of the series, sorted
+        :param values: the values of the series in Wh
+        :param since: the timestamp of the oldest reading written, the index is rebuilt if not specified
+        """
+        if len(timestamps) == 0:
+            self._state = PrefixIndex.EMPTY
+            return
+        first, sums, counts = self._state
+        offset: int = 0
+        if first is None or since is None or min(since, timestamps[0]) // self._period < first:
+            first = timestamps[0] // self._period
+        else:
+            offset = min(since // self._period - first, len(sums) - 1)
+        sums = sums[:offset + 1] if offset > 0 else array('q', [0])
+        counts = counts[:offset + 1] if offset > 0 else array('q', [0])
+        total: int = sums[-1]
+        count: int = counts[-1]
+        current: int = offset
+        start: int = bisect_left(timestamps, (first + offset) * self._period)
+        for timestamp, value in zip(timestamps[start:], values[start:]):
+            bucket: int = timestamp // self._period - first
+            while current < bucket:
+                sums.append(total)
+                counts.append(count)
+                current += 1
+            total += value
+            count += 1
+        sums.append(total)
+        counts.append(count)
+        self._state = (first, sums, counts)
+        _LOGGER.debug("Index of %s seconds updated from period %s: %s periods", self._period, offset, len(sums) - 1)
+
+    def _positions(self, start: int, end: int, first: int, size: int) -> tuple[int, int]:
+        """
+        Return the positions in the prefix sums of the periods starting at or after the timestamps
+        :param start: the start timestamp
+        :param end: the end timestamp
+        :param first: the first period
+        :param size: the number of prefix sums
+        :return: the positions
+        """
+        return min(max(-(-start // self._period) - first, 0), size - 1), min(max(-(-end // self._period) - first, 0), size - 1)
+
+    def get_sum(self, start: int, end: int) -> int:
+        """
+        Return the sum of the periods of a time window
+        :param start: the start timestamp (inclusive), rounded up to a period
+        :param end: the end timestamp (exclusive), rounded up to a period
+        :return: the sum in Wh
+        """
+        first, sums, _ = self._state
+        if first is None:
+            return 0
+        i, j = self._positions(start, end, first, len(sums))
+        return sums[j] - sums[i]
+
+    def get_count(self, start: int, end: int) -> int:
+        """
+        Return the number of readings of a time window
+        :param start: the start timestamp (inclusive), rounded up to a period
+        :param end: the end timestamp (exclusive), rounded up to a period
+        :return: the number of readings
+        """
+        first, _, counts = self._state
+        if first is None:
+            return 0
+        i, j = self._positions(start, end, first, len(counts))
+        return counts[j] - counts[i]
+
+    def get_total(self, start: int, end: int) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the sum of the periods of a time window if it contains readings
+        :param start: the start timestamp (inclusive), rounded up to a period
+        :param end: the end timestamp (exclusive), rounded up to a period
+        :return: the sum in Wh or None if there is no reading in the window
+        """
+        first, sums, counts = self._state
+        if first is None:
+            return None
+        i, j = self._positions(start, end, first, len(sums))
+        if counts[j] == counts[i]:
+            return None
+        return sums[j] - sums[i]
+
+    def get_buckets(self, start: int, end: int = None) -> list[tuple[int, int]]:
+        """
+        Return the sums of the periods of a time window containing readings
+        :param start: the start timestamp (inclusive), rounded up to a period
+        :param end: the end timestamp (exclusive), rounded up to a period, the last period is included if not specified
+        :return: the start timestamps and the sums in Wh of the periods
+        """
+        first, sums, counts = self._state
+        if first is None:
+            return []
+        i, j = self._positions(start, end if end is not None else (first + len(sums)) * self._period, first, len(sums))
+        return [((first + k) * self._period, sums[k + 1] - sums[k]) for k in range(i, j) if counts[k + 1] > counts[k]]
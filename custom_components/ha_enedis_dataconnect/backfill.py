@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The backfill of the history of a PDL
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from .const import LOAD_CURVE_MAX_DAYS, DAILY_MAX_DAYS, BACKFILL_MAX_ATTEMPTS, BACKFILL_RETRY_BASE_DELAY, BACKFILL_RETRY_MAX_DELAY, BACKFILL_FLUSH_CHUNKS, DEFAULT_BACKFILL_CONCURRENCY, DEFAULT_BACKFILL_RATE, RequestPriorityEnum
+from .enedis_client import EnedisApiHelper
+from .exceptions import CannotConnect, CircuitOpen, QuotaExceeded
+from .history_store import EnedisHistoryStore
+from .models import MeterReadings
+from .rate_limiter import RateLimiter
+from .resilience import backoff_delay
+
+_LOGGER = logging.getLogger(__name__)
+DAILY_DATASET: str = 'daily'
+LOAD_CURVE_DATASET: str = 'load_curve'
+CHUNKS_KEY: str = 'chunks'
+FAILED_CHUNKS_KEY: str = 'failed_chunks'
+DAILY_READINGS_KEY: str = 'daily_readings'
+LOAD_CURVE_READINGS_KEY: str = 'load_curve_readings'
+
+
+def split_range(start: date, end: date, days: int) -> list[tuple[date, date]]:
+    """
+    Split a range of dates in chunks
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive)
+    :param days: the maximum number of days of a chunk
+    :return: the chunks
+    """
+    result: list[tuple[date, date]] = []
+    while start < end:
+        chunk_end: date = min(start + timedelta(days=days), end)
+        result.append((start, chunk_end))
+        start = chunk_end
+    return result
+
+
+def _concat(chunks: list[MeterReadings]) -> MeterReadings:
+    """
+    Concatenate the readings of several chunks
+    :param chunks: the readings of the chunks
+    :return: the readings
+    """
+    result: MeterReadings = MeterReadings()
+    for readings in chunks:
+        result.timestamps.extend(readings.timestamps)
+        result.values.extend(readings.values)
+    return result
+
+
+class EnedisBackfill:
+    """
+    Fetch a range of history by chunks of the sizes allowed by the API (365 days for the daily consumption, 7 days for the load curve).
+    The chunks are fetched concurrently under a rate limit, failed chunks are retried, and the readings are written in the local history as the chunks complete.
+    """
+
+    def __init__(self, helper: EnedisApiHelper, history_store: EnedisHistoryStore, concurrency: int = DEFAULT_BACKFILL_CONCURRENCY, rate: float = DEFAULT_BACKFILL_RATE):
+        """
+        Constructor
+        :param helper: the helper of the API
+        :param history_store: the local history
+        :param concurrency: the maximum number of requests in progress
+        :param rate: the maximum number of requests per second
+        """
+        self._helper: EnedisApiHelper = helper
+        self._history_store: EnedisHistoryStore = history_store
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._rate_limiter: RateLimiter = RateLimiter(rate)
+        self._daily: list[MeterReadings] = []
+        self._load_curve: list[MeterReadings] = []
+        self._pending_chunks: int = 0
+        self._flush_lock: asyncio.Lock = asyncio.Lock()
+
+    async def _async_fetch_chunk(self, dataset: str, start: date, end: date) -> None:
+        """
+        Fetch a chunk, retrying it when the API cannot be reached.
+        A chunk rejected by the circuit breaker or because of the quota is retried after the delay requested, the other errors are not retried.
+        :param dataset: the dataset
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        """
+        fetch: Callable[[date, date, RequestPriorityEnum], Awaitable[MeterReadings]] = self._helper.get_daily_consumption if dataset == DAILY_DATASET else self._helper.get_consumption_load_curve
+        for attempt in range(1, BACKFILL_MAX_ATTEMPTS + 1):
+            try:
+                async with self._semaphore:
+                    await self._rate_limiter.async_acquire()
+                    # the backfill only uses the quota left by the polls and the interactive requests
+                    readings: MeterReadings = await fetch(start, end, RequestPriorityEnum.BACKFILL)
+                break
+            except CannotConnect as e:
+                if attempt == BACKFILL_MAX_ATTEMPTS:
+                    raise
+                delay: float = backoff_delay(attempt, BACKFILL_RETRY_BASE_DELAY, BACKFILL_RETRY_MAX_DELAY)
+                if isinstance(e, (CircuitOpen, QuotaExceeded)):
+                    delay = max(delay, e.retry_after)
+                _LOGGER.warning("Backfill of %s from %s to %s failed (attempt %s: %s), retrying in %.0fs", dataset, start, end, attempt, e, delay)
+                await asyncio.sleep(delay)
+        if dataset == DAILY_DATASET:
+            self._daily.append(readings)
+        else:
+            self._load_curve.append(readings)
+        self._pending_chunks += 1
+        if self._pending_chunks >= BACKFILL_FLUSH_CHUNKS:
+            await self._async_flush()
+
+    async def _async_flush(self) -> None:
+        """
+        Write the readings received since the last flush
+        """
+        async with self._flush_lock:
+            daily, self._daily = self._daily, []
+            load_curve, self._load_curve = self._load_curve, []
+            self._pending_chunks = 0
+            await self._history_store.async_merge(_concat(daily), _concat(load_curve))
+
+    async def async_run(self, start: date, end: date) -> dict[str, Any]:
+        """
+        Backfill a range of dates
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :return: the summary of the backfill
+        """
+        chunks: list[tuple[str, date, date]] = [(DAILY_DATASET, s, e) for s, e in split_range(start, end, DAILY_MAX_DAYS)]
+        chunks.extend((LOAD_CURVE_DATASET, s, e) for s, e in split_range(start, end, LOAD_CURVE_MAX_DAYS))
+        _LOGGER.info("Backfilling from %s to %s using %s chunks", start, end, len(chunks))
+        results: list[Any] = await asyncio.gather(*(self._async_fetch_chunk(d, s, e) for d, s, e in chunks), return_exceptions=True)
+        await self._async_flush()
+        failed: list[str] = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Backfill of %s from %s to %s failed: %s", chunk[0], chunk[1], chunk[2], result)
+                failed.append(f"{chunk[0]} {chunk[1].isoformat()} {chunk[2].isoformat()}")
+        return {
+            CHUNKS_KEY: len(chunks),
+            FAILED_CHUNKS_KEY: failed,
+            DAILY_READINGS_KEY: len(self._history_store.get_daily()),
+            LOAD_CURVE_READINGS_KEY: len(self._history_store.get_load_curve())
+        }
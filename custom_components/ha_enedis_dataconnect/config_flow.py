@@ -8,20 +8,21 @@ import re
 from typing import Any
 from collections import OrderedDict
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
 
-from .const import DOMAIN, PDL_KEY, DEFAULT_PDL, CLIENT_ID_KEY, DEFAULT_CLIENT_ID, CLIENT_SECRET_KEY, DEFAULT_CLIENT_SECRET, REDIRECT_URI_KEY, DEFAULT_REDIRECT_URI, PEAK_HOUR_COST_KEY, DEFAULT_PEAK_HOUR_COST, SCAN_INTERVAL_KEY, DEFAULT_SCAN_INTERVAL, MIN_SCAN_INTERVAL, MAX_SCAN_INTERVAL, LOGGER
-from .enedis_client import EnedisClient
+from .const import DOMAIN, PDL_KEY, PDL_SEPARATOR, CLIENT_ID_KEY, CLIENT_SECRET_KEY, REDIRECT_URI_KEY, DEFAULT_REDIRECT_URI, PEAK_HOUR_COST_KEY, DEFAULT_PEAK_HOUR_COST, OFF_PEAK_HOUR_COST_KEY, DEFAULT_OFF_PEAK_HOUR_COST, SCAN_INTERVAL_KEY, DEFAULT_SCAN_INTERVAL, MIN_SCAN_INTERVAL, MAX_SCAN_INTERVAL, MIN_REFRESH_AGE_KEY, DEFAULT_MIN_REFRESH_AGE, MAX_MIN_REFRESH_AGE, SENSORS_KEY, DEFAULT_SENSORS, DATASETS_KEY, DEFAULT_DATASETS, FETCHED_DATASETS, SENSOR_TYPES, RequestPriorityEnum
+from .defaults import EnedisDefaults, get_defaults
+from .enedis_client import EnedisClient, is_valid_pdl, split_pdls
 
 _LOGGER = logging.getLogger(__name__)
 
 
-async def async_validate_api_access(hass: HomeAssistant, pdl: str, client_id: str, client_secret: str, redirect_uri: str) -> bool:
+async def async_validate_api_access(hass: HomeAssistant, client_id: str, client_secret: str, redirect_uri: str) -> bool:
     """
     Validate the access to the API
     :param hass: the home assistant instance
-    :param pdl: the PDL
     :param client_id: the client identifier
     :param client_secret: the client secret
     :param redirect_uri: the redirect URI
@@ -32,14 +33,14 @@ async def async_validate_api_access(hass: HomeAssistant, pdl: str, client_id: st
     client: EnedisClient = None
     # noinspection PyBroadException
     try:
-        client = EnedisClient(hass, pdl, client_id, client_secret, redirect_uri)
-        await hass.async_add_executor_job(client.connect)
+        client = EnedisClient(hass, client_id, client_secret, redirect_uri)
+        await client.connect(RequestPriorityEnum.INTERACTIVE)
         return True
     except Exception:  # pylint: disable=broad-except
         _LOGGER.exception("Cannot connect to the API")
     finally:
         if client:
-            await hass.async_add_executor_job(client.close)
+            await client.close()
     return False
 
 
@@ -53,11 +54,12 @@ async def async_validate_input(fields: OrderedDict, user_input: dict[str, Any],
     """
     _LOGGER.debug("Validating the input...")
     result: dict[str, Any] = {}
-    if PDL_KEY not in user_input or not re.match("\\d{14}", user_input[PDL_KEY]):
+    if PDL_KEY not in user_input or not is_valid_pdl(user_input[PDL_KEY]):
         errors[PDL_KEY] = "invalid_pdl"
     else:
-        fields[vol.Required(PDL_KEY, default=user_input[PDL_KEY])] = fields[vol.Required(PDL_KEY)]
-        result[PDL_KEY] = user_input[PDL_KEY]
+        pdl: str = PDL_SEPARATOR.join(split_pdls(user_input[PDL_KEY]))
+        fields[vol.Required(PDL_KEY, default=pdl)] = fields[vol.Required(PDL_KEY)]
+        result[PDL_KEY] = pdl
     if CLIENT_ID_KEY not in user_input or len(user_input[CLIENT_ID_KEY]) < 1:
         errors[CLIENT_ID_KEY] = "invalid_client_id"
     else:
@@ -77,15 +79,33 @@ async def async_validate_input(fields: OrderedDict, user_input: dict[str, Any],
             scan_interval = interval
         fields[vol.Optional(SCAN_INTERVAL_KEY, default=scan_interval)] = fields[vol.Optional(SCAN_INTERVAL_KEY)]
         result[SCAN_INTERVAL_KEY] = scan_interval
+    if MIN_REFRESH_AGE_KEY not in user_input:
+        errors[MIN_REFRESH_AGE_KEY] = "invalid_min_refresh_age"
+    else:
+        min_refresh_age: int = DEFAULT_MIN_REFRESH_AGE
+        age: int = int(user_input[MIN_REFRESH_AGE_KEY])
+        if 0 <= age <= MAX_MIN_REFRESH_AGE:
+            min_refresh_age = age
+        fields[vol.Optional(MIN_REFRESH_AGE_KEY, default=min_refresh_age)] = fields[vol.Optional(MIN_REFRESH_AGE_KEY)]
+        result[MIN_REFRESH_AGE_KEY] = min_refresh_age
     if PEAK_HOUR_COST_KEY not in user_input:
         errors[PEAK_HOUR_COST_KEY] = "invalid_peak_hour_cost"
     else:
         peak_hour_cost: float = DEFAULT_PEAK_HOUR_COST
         coast: float = float(user_input[PEAK_HOUR_COST_KEY])
-        if coast < 0:
+        if coast >= 0:
             peak_hour_cost = coast
         fields[vol.Optional(PEAK_HOUR_COST_KEY, default=peak_hour_cost)] = fields[vol.Optional(PEAK_HOUR_COST_KEY)]
         result[PEAK_HOUR_COST_KEY] = peak_hour_cost
+    if OFF_PEAK_HOUR_COST_KEY not in user_input:
+        errors[OFF_PEAK_HOUR_COST_KEY] = "invalid_off_peak_hour_cost"
+    else:
+        off_peak_hour_cost: float = DEFAULT_OFF_PEAK_HOUR_COST
+        coast: float = float(user_input[OFF_PEAK_HOUR_COST_KEY])
+        if coast >= 0:
+            off_peak_hour_cost = coast
+        fields[vol.Optional(OFF_PEAK_HOUR_COST_KEY, default=off_peak_hour_cost)] = fields[vol.Optional(OFF_PEAK_HOUR_COST_KEY)]
+        result[OFF_PEAK_HOUR_COST_KEY] = off_peak_hour_cost
     if REDIRECT_URI_KEY not in user_input:
         errors[REDIRECT_URI_KEY] = "invalid_redirect_url"
     else:
@@ -107,30 +127,50 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     CONNECTION_CLASS = config_entries.CONN_CLASS_CLOUD_POLL
 
     @staticmethod
-    def initialize_fields() -> OrderedDict:
+    def initialize_fields(defaults: EnedisDefaults) -> OrderedDict:
         """
         Initialize the fields
+        :param defaults: the defaults of the component
         :return: the fields
         """
         result: OrderedDict = OrderedDict()
-        result[vol.Required(PDL_KEY, default=DEFAULT_PDL)] = vol.All(str, vol.Length(min=14, max=14))
-        result[vol.Required(CLIENT_ID_KEY, default=DEFAULT_CLIENT_ID)] = vol.All(str, vol.Length(min=5))
-        result[vol.Required(CLIENT_SECRET_KEY, default=DEFAULT_CLIENT_SECRET)] = vol.All(str, vol.Length(min=5))
+        result[vol.Required(PDL_KEY, default=defaults.pdl)] = vol.All(str, vol.Length(min=14))
+        result[vol.Required(CLIENT_ID_KEY, default=defaults.client_id)] = vol.All(str, vol.Length(min=5))
+        result[vol.Required(CLIENT_SECRET_KEY, default=defaults.client_secret)] = vol.All(str, vol.Length(min=5))
         result[vol.Optional(REDIRECT_URI_KEY, default=DEFAULT_REDIRECT_URI)] = vol.All(str, vol.Length(min=5))
         result[vol.Optional(PEAK_HOUR_COST_KEY, default=DEFAULT_PEAK_HOUR_COST)] = vol.All(vol.Coerce(float), vol.Range(min=0))
+        result[vol.Optional(OFF_PEAK_HOUR_COST_KEY, default=DEFAULT_OFF_PEAK_HOUR_COST)] = vol.All(vol.Coerce(float), vol.Range(min=0))
         result[vol.Optional(SCAN_INTERVAL_KEY, default=DEFAULT_SCAN_INTERVAL)] = vol.All(vol.Coerce(int), vol.Range(min=MIN_SCAN_INTERVAL, max=MAX_SCAN_INTERVAL))
+        result[vol.Optional(MIN_REFRESH_AGE_KEY, default=DEFAULT_MIN_REFRESH_AGE)] = vol.All(vol.Coerce(int), vol.Range(min=0, max=MAX_MIN_REFRESH_AGE))
         return result
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        """
+        Return the flow of the options
+        :param config_entry: the configuration entry
+        :return: the flow
+        """
+        return OptionsFlow(config_entry)
+
     def __init__(self):
         """
         The constructor
         """
-        self._logger = logging.getLogger(__class__.__name__)
-        for handler in LOGGER.handlers:
-            self._logger.addHandler(handler)
-            self._logger.setLevel(LOGGER.level)
-        self._logger.debug("Building a %s", __class__.__name__)
-        self._fields: OrderedDict = ConfigFlow.initialize_fields()
+        self._logger = _LOGGER.getChild(type(self).__name__)
+        self._logger.debug("Building a %s", type(self).__name__)
+        # noinspection PyTypeChecker
+        self._fields: OrderedDict = None
+
+    def _get_fields(self) -> OrderedDict:
+        """
+        Return the fields, initialized on the first step as the defaults are loaded using Home Assistant
+        :return: the fields
+        """
+        if self._fields is None:
+            self._fields = ConfigFlow.initialize_fields(get_defaults(self.hass))
+        return self._fields
 
     async def async_step_user(self, user_input=None):
         """
@@ -141,9 +181,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             # noinspection PyBroadException
             try:
-                info: dict[str, Any] = await async_validate_input(self._fields, user_input, errors)
+                info: dict[str, Any] = await async_validate_input(self._get_fields(), user_input, errors)
                 if len(errors) == 0:
-                    access: bool = await async_validate_api_access(self.hass, info[PDL_KEY], info[CLIENT_ID_KEY], info[CLIENT_SECRET_KEY], info[REDIRECT_URI_KEY])
+                    access: bool = await async_validate_api_access(self.hass, info[CLIENT_ID_KEY], info[CLIENT_SECRET_KEY], info[REDIRECT_URI_KEY])
                     if not access:
                         errors["base"] = "cannot_connect"
                     if len(errors) == 0:
@@ -152,7 +192,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             except Exception:  # pylint: disable=broad-except
                 self._logger.exception("Unexpected exception")
                 errors["base"] = "unknown"
-        return self.async_show_form(step_id="user", data_schema=vol.Schema(self._fields), errors=errors)
+        return self.async_show_form(step_id="user", data_schema=vol.Schema(self._get_fields()), errors=errors)
 
     async def async_step_reconfigure(self, user_input: dict[str, Any] | None = None):  # pylint: disable=unsupported-binary-operation
         """
@@ -163,9 +203,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             # noinspection PyBroadException
             try:
-                info: dict[str, Any] = await async_validate_input(self._fields, user_input, errors)
+                info: dict[str, Any] = await async_validate_input(self._get_fields(), user_input, errors)
                 if len(errors) == 0:
-                    access: bool = await async_validate_api_access(self.hass, info[PDL_KEY], info[CLIENT_ID_KEY], info[CLIENT_SECRET_KEY], info[REDIRECT_URI_KEY])
+                    access: bool = await async_validate_api_access(self.hass, info[CLIENT_ID_KEY], info[CLIENT_SECRET_KEY], info[REDIRECT_URI_KEY])
                     if not access:
                         errors["base"] = "cannot_connect"
                     if len(errors) == 0:
@@ -173,4 +213,34 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             except Exception:  # pylint: disable=broad-except
                 self._logger.exception("Unexpected exception")
                 errors["base"] = "unknown"
-        return self.async_show_form(step_id="reconfigure", data_schema=vol.Schema(self._fields), errors=errors)
+        return self.async_show_form(step_id="reconfigure", data_schema=vol.Schema(self._get_fields()), errors=errors)
+
+
+class OptionsFlow(config_entries.OptionsFlow):
+    """
+    Handle the options: the sensors built for each PDL and the datasets fetched even if no enabled sensor uses them
+    """
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        """
+        The constructor
+        :param config_entry: the configuration entry
+        """
+        self._logger = _LOGGER.getChild(type(self).__name__)
+        self._config_entry: config_entries.ConfigEntry = config_entry
+
+    async def async_step_init(self, user_input: dict[str, Any] | None = None):  # pylint: disable=unsupported-binary-operation
+        """
+        Handle the selection of the sensors and of the datasets
+        """
+        self._logger.debug("Configuring the options...")
+        options: dict[str, Any] = dict(self._config_entry.options)
+        if user_input is not None:
+            # the other options are kept, the entry is reloaded by its update listener
+            options[SENSORS_KEY] = list(user_input.get(SENSORS_KEY, []))
+            options[DATASETS_KEY] = list(user_input.get(DATASETS_KEY, []))
+            return self.async_create_entry(title='', data=options)
+        fields: OrderedDict = OrderedDict()
+        fields[vol.Optional(SENSORS_KEY, default=list(options.get(SENSORS_KEY, DEFAULT_SENSORS)))] = cv.multi_select({k: k for k in SENSOR_TYPES})
+        fields[vol.Optional(DATASETS_KEY, default=list(options.get(DATASETS_KEY, DEFAULT_DATASETS)))] = cv.multi_select({d: d for d in FETCHED_DATASETS})
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(fields))
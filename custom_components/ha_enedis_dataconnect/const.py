@@ -3,23 +3,18 @@
 """
 The constants of the custom component
 """
-import json
-import logging
-from enum import StrEnum
+from enum import IntEnum, StrEnum
 from pathlib import Path
 from typing import Any
 
-from homeassistant.const import Platform, UnitOfEnergy, UnitOfPower
+from homeassistant.const import Platform, UnitOfEnergy, UnitOfPower, UnitOfTime
 
-LOGGER = logging.getLogger(__name__)
 EMPTY_STRING: str = ''
 DATE_FORMAT: str = '%Y-%m-%d'
 DATE_TIME_FORMAT: str = '%Y-%m-%d %H:%M'
 
-MANIFEST: dict[str, Any] = {}
+# the version used until the one of the manifest is loaded (see defaults)
 VERSION: str = '0.0.1-SNAPSHOT'
-GITHUB_URL: str = EMPTY_STRING
-ISSUE_URL: str = EMPTY_STRING
 DOMAIN: str = 'ha_enedis_dataconnect'
 DATA_HASS_CONFIG = DOMAIN + "_hass_config"
 # Base component constants
@@ -28,7 +23,17 @@ PLATFORMS: list = [PLATFORM]
 INTEGRATION_PATH: Path = Path(__file__).parent
 ENDPOINT_URL: str = 'https://ext.prod-sandbox.api.enedis.fr'
 ENDPOINT_TOKEN_URL: str = ENDPOINT_URL + '/oauth2/v3/'
+DAILY_CONSUMPTION_PATH: str = '/metering_data_dc/v5/daily_consumption'
+CONSUMPTION_LOAD_CURVE_PATH: str = '/metering_data_clc/v5/consumption_load_curve'
+DAILY_CONSUMPTION_MAX_POWER_PATH: str = '/metering_data_dcmp/v5/daily_consumption_max_power'
+CONTRACTS_PATH: str = '/customers_upc/v5/usage_points/contracts'
 UPDATE_ENEDIS_EVENT_TYPE: str = 'enedis_update'
+HTTP_TIMEOUT: int = 30
+HTTP_POOL_SIZE: int = 10
+HTTP_KEEPALIVE_TIMEOUT: int = 60
+# one response out of TRACE_SAMPLE_RATE is logged when the trace logger of the client is set to debug, truncated to TRACE_MAX_BODY bytes
+TRACE_SAMPLE_RATE: int = 10
+TRACE_MAX_BODY: int = 2048
 
 VERSION_KEY: str = 'version'
 CLIENT_ID_KEY: str = 'client_id'
@@ -36,9 +41,14 @@ CLIENT_SECRET_KEY: str = 'client_secret'
 TOKEN_KEY: str = 'token'
 PDL_KEY: str = 'pdl'
 PEAK_HOUR_COST_KEY: str = 'peak_hour_cost'
+OFF_PEAK_HOUR_COST_KEY: str = 'off_peak_hour_cost'
 REDIRECT_URI_KEY: str = 'redirect_uri'
 SCAN_INTERVAL_KEY: str = 'scan_interval'
-COORDINATOR_KEY: str = 'enedis_coordinator'
+MIN_REFRESH_AGE_KEY: str = 'min_refresh_age'
+SENSORS_KEY: str = 'sensors'
+DATASETS_KEY: str = 'datasets'
+COORDINATORS_KEY: str = 'enedis_coordinators'
+CLIENT_KEY: str = 'enedis_client'
 # noinspection SpellCheckingInspection
 UPDATE_UNLISTENER_KEY: str = 'enedis_update_unlistener'
 # noinspection SpellCheckingInspection
@@ -46,18 +56,86 @@ EVENT_UNLISTENER_KEY: str = 'enedis_event_unlistener'
 ENTITY_NAME_KEY: str = "name"
 ENTITY_UNIT_KEY: str = "unit"
 ENTITY_DELAY_KEY: str = "delay"
+ENTITY_DAYS_KEY: str = "days"
+ENTITY_METRIC_KEY: str = "metric"
 
 MIN_SCAN_INTERVAL: int = 15
 MAX_SCAN_INTERVAL: int = 600
+MAX_MIN_REFRESH_AGE: int = 60 * 60 * 24
 
 DEFAULT_PDL: str = EMPTY_STRING
 DEFAULT_CLIENT_ID: str = EMPTY_STRING
 DEFAULT_CLIENT_SECRET: str = EMPTY_STRING
 DEFAULT_PEAK_HOUR_COST: float = 1.0
+DEFAULT_OFF_PEAK_HOUR_COST: float = 1.0
 DEFAULT_REDIRECT_URI: str = 'http://localhost'
 DEFAULT_SCAN_INTERVAL: int = 60 * 2
 DEFAULT_HISTORY_SCAN_INTERVAL: int = 60 * 10
+# age in seconds under which the data is not fetched again on a refresh requested by an event
+DEFAULT_MIN_REFRESH_AGE: int = 60 * 5
 DEFAULT_ENTITY_DELAY: int = 60
+# hours of the window during which Enedis usually publishes the data of the previous day
+PUBLICATION_WINDOW_START_HOUR: int = 6
+PUBLICATION_WINDOW_END_HOUR: int = 12
+# interval in seconds between polls when the publication is late
+LATE_PUBLICATION_INTERVAL: int = 60 * 60
+# maximum spreading in seconds of the polls of the different PDL
+PDL_JITTER: int = 15 * 60
+DAILY_HISTORY_DAYS: int = 31
+MAX_POWER_HISTORY_DAYS: int = 7
+LOAD_CURVE_HISTORY_DAYS: int = 7
+# maximum number of requests per second accepted by the API for an application
+API_RATE_LIMIT: float = 5.0
+# maximum number of requests sent at once when the quota has not been used for a while
+API_BURST: int = 5
+# maximum number of attempts of a request rejected because of the quota (HTTP 429), counted apart from the attempts of the failing requests
+API_THROTTLED_ATTEMPTS: int = 3
+# maximum number of attempts of a request failing because of the network or the API (HTTP 5xx), the delays between the attempts grow exponentially
+API_RETRY_ATTEMPTS: int = 3
+API_RETRY_BASE_DELAY: float = 1.0
+API_RETRY_MAX_DELAY: float = 30.0
+# the retries of a client are limited to a ratio of its requests during a sliding window, with a minimum, so an outage does not multiply the load
+RETRY_BUDGET_RATIO: float = 0.2
+RETRY_BUDGET_MIN: int = 3
+RETRY_BUDGET_WINDOW: int = 60
+# number of consecutive failures of an endpoint opening its circuit, and delays in seconds before probing it again (doubled after each failed probe)
+BREAKER_FAILURE_THRESHOLD: int = 3
+BREAKER_RESET_TIMEOUT: float = 60.0
+BREAKER_MAX_RESET_TIMEOUT: float = 60.0 * 60
+# delays in seconds before the refresh following a failed refresh, doubled after each consecutive failure
+REFRESH_RETRY_BASE_DELAY: float = 60.0 * 2
+REFRESH_RETRY_MAX_DELAY: float = 60.0 * 60
+# maximum number of responses of the API kept in the cache
+RESPONSE_CACHE_SIZE: int = 256
+# time to live in seconds of a cached response covering a period which can still change
+OPEN_PERIOD_TTL: int = 60 * 5
+# time to live in seconds of a cached response without period (contracts)
+UNDATED_TTL: int = 60 * 60 * 24
+# separator of the PDL when a configuration entry serves several meters
+PDL_SEPARATOR: str = ','
+# maximum number of days accepted by the load curve endpoint for one call
+LOAD_CURVE_MAX_DAYS: int = 7
+# maximum number of days accepted by the daily endpoints for one call
+DAILY_MAX_DAYS: int = 365
+BACKFILL_SERVICE: str = 'backfill'
+START_DATE_KEY: str = 'start_date'
+END_DATE_KEY: str = 'end_date'
+CONCURRENCY_KEY: str = 'concurrency'
+RATE_KEY: str = 'rate'
+GET_HISTORY_SERVICE: str = 'get_history'
+WEBSOCKET_HISTORY_COMMAND: str = DOMAIN + '/history'
+SERIES_KEY: str = 'series'
+# maximum number of readings returned at once by the history service and the websocket command
+SERIES_MAX_POINTS: int = 50000
+DEFAULT_BACKFILL_CONCURRENCY: int = 2
+# maximum number of requests per second sent by a backfill
+DEFAULT_BACKFILL_RATE: float = 1.0
+BACKFILL_MAX_ATTEMPTS: int = 3
+# delays in seconds before retrying a chunk failing because of the network or of the API
+BACKFILL_RETRY_BASE_DELAY: float = 2.0
+BACKFILL_RETRY_MAX_DELAY: float = 60.0
+# number of chunks written at once in the local history by a backfill
+BACKFILL_FLUSH_CHUNKS: int = 10
 EURO: str = 'euro'
 SENSOR_TYPES: dict[str, dict[str, Any]] = {}
 
@@ -70,6 +148,45 @@ class EnedisSensorTypeEnum(StrEnum):
     CONSUMPTION = 'consumption'
 
 
+class RequestPriorityEnum(IntEnum):
+    """
+    The enumeration representing the priority of a request to the API, the lowest value is served first
+    """
+    INTERACTIVE = 0
+    SCHEDULED = 1
+    BACKFILL = 2
+
+
+class EnedisDatasetEnum(StrEnum):
+    """
+    The enumeration representing the datasets used by the entities
+    """
+    DAILY_CONSUMPTION = 'daily_consumption'
+    LOAD_CURVE = 'load_curve'
+    MAX_POWER = 'max_power'
+    CONTRACT = 'contract'
+    # the local history, written from the daily consumption and the load curve and by the backfills
+    HISTORY = 'history'
+    # changed by each refresh, used by the diagnostic entities
+    REFRESH = 'refresh'
+
+
+# the datasets fetched from the API, the other datasets are derived from them
+FETCHED_DATASETS: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.LOAD_CURVE, EnedisDatasetEnum.MAX_POWER, EnedisDatasetEnum.CONTRACT)
+# the datasets fetched even if no enabled sensor uses them: the local history and the long-term statistics are written from them
+DEFAULT_DATASETS: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.LOAD_CURVE)
+
+
+class EnedisSeriesEnum(StrEnum):
+    """
+    The enumeration representing the series of the local history served on demand
+    """
+    LOAD_CURVE = 'load_curve'
+    HOURLY = 'hourly'
+    DAILY = 'daily'
+    MONTHLY = 'monthly'
+
+
 class EnedisHistoryDetailsTypeEnum(StrEnum):
     """
     The enumeration representing the type of details
@@ -100,6 +217,13 @@ class SensorTypeEnum(StrEnum):
     CONSUMED_ENERGY_SENSOR_TYPE = 'consumed_energy'
     CONSUMED_ENERGY_DETAILS_HOURS_SENSOR_TYPE = 'consumed_energy_detail_hours'
     CONSUMED_ENERGY_DETAILS_HOURS_COST_SENSOR_TYPE = 'consumed_energy_detail_hours_cost'
+    CONSUMED_ENERGY_ROLLING_WEEK_SENSOR_TYPE = 'consumed_energy_rolling_week'
+    CONSUMED_ENERGY_ROLLING_MONTH_SENSOR_TYPE = 'consumed_energy_rolling_month'
+    CONSUMED_ENERGY_ROLLING_YEAR_SENSOR_TYPE = 'consumed_energy_rolling_year'
+    DIAGNOSTIC_REFRESH_DURATION_SENSOR_TYPE = 'diagnostic_refresh_duration'
+    DIAGNOSTIC_API_CALLS_SENSOR_TYPE = 'diagnostic_api_calls'
+    DIAGNOSTIC_API_THROTTLED_SENSOR_TYPE = 'diagnostic_api_throttled'
+    DIAGNOSTIC_API_ERRORS_SENSOR_TYPE = 'diagnostic_api_errors'
 
 
 def _put_sensor_type(d: dict[str, Any]) -> None:
@@ -125,6 +249,11 @@ _put_sensor_type({
     ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
     ENTITY_UNIT_KEY: UnitOfPower.KILO_WATT
 })
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.CONSUMED_HISTORY_OFF_PEAK_HOURS_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: UnitOfPower.KILO_WATT
+})
 _put_sensor_type({
     ENTITY_NAME_KEY: SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE,
     ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
@@ -145,31 +274,47 @@ _put_sensor_type({
     ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
     ENTITY_UNIT_KEY: EURO
 })
-
-path = INTEGRATION_PATH.joinpath('manifest.json')
-if path.exists():
-    LOGGER.debug("Reading manifest from file: manifest.json")
-    with path.open(mode='r', encoding='utf-8') as f:
-        MANIFEST = json.load(f)
-        if VERSION_KEY in MANIFEST:
-            VERSION = MANIFEST[VERSION_KEY]
-        if 'documentation' in MANIFEST:
-            GITHUB_URL = MANIFEST['documentation']
-        if 'issue_tracker' in MANIFEST:
-            ISSUE_URL = MANIFEST['issue_tracker']
-else:
-    LOGGER.debug("Manifest not found in file: manifest.json")
-path = INTEGRATION_PATH.joinpath('default.json')
-if path.exists():
-    LOGGER.debug("Reading default configuration from file: default.json")
-    with path.open(mode='r', encoding='utf-8') as f:
-        data: dict[str, Any] = json.load(f)
-        if PDL_KEY in data:
-            DEFAULT_PDL = data[PDL_KEY]
-        if CLIENT_ID_KEY in data:
-            DEFAULT_CLIENT_ID = data[CLIENT_ID_KEY]
-        if CLIENT_SECRET_KEY in data:
-            DEFAULT_CLIENT_SECRET = data[CLIENT_SECRET_KEY]
-else:
-    LOGGER.debug("Default configuration not found in file: default.json")
-LOGGER.debug("Default configuration: %s, %s, %s, %s, %s, %s", DEFAULT_PDL, DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, str(DEFAULT_PEAK_HOUR_COST), DEFAULT_REDIRECT_URI, str(DEFAULT_SCAN_INTERVAL))
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.CONSUMED_ENERGY_ROLLING_WEEK_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: UnitOfEnergy.KILO_WATT_HOUR,
+    ENTITY_DAYS_KEY: 7
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.CONSUMED_ENERGY_ROLLING_MONTH_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: UnitOfEnergy.KILO_WATT_HOUR,
+    ENTITY_DAYS_KEY: 30
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.CONSUMED_ENERGY_ROLLING_YEAR_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: UnitOfEnergy.KILO_WATT_HOUR,
+    ENTITY_DAYS_KEY: 365
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.DIAGNOSTIC_REFRESH_DURATION_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: UnitOfTime.MILLISECONDS,
+    ENTITY_METRIC_KEY: 'refresh'
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.DIAGNOSTIC_API_CALLS_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: None,
+    ENTITY_METRIC_KEY: 'requests'
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.DIAGNOSTIC_API_THROTTLED_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: None,
+    ENTITY_METRIC_KEY: 'throttled'
+})
+_put_sensor_type({
+    ENTITY_NAME_KEY: SensorTypeEnum.DIAGNOSTIC_API_ERRORS_SENSOR_TYPE,
+    ENTITY_DELAY_KEY: DEFAULT_ENTITY_DELAY,
+    ENTITY_UNIT_KEY: None,
+    ENTITY_METRIC_KEY: 'errors'
+})
+# the sensors created for each PDL when the options do not select them
+DEFAULT_SENSORS: tuple[str, ...] = tuple(SENSOR_TYPES)
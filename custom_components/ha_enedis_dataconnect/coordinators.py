@@ -3,22 +3,36 @@
 """
 Defines all the coordinators used by the component
 """
+import asyncio
 import logging
+import time
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterable
 from datetime import timedelta, datetime, date
 from typing import Any
 
 from homeassistant.components.sensor import SensorStateClass, ATTR_LAST_RESET, SensorDeviceClass, ATTR_STATE_CLASS
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import ATTR_ATTRIBUTION, ATTR_DEVICE_CLASS, ATTR_UNIT_OF_MEASUREMENT
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.restore_state import RestoreEntity
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, CoordinatorEntity
-from homeassistant.util import Throttle
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, CoordinatorEntity, UpdateFailed
 
-from custom_components.ha_enedis_dataconnect.const import DEFAULT_SCAN_INTERVAL, SCAN_INTERVAL_KEY, EnedisHistoryDetailsTypeEnum, EnedisDetailsPeriodEnum, ENTITY_DELAY_KEY, DOMAIN, ENTITY_UNIT_KEY, VERSION_KEY, VERSION, EnedisSensorTypeEnum, PDL_KEY, EMPTY_STRING, DATE_TIME_FORMAT, LOGGER
+from custom_components.ha_enedis_dataconnect.const import DEFAULT_SCAN_INTERVAL, MIN_SCAN_INTERVAL, MAX_SCAN_INTERVAL, SCAN_INTERVAL_KEY, EnedisHistoryDetailsTypeEnum, EnedisDetailsPeriodEnum, ENTITY_DELAY_KEY, ENTITY_DAYS_KEY, ENTITY_METRIC_KEY, ENTITY_NAME_KEY, DOMAIN, ENTITY_UNIT_KEY, VERSION_KEY, EnedisSensorTypeEnum, EnedisDatasetEnum, PDL_KEY, EMPTY_STRING, DATE_TIME_FORMAT, PEAK_HOUR_COST_KEY, DEFAULT_PEAK_HOUR_COST, OFF_PEAK_HOUR_COST_KEY, DEFAULT_OFF_PEAK_HOUR_COST, DAILY_HISTORY_DAYS, MAX_POWER_HISTORY_DAYS, MIN_REFRESH_AGE_KEY, DEFAULT_MIN_REFRESH_AGE, REFRESH_RETRY_BASE_DELAY, REFRESH_RETRY_MAX_DELAY, SENSORS_KEY, DEFAULT_SENSORS, DATASETS_KEY, DEFAULT_DATASETS, FETCHED_DATASETS, SensorTypeEnum, DAILY_CONSUMPTION_PATH, CONSUMPTION_LOAD_CURVE_PATH, DAILY_CONSUMPTION_MAX_POWER_PATH, CONTRACTS_PATH
+from custom_components.ha_enedis_dataconnect.defaults import get_defaults
 from custom_components.ha_enedis_dataconnect.enedis_client import EnedisClient, EnedisApiHelper
+from custom_components.ha_enedis_dataconnect.exceptions import CircuitOpen, QuotaExceeded
+from custom_components.ha_enedis_dataconnect.fetch_state import EnedisFetchState
+from custom_components.ha_enedis_dataconnect.history_store import EnedisHistoryStore, to_timestamp
+from custom_components.ha_enedis_dataconnect.long_term_statistics import EnedisStatisticsImporter
+from custom_components.ha_enedis_dataconnect.metrics import EnedisMetrics, LatencyHistogram, REFRESHES_COUNTER, REFRESH_FAILURES_COUNTER, STALE_REFRESHES_COUNTER, ENTITY_WRITES_COUNTER, ENTITY_SKIPPED_WRITES_COUNTER, REFRESH_HISTOGRAM, AGGREGATE_HISTOGRAM
+from custom_components.ha_enedis_dataconnect.scheduler import EnedisPollingScheduler
+from custom_components.ha_enedis_dataconnect.single_flight import SingleFlight
+from custom_components.ha_enedis_dataconnect.resilience import backoff_delay
+from custom_components.ha_enedis_dataconnect.models import EnedisDataSnapshot, MeterReadings, ContractInfo, IntervalReading, MaxPowerReading, parse_max_power_readings, parse_contract
+from custom_components.ha_enedis_dataconnect.tariff import TariffEngine, TariffDefinition, TariffOptionEnum, parse_off_peak_hours
 
 _LOGGER = logging.getLogger(__name__)
 PDL_ATTR: str = PDL_KEY
@@ -30,41 +44,90 @@ MIN_TIME_ATTR: str = 'min_time'
 ACTIVATION_DATE_ATTR: str = 'activation_date'
 YESTERDAY_ATTR: str = 'yesterday'
 YESTERDAY_CONSUMPTION_MAX_POWER_ATTR: str = 'yesterday_consumption_max_power'
+YESTERDAY_CONSUMPTION_MAX_POWER_TIME_ATTR: str = 'yesterday_consumption_max_power_time'
+SUBSCRIBED_POWER_ATTR: str = 'subscribed_power'
+OFFPEAK_HOURS_ATTR: str = 'offpeak_hours'
+CURRENT_MONTH_ATTR: str = 'current_month'
+DAYS_ATTR: str = 'days'
+STALE_SINCE_ATTR: str = 'stale_since'
+COUNT_ATTR: str = 'count'
+AVERAGE_ATTR: str = 'average'
+MAXIMUM_ATTR: str = 'maximum'
+REFRESH_KEY: str = 'refresh'
+# the attributes ignored when the state is compared with the previous one: the time of the last change, stamped after the comparison, and the time of the last call
+VOLATILE_ATTRS: tuple[str, ...] = (LAST_UPDATE_ATTR, LAST_CALL_ATTR)
+
+
+def _same_attributes(attributes: dict[str, Any], other: dict[str, Any]) -> bool:
+    """
+    Compare the attributes of two states, the volatile attributes excluded
+    :param attributes: the attributes
+    :param other: the other attributes
+    :return: True if the attributes are the same
+    """
+    keys: set[str] = attributes.keys() - VOLATILE_ATTRS
+    if keys != other.keys() - VOLATILE_ATTRS:
+        return False
+    return all(attributes[k] == other[k] for k in keys)
 
 
-class EnedisDataUpdateCoordinator(DataUpdateCoordinator):
+class EnedisDataUpdateCoordinator(DataUpdateCoordinator):  # pylint: disable=too-many-instance-attributes
     """
     The data update coordinator
     """
 
-    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, client: EnedisClient):
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, client: EnedisClient, pdl: str):
         """
         Constructor
         :param hass: the Home Assistant instance
         :param entry: the configuration entry
-        :param client: the client
+        :param client: the client, shared by the PDL of the entry
+        :param pdl: the PDL
         """
-        self._logger = logging.getLogger(__class__.__name__)
-        for handler in LOGGER.handlers:
-            self._logger.addHandler(handler)
-            self._logger.setLevel(LOGGER.level)
-        self._logger.debug("Building a %s", __class__.__name__)
+        # the records propagate to the logger of the module, configured once by Home Assistant
+        self._logger = _LOGGER.getChild(type(self).__name__)
+        self._logger.debug("Building a %s", type(self).__name__)
         self._hass = hass
         self._config_entry = entry
         self._client = client
-        scan_interval: int = DEFAULT_SCAN_INTERVAL
-        if SCAN_INTERVAL_KEY in entry.options:
-            interval: int = int(entry.options[SCAN_INTERVAL_KEY])
-            if 0 < interval <= 600:
-                scan_interval = interval
-        super().__init__(hass, _LOGGER, name=f"Enedis information for {entry.title}", update_method=self.async_update_data, update_interval=timedelta(scan_interval))
-
-    def __del__(self):
-        """
-        Destructor
-        """
-        if self._client:
-            self._hass.async_add_executor_job(self._client.close)
+        self._pdl: str = pdl
+        self._fetch_state: EnedisFetchState = EnedisFetchState(hass, pdl)
+        self._api_helper: EnedisApiHelper = EnedisApiHelper(client, pdl, self._fetch_state)
+        self._history_store: EnedisHistoryStore = EnedisHistoryStore(hass, pdl)
+        self._statistics_importer: EnedisStatisticsImporter = EnedisStatisticsImporter(hass, pdl, self._history_store, self._fetch_state)
+        # noinspection PyTypeChecker
+        self._contract: ContractInfo = None
+        # noinspection PyTypeChecker
+        self._tariff_engine: TariffEngine = None
+        # the fingerprints of the datasets of the last snapshot and the datasets changed by the last refresh
+        self._fingerprints: dict[str, int] = {}
+        self._changed: set[str] = set()
+        # the time of the last notification of each entity and the entities notified when their delay expires
+        self._notified: dict[CALLBACK_TYPE, float] = {}
+        self._pending: dict[CALLBACK_TYPE, float] = {}
+        # noinspection PyTypeChecker
+        self._pending_timer: asyncio.TimerHandle = None
+        # noinspection PyTypeChecker
+        self._dispatched_day: date = None
+        self._dispatched_success: bool = True
+        # noinspection PyTypeChecker
+        self._dispatched_stale_since: datetime = None
+        self._metrics: EnedisMetrics = EnedisMetrics()
+        # the consecutive failed refreshes and the time of the first one, the last good snapshot is served meanwhile
+        self._failures: int = 0
+        # noinspection PyTypeChecker
+        self._stale_since: datetime = None
+        # the datasets of the last refresh served from the previous snapshot because their fetch failed
+        self._kept_datasets: frozenset[str] = frozenset()
+        # the sensors enabled by the options and the datasets fetched for them
+        self._sensors: frozenset[str] = frozenset(self.get_option(SENSORS_KEY, DEFAULT_SENSORS))
+        self._datasets: frozenset[str] = get_fetched_datasets(self._sensors, self.get_option(DATASETS_KEY, DEFAULT_DATASETS))
+        # the interval is set by the configuration flow in the data of the entry
+        scan_interval: int = min(max(int(self.get_option(SCAN_INTERVAL_KEY, DEFAULT_SCAN_INTERVAL)), MIN_SCAN_INTERVAL), MAX_SCAN_INTERVAL)
+        self._scheduler: EnedisPollingScheduler = EnedisPollingScheduler(pdl, scan_interval, self._datasets)
+        self._single_flight: SingleFlight = SingleFlight()
+        self._min_refresh_age: timedelta = timedelta(seconds=int(self.get_option(MIN_REFRESH_AGE_KEY, DEFAULT_MIN_REFRESH_AGE)))
+        super().__init__(hass, _LOGGER, config_entry=entry, name=f"Enedis information for {pdl}", update_method=self.async_update_data, update_interval=timedelta(seconds=scan_interval))
 
     def get_client(self) -> EnedisClient:
         """
@@ -73,6 +136,34 @@ class EnedisDataUpdateCoordinator(DataUpdateCoordinator):
         """
         return self._client
 
+    def get_pdl(self) -> str:
+        """
+        Returns the PDL
+        :return: the PDL
+        """
+        return self._pdl
+
+    def get_stale_since(self) -> datetime | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Returns the time of the first of the consecutive refreshes which failed or kept a dataset of the previous snapshot
+        :return: the time or None if the last refresh fetched all the datasets
+        """
+        return self._stale_since
+
+    def get_sensors(self) -> frozenset[str]:
+        """
+        Returns the types of the sensors enabled
+        :return: the sensor types
+        """
+        return self._sensors
+
+    def get_datasets(self) -> frozenset[str]:
+        """
+        Returns the datasets fetched from the API
+        :return: the datasets
+        """
+        return self._datasets
+
     def get_config_entry(self) -> ConfigEntry:
         """
         Returns the configuration entry
@@ -87,44 +178,347 @@ class EnedisDataUpdateCoordinator(DataUpdateCoordinator):
         """
         return self._hass
 
-    def update_data(self) -> bool:
+    def get_api_helper(self) -> EnedisApiHelper:
         """
-        Retrieve the latest data
+        Returns the helper of the API
+        :return: the helper
         """
-        _LOGGER.info("Retrieving latest data...")
-        self._client.update_data()
-        return True
+        return self._api_helper
+
+    def get_history_store(self) -> EnedisHistoryStore:
+        """
+        Returns the local history of the PDL
+        :return: the store
+        """
+        return self._history_store
+
+    def get_metrics(self) -> EnedisMetrics:
+        """
+        Returns the metrics of the refreshes and of the entities
+        :return: the metrics
+        """
+        return self._metrics
+
+    def get_fetch_state(self) -> EnedisFetchState:
+        """
+        Returns the persisted state of the fetches
+        :return: the state
+        """
+        return self._fetch_state
+
+    def get_statistics_importer(self) -> EnedisStatisticsImporter:
+        """
+        Returns the importer of the long-term statistics
+        :return: the importer
+        """
+        return self._statistics_importer
+
+    def get_option(self, key: str, default: Any) -> Any:
+        """
+        Returns an option of the configuration entry
+        :param key: the key
+        :param default: the default value
+        :return: the value
+        """
+        if key in self._config_entry.options:
+            return self._config_entry.options[key]
+        if key in self._config_entry.data:
+            return self._config_entry.data[key]
+        return default
+
+    def get_tariff_engine(self) -> TariffEngine:
+        """
+        Returns the tariff engine built from the prices of the configuration and the off-peak hours of the contract
+        :return: the engine
+        """
+        if self._tariff_engine is None:
+            peak_price: float = float(self.get_option(PEAK_HOUR_COST_KEY, DEFAULT_PEAK_HOUR_COST))
+            off_peak_price: float = float(self.get_option(OFF_PEAK_HOUR_COST_KEY, DEFAULT_OFF_PEAK_HOUR_COST))
+            windows: tuple[tuple[int, int], ...] = parse_off_peak_hours(self._contract.offpeak_hours) if self._contract else ()
+            if windows:
+                tariff: TariffDefinition = TariffDefinition(option=TariffOptionEnum.PEAK_OFF_PEAK, base_price=peak_price, peak_price=peak_price, off_peak_price=off_peak_price, off_peak_windows=windows)
+            else:
+                tariff = TariffDefinition(option=TariffOptionEnum.BASE, base_price=peak_price)
+            self._tariff_engine = TariffEngine(tariff)
+        return self._tariff_engine
+
+    def compute_cost(self, start: datetime, end: datetime) -> float | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Returns the cost of the load curve of the local history between two dates
+        :param start: the start (inclusive)
+        :param end: the end (exclusive)
+        :return: the cost or None if the load curve is not available
+        """
+        timestamps, values = self._history_store.get_load_curve().slice(to_timestamp(start), to_timestamp(end))
+        if len(timestamps) == 0:
+            return None
+        return self.get_tariff_engine().total_cost(timestamps, values)
+
+    def compute_energy_split(self, start: datetime, end: datetime) -> tuple[int, int] | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Returns the energy consumed during the peak and the off-peak hours between two dates
+        :param start: the start (inclusive)
+        :param end: the end (exclusive)
+        :return: the peak and off-peak energy in Wh or None if the load curve is not available
+        """
+        timestamps, values = self._history_store.get_load_curve().slice(to_timestamp(start), to_timestamp(end))
+        if len(timestamps) == 0:
+            return None
+        return self.get_tariff_engine().energy_split(timestamps, values)
+
+    def get_fingerprint(self, datasets: tuple[str, ...]) -> tuple[int, ...]:
+        """
+        Returns the fingerprint of the datasets used by an entity
+        :param datasets: the datasets
+        :return: the fingerprint
+        """
+        return tuple(self._get_dataset_fingerprint(d) for d in datasets)
+
+    def _get_dataset_fingerprint(self, dataset: str) -> int:
+        """
+        Returns the fingerprint of a dataset
+        :param dataset: the dataset
+        :return: the fingerprint
+        """
+        if dataset == EnedisDatasetEnum.HISTORY:
+            return self._history_store.get_version()
+        if dataset == EnedisDatasetEnum.REFRESH:
+            return self._metrics.get_counter(REFRESHES_COUNTER) + self._metrics.get_counter(REFRESH_FAILURES_COUNTER)
+        return self._fingerprints.get(dataset)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """
+        Notify the entities using the datasets changed by the last refresh, all the entities are notified when the availability, the staleness or the day changes.
+        An entity notified less than its delay ago is notified again when the delay expires.
+        """
+        today: date = date.today()
+        changed: set[str] = self._changed
+        notify_all: bool = self.last_update_success != self._dispatched_success or not self.last_update_success or today != self._dispatched_day or self._stale_since != self._dispatched_stale_since
+        self._changed = set()
+        self._dispatched_day = today
+        self._dispatched_success = self.last_update_success
+        self._dispatched_stale_since = self._stale_since
+        now: float = time.monotonic()
+        for update_callback, context in list(self._listeners.values()):
+            datasets, delay = context if context else ((), 0)
+            if not notify_all and changed.isdisjoint(datasets):
+                continue
+            due: float = self._notified.get(update_callback, now - delay) + delay
+            if due <= now:
+                self._notified[update_callback] = now
+                update_callback()
+            else:
+                self._pending[update_callback] = due
+        self._schedule_pending()
+
+    @callback
+    def async_history_changed(self) -> None:
+        """
+        Notify the entities using the local history after a write outside of a refresh (backfill)
+        """
+        self._changed.add(EnedisDatasetEnum.HISTORY)
+        self.async_update_listeners()
+
+    def _schedule_pending(self) -> None:
+        """
+        Start the timer notifying the pending entities, a single timer is used for all the entities of the coordinator
+        """
+        if self._pending_timer is not None:
+            self._pending_timer.cancel()
+            # noinspection PyTypeChecker
+            self._pending_timer = None
+        if self._pending:
+            self._pending_timer = self._hass.loop.call_later(max(0.0, min(self._pending.values()) - time.monotonic()), self._notify_pending)
+
+    @callback
+    def _notify_pending(self) -> None:
+        """
+        Notify the pending entities whose delay expired
+        """
+        # noinspection PyTypeChecker
+        self._pending_timer = None
+        now: float = time.monotonic()
+        listeners: set[CALLBACK_TYPE] = {c for c, _ in self._listeners.values()}
+        for update_callback, due in list(self._pending.items()):
+            if update_callback not in listeners:
+                # the entity was removed
+                del self._pending[update_callback]
+                self._notified.pop(update_callback, None)
+            elif due <= now:
+                del self._pending[update_callback]
+                self._notified[update_callback] = now
+                update_callback()
+        self._schedule_pending()
+
+    def get_snapshot(self) -> EnedisDataSnapshot:
+        """
+        Returns the data of the last successful refresh
+        :return: the snapshot or None
+        """
+        return self.data
+
+    async def _async_fetch_dataset(self, dataset: str, key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Fetch a dataset if an enabled sensor or the options use it, a dataset requested again while it is fetched joins the request in progress
+        :param dataset: the dataset
+        :param key: the key of the request
+        :param function: the function fetching the dataset
+        :return: the response or None if the dataset is not used
+        """
+        if dataset not in self._datasets:
+            return None
+        return await self._single_flight.async_run(key, function)
 
-    async def async_update_data(self, *_):
+    async def _async_fetch_snapshot(self) -> EnedisDataSnapshot:
         """
-        Update the data
+        Fetch the datasets of the PDL once and build the snapshot shared by the entities.
+        A dataset failing while the others are fetched is replaced by the one of the previous snapshot.
+        :return: the snapshot
         """
+        today: date = date.today()
+        datasets: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.LOAD_CURVE, EnedisDatasetEnum.MAX_POWER)
+        responses: list[Any] = await asyncio.gather(
+            self._async_fetch_dataset(EnedisDatasetEnum.DAILY_CONSUMPTION, DAILY_CONSUMPTION_PATH, lambda: self._api_helper.get_daily_consumption(today - timedelta(days=DAILY_HISTORY_DAYS), today)),
+            self._async_fetch_dataset(EnedisDatasetEnum.LOAD_CURVE, CONSUMPTION_LOAD_CURVE_PATH, lambda: self._api_helper.get_consumption_load_curve_increment(today)),
+            self._async_fetch_dataset(EnedisDatasetEnum.MAX_POWER, DAILY_CONSUMPTION_MAX_POWER_PATH, lambda: self._api_helper.get_daily_consumption_max_power(today - timedelta(days=MAX_POWER_HISTORY_DAYS), today)),
+            return_exceptions=True
+        )
+        daily, load_curve, max_power = responses
+        errors: dict[str, BaseException] = {d: r for d, r in zip(datasets, responses) if isinstance(r, BaseException)}
+        self._kept_datasets = frozenset(errors)
+        previous: EnedisDataSnapshot = self.data
+        if errors:
+            # a cancelled fetch cancels the refresh
+            error: BaseException = next((e for e in errors.values() if not isinstance(e, Exception)), next(iter(errors.values())))
+            # the refresh fails if nothing was fetched or if there is no previous data
+            if previous is None or not isinstance(error, Exception) or errors.keys() >= self._datasets.intersection(datasets):
+                raise error
+            self._logger.warning("Fetch of %s failed for %s (%s), the previous data is kept", ', '.join(errors), self._pdl, error)
+            daily = previous.daily_consumption if EnedisDatasetEnum.DAILY_CONSUMPTION in errors else daily
+            load_curve = previous.load_curve if EnedisDatasetEnum.LOAD_CURVE in errors else load_curve
+        if self._contract is None and EnedisDatasetEnum.CONTRACT in self._datasets:
+            # the contract rarely changes, it is fetched once by setup
+            try:
+                self._contract = parse_contract(await self._single_flight.async_run(CONTRACTS_PATH, self._api_helper.get_contracts), self._pdl)
+                # noinspection PyTypeChecker
+                self._tariff_engine = None
+            except Exception as e:  # pylint: disable=broad-except
+                # the snapshot is built without contract, the fetch is attempted again by the next refresh
+                self._logger.warning("Fetch of the contract failed for %s (%s), it will be fetched again on the next refresh", self._pdl, e)
+        history_version: int = self._history_store.get_version()
+        started: float = time.perf_counter()
+        result: EnedisDataSnapshot = EnedisDataSnapshot(
+            pdl=self._pdl,
+            fetched_at=datetime.now(),
+            daily_consumption=daily if daily is not None else MeterReadings(),
+            load_curve=load_curve if load_curve is not None else MeterReadings(),
+            max_power=previous.max_power if EnedisDatasetEnum.MAX_POWER in errors else parse_max_power_readings(max_power),
+            contract=self._contract
+        )
+        await self._history_store.async_write(result.daily_consumption, result.load_curve)
+        await self._statistics_importer.async_import()
+        self._metrics.observe(AGGREGATE_HISTOGRAM, time.perf_counter() - started)
+        fingerprints: dict[str, int] = result.get_fingerprints()
+        self._changed = {d for d, f in fingerprints.items() if self._fingerprints.get(d) != f}
+        if history_version != self._history_store.get_version():
+            self._changed.add(EnedisDatasetEnum.HISTORY)
+        self._fingerprints = fingerprints
+        return result
+
+    async def async_update_data(self, *_) -> EnedisDataSnapshot:
+        """
+        Update the data.
+        When the refresh fails, the last good snapshot is served and marked as stale, the next refresh is delayed exponentially.
+        """
+        _LOGGER.info("Retrieving latest data...")
+        started: float = time.perf_counter()
         # noinspection PyBroadException
         try:
-            return await self.hass.async_add_executor_job(self.update_data)
-        except Exception as e:
-            raise Exception(e) from e  # pylint: disable=broad-exception-raised
+            result: EnedisDataSnapshot = await self._async_fetch_snapshot()
+        except Exception as e:  # pylint: disable=broad-except
+            return self._handle_failure(e)
+        finally:
+            self._metrics.observe(REFRESH_HISTOGRAM, time.perf_counter() - started)
+        self._metrics.increment(REFRESHES_COUNTER)
+        self._changed.add(EnedisDatasetEnum.REFRESH)
+        if self._kept_datasets:
+            # the datasets kept from the previous snapshot are stale until they are fetched again
+            if self._stale_since is None:
+                self._stale_since = datetime.now()
+        else:
+            self._failures = 0
+            # noinspection PyTypeChecker
+            self._stale_since = None
+        # the next refresh is scheduled by the coordinator using the interval set here
+        self.update_interval = self._scheduler.next_interval(result, datetime.now())
+        return result
+
+    def _handle_failure(self, error: Exception) -> EnedisDataSnapshot:
+        """
+        Handle a failed refresh
+        :param error: the error
+        :return: the last good snapshot
+        """
+        self._metrics.increment(REFRESH_FAILURES_COUNTER)
+        self._changed = {EnedisDatasetEnum.REFRESH}
+        self._failures += 1
+        delay: float = backoff_delay(self._failures, REFRESH_RETRY_BASE_DELAY, REFRESH_RETRY_MAX_DELAY)
+        if isinstance(error, (CircuitOpen, QuotaExceeded)):
+            # no request is sent before the circuit is probed again or before the delay requested by the API
+            delay = max(delay, error.retry_after)
+        self.update_interval = timedelta(seconds=delay)
+        snapshot: EnedisDataSnapshot = self.data
+        if snapshot is None:
+            raise UpdateFailed(f"Data of {self._pdl} not available: {error}") from error
+        if self._stale_since is None:
+            self._stale_since = datetime.now()
+        self._metrics.increment(STALE_REFRESHES_COUNTER)
+        self._logger.warning("Refresh of %s failed (%s), the data fetched at %s is served, next attempt in %.0fs", self._pdl, error, snapshot.fetched_at, delay)
+        return snapshot
+
+    async def async_request_update(self) -> None:
+        """
+        Refresh the data on demand (update event).
+        The refresh is skipped if the data is younger than the minimum refresh age and not stale, the requests received during a refresh join it.
+        """
+        snapshot: EnedisDataSnapshot = self.data
+        if snapshot is not None and self._stale_since is None and datetime.now() - snapshot.fetched_at < self._min_refresh_age:
+            _LOGGER.debug("Data of %s fetched at %s, refresh skipped", self._pdl, snapshot.fetched_at)
+            return
+        await self._single_flight.async_run(REFRESH_KEY, self.async_refresh)
 
-    def setup(self) -> None:
+    async def async_setup(self, *_):
         """
         Configure the coordinator
         """
+        await self._fetch_state.async_load()
+        await self._history_store.async_open()
 
-    async def async_setup(self, *_):
+    async def async_shutdown(self) -> None:
         """
-        Configure the coordinator
+        Stop the coordinator and release the local history
         """
-        # noinspection PyBroadException
-        try:
-            return await self.hass.async_add_executor_job(self.setup)
-        except Exception as e:
-            raise Exception(e) from e  # pylint: disable=broad-exception-raised
+        await super().async_shutdown()
+        self._single_flight.cancel()
+        if self._pending_timer is not None:
+            self._pending_timer.cancel()
+            # noinspection PyTypeChecker
+            self._pending_timer = None
+        self._pending.clear()
+        self._notified.clear()
+        await self._history_store.async_close()
 
 
-class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):  # pylint: disable=too-many-instance-attributes
+class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):
     """
-    The abstract coordinator
+    The abstract coordinator.
+    The coordinator notifies the entity when one of its datasets changed, at most once by the delay of its definition.
     """
+    # the datasets used to compute the state
+    DATASETS: tuple[str, ...] = ()
+    # the attributes changing with each update are not recorded, the series are served by the get_history service and the websocket command
+    _unrecorded_attributes = frozenset({LAST_UPDATE_ATTR, LAST_CALL_ATTR, VERSION_KEY})
 
     def __init__(self, definition: dict[str, Any], coordinator: EnedisDataUpdateCoordinator):
         """
@@ -132,46 +526,23 @@ class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):  # pylin
         :param definition: the sensor definition
         :param coordinator: the parent coordinator
         """
-        super().__init__(coordinator)
-        self._logger = logging.getLogger(__class__.__name__)
-        for handler in LOGGER.handlers:
-            self._logger.addHandler(handler)
-            self._logger.setLevel(LOGGER.level)
-        self._logger.debug("Building a %s", __class__.__name__)
+        # the context of the listener registered on the coordinator
+        super().__init__(coordinator, (self.DATASETS, definition[ENTITY_DELAY_KEY]))
+        self._logger = _LOGGER.getChild(type(self).__name__)
+        self._logger.debug("Building a %s", type(self).__name__)
         self._definition: dict[str, Any] = definition
         self._coordinator: EnedisDataUpdateCoordinator = coordinator
-        self._api_helper: EnedisApiHelper = EnedisApiHelper(coordinator.get_client())
         self._update_interval: int = definition[ENTITY_DELAY_KEY]
         self._attributes: dict[str, Any] = {}
         # noinspection PyTypeChecker
         self._state: str = None
         self._unit: str = definition[ENTITY_UNIT_KEY]
         # noinspection PyTypeChecker
-        self._last_state: str = None
-        self._last_attributes: dict[str, str] = {}
-        # noinspection PyTypeChecker
-        self._last_update_date: str = None
+        self._last_reset_date: datetime = None
+        self._logger.debug("Refresh interval: %s in seconds", self._update_interval)
+        self._version: str = get_defaults(coordinator.hass).version
         # noinspection PyTypeChecker
-        self._last_call_date: str = None
-        # noinspection PyTypeChecker
-        self._last_reset_date: str = None
-        # noinspection PyTypeChecker
-        self._date: datetime = None
-        # noinspection PyTypeChecker
-        self._activation_date: str = None
-        # noinspection PyTypeChecker
-        self._start_date: str = None
-        # noinspection PyTypeChecker
-        self._end_date: str = None
-        self.update = Throttle(timedelta(seconds=self._update_interval))(self._update)
-        self._logger.info("Refresh interval: %s in seconds", self._update_interval)
-        self._version: str = VERSION
-        self._success: bool = True
-        self._calls_count: int = 0
-        # noinspection PyTypeChecker
-        self._data: str = None
-
-        self._value = 0
+        self._fingerprint: tuple = None
 
     def get_definition(self) -> dict[str, Any]:
         """
@@ -224,12 +595,18 @@ class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):  # pylin
         """
         coordinator: EnedisDataUpdateCoordinator = self._coordinator
         if coordinator:
-            client: EnedisClient = coordinator.get_client()
-            if client:
-                return client.get_pdl()
+            return coordinator.get_pdl()
         # noinspection PyTypeChecker
         return None
 
+    @property
+    def device_info(self) -> DeviceInfo:
+        """
+        Return the device of the PDL, grouping the entities of the meter
+        :return: the device
+        """
+        return DeviceInfo(identifiers={(DOMAIN, self.get_pdl())}, name=f"Enedis {self.get_pdl()}", manufacturer="Enedis", model="Linky")
+
     def get_version(self) -> str:
         """
         Return the version
@@ -237,6 +614,34 @@ class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):  # pylin
         """
         return self._version
 
+    def get_api_helper(self) -> EnedisApiHelper:
+        """
+        Returns the helper of the API
+        :return: the helper
+        """
+        return self._coordinator.get_api_helper()
+
+    def get_history_store(self) -> EnedisHistoryStore:
+        """
+        Returns the local history of the PDL
+        :return: the store
+        """
+        return self._coordinator.get_history_store()
+
+    def get_snapshot(self) -> EnedisDataSnapshot:
+        """
+        Return the data shared by the entities of the coordinator
+        :return: the snapshot or None if no data was fetched yet
+        """
+        return self._coordinator.get_snapshot()
+
+    def get_price(self) -> float:
+        """
+        Return the price of a kWh
+        :return: the price
+        """
+        return float(self._coordinator.get_option(PEAK_HOUR_COST_KEY, DEFAULT_PEAK_HOUR_COST))
+
     async def async_added_to_hass(self) -> None:
         """
         Handle entity which will be added
@@ -251,33 +656,53 @@ class AbstractCoordinatorEntity(CoordinatorEntity, RestoreEntity, ABC):  # pylin
                 self._attributes = state.attributes
         except Exception:  # pylint: disable=broad-except
             self._logger.exception("Restart encountered")
+        self._refresh_state()
 
-        @callback
-        def update():
-            """
-            Update the state
-            """
-            self._update_state()
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """
+        Update the state when the coordinator has new data, the state is written only if it changed
+        """
+        if self._refresh_state():
+            self._coordinator.get_metrics().increment(ENTITY_WRITES_COUNTER)
             self.async_write_ha_state()
-
-        self.async_on_remove(self.coordinator.async_add_listener(update))
+        else:
+            self._coordinator.get_metrics().increment(ENTITY_SKIPPED_WRITES_COUNTER)
+
+    def _refresh_state(self) -> bool:
+        """
+        Update the state if the data changed since the last update
+        :return: True if the state or the attributes changed
+        """
+        # the entities depend on the current day (yesterday, current month...)
+        stale_since: datetime = self._coordinator.get_stale_since()
+        fingerprint: tuple = (self._coordinator.get_fingerprint(self.DATASETS), date.today(), stale_since)
+        if fingerprint == self._fingerprint:
+            return False
+        self._fingerprint = fingerprint
+        previous_state: str = self._state
+        previous_attributes: dict[str, Any] = self._attributes
         self._update_state()
+        if stale_since is not None:
+            # the state is computed from the last good snapshot while the refreshes fail
+            self._attributes = {**self._attributes, STALE_SINCE_ATTR: stale_since.strftime(DATE_TIME_FORMAT)}
+        if self._state == previous_state and _same_attributes(self._attributes, previous_attributes):
+            # the previous dictionary is kept, so the time of the last update is the time of the last change
+            self._attributes = previous_attributes
+            return False
+        self._attributes = {**self._attributes, LAST_UPDATE_ATTR: datetime.now().strftime(DATE_TIME_FORMAT)}
+        # the states of all the entities are dumped here, only when they changed
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("State is now: %s", self._state)
+            self._logger.debug("Attributes are now: %s", self._attributes)
+        return True
 
     async def _async_update(self) -> None:
         """
         Update state asynchronously
         """
-        self._update_state()
-        self.async_write_ha_state()
-
-    def _update(self) -> None:
-        """
-        Update the data
-        """
-        self._attributes = {
-            ATTR_ATTRIBUTION: EMPTY_STRING
-        }
-        self._state = "unavailable"
+        if self._refresh_state():
+            self.async_write_ha_state()
 
     @abstractmethod
     def _update_state(self) -> None:
@@ -290,6 +715,7 @@ class EnedisSensorCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The main coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.MAX_POWER, EnedisDatasetEnum.CONTRACT)
 
     @property
     def unique_id(self):
@@ -312,32 +738,44 @@ class EnedisSensorCoordinatorEntity(AbstractCoordinatorEntity):
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING
         }
-        today: date = date.today()
-        now: datetime = datetime.now()
+        yesterday: date = date.today() - timedelta(days=1)
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
+        attributes: dict[str, Any] = {}
         attributes[VERSION_KEY] = self._version
         attributes[COUNTER_TYPE_ATTR] = EnedisSensorTypeEnum.CONSUMPTION
         attributes[PDL_ATTR] = self.get_pdl()
         # yesterday consummate max power
-
-        # TODO
-        attributes[ACTIVATION_DATE_ATTR] = self._activation_date
-        attributes[LAST_CALL_ATTR] = self._last_call_date
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        max_power: MaxPowerReading = snapshot.get_max_power(yesterday)
+        if max_power is not None:
+            state = str(round(max_power.value / 1000, 3))
+            attributes[YESTERDAY_CONSUMPTION_MAX_POWER_ATTR] = max_power.value
+            attributes[YESTERDAY_CONSUMPTION_MAX_POWER_TIME_ATTR] = max_power.time.strftime(DATE_TIME_FORMAT)
+        consumption: int = snapshot.get_daily_consumption(yesterday)
+        if consumption is not None:
+            attributes[YESTERDAY_ATTR] = consumption
+        # noinspection PyTypeChecker
+        activation_date: date = None
+        if snapshot.contract is not None:
+            activation_date = snapshot.contract.last_activation_date
+            attributes[SUBSCRIBED_POWER_ATTR] = snapshot.contract.subscribed_power
+            attributes[OFFPEAK_HOURS_ATTR] = snapshot.contract.offpeak_hours
+        attributes[ACTIVATION_DATE_ATTR] = activation_date.isoformat() if activation_date is not None else None
+        attributes[LAST_CALL_ATTR] = snapshot.fetched_at.strftime(DATE_TIME_FORMAT)
         self._attributes.update(attributes)
         self._state = state
-        self._logger.debug("State is now: %s", self._state)
-        self._logger.debug("Attributes are now: %s", self._attributes)
 
 
 class EnedisConsumedHistoryCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The history coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.HISTORY, EnedisDatasetEnum.CONTRACT)
 
     def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator, details_type: EnedisHistoryDetailsTypeEnum):
         """
@@ -370,13 +808,27 @@ class EnedisConsumedHistoryCoordinatorEntity(AbstractCoordinatorEntity):
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
         # data from yesterday are not always available
-        today: date = date.today()
-        now: datetime = datetime.now()
+        yesterday: date = date.today() - timedelta(days=1)
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
-        # TODO
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        attributes: dict[str, Any] = {}
+        if self._details_type == EnedisHistoryDetailsTypeEnum.ALL:
+            history: EnedisHistoryStore = self._coordinator.get_history_store()
+            consumption: int = history.get_daily_value(yesterday)
+            if consumption is not None:
+                state = str(consumption / 1000)
+                attributes[YESTERDAY_ATTR] = consumption
+            attributes[CURRENT_MONTH_ATTR] = history.get_daily_consumption(yesterday.replace(day=1), yesterday + timedelta(days=1))
+        else:
+            start: datetime = datetime.combine(yesterday, datetime.min.time())
+            split: tuple[int, int] = self._coordinator.compute_energy_split(start, start + timedelta(days=1))
+            if split is not None:
+                consumption = split[0] if self._details_type == EnedisHistoryDetailsTypeEnum.PEAK_HOURS else split[1]
+                state = str(consumption / 1000)
+                attributes[YESTERDAY_ATTR] = consumption
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING,
             ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
@@ -384,14 +836,13 @@ class EnedisConsumedHistoryCoordinatorEntity(AbstractCoordinatorEntity):
         }
         self._attributes.update(attributes)
         self._state = state
-        self._logger.debug("State is now: %s", self._state)
-        self._logger.debug("Attributes are now: %s", self._attributes)
 
 
 class EnedisConsumedEnergyDetailsCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The consumption details coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.LOAD_CURVE,)
 
     def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator, details_type: EnedisDetailsPeriodEnum):
         """
@@ -424,29 +875,31 @@ class EnedisConsumedEnergyDetailsCoordinatorEntity(AbstractCoordinatorEntity):
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
-        today: date = date.today()
-        now: datetime = datetime.now()
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
-        # TODO
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        attributes: dict[str, Any] = {}
+        hour: IntervalReading = snapshot.get_last_complete_hour()
+        if self._details_type == EnedisDetailsPeriodEnum.HOURS and hour is not None:
+            state = str(hour.value / 1000)
+            self._last_reset_date = hour.start
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING,
             ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
             ATTR_STATE_CLASS: SensorStateClass.TOTAL,
             ATTR_UNIT_OF_MEASUREMENT: self._unit,
-            ATTR_LAST_RESET: self._last_reset_date
+            ATTR_LAST_RESET: self._last_reset_date.isoformat() if self._last_reset_date is not None else None
         }
         self._attributes.update(attributes)
         self._state = state
-        self._logger.debug("State is now: %s", self._state)
-        self._logger.debug("Attributes are now: %s", self._attributes)
 
 
 class EnedisConsumedEnergyCostDetailsCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The consumption cost details coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.LOAD_CURVE, EnedisDatasetEnum.HISTORY, EnedisDatasetEnum.CONTRACT)
 
     def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator, details_type: EnedisDetailsPeriodEnum):
         """
@@ -479,18 +932,24 @@ class EnedisConsumedEnergyCostDetailsCoordinatorEntity(AbstractCoordinatorEntity
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
-        today: date = date.today()
-        now: datetime = datetime.now()
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
-        # TODO
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        attributes: dict[str, Any] = {}
+        hour: IntervalReading = snapshot.get_last_complete_hour()
+        if self._details_type == EnedisDetailsPeriodEnum.HOURS and hour is not None:
+            cost: float = self._coordinator.compute_cost(hour.start, hour.start + timedelta(hours=1))
+            if cost is None:
+                cost = hour.value / 1000 * self.get_price()
+            state = str(round(cost, 4))
+            self._last_reset_date = hour.start
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING,
             ATTR_DEVICE_CLASS: SensorDeviceClass.MONETARY,
             ATTR_STATE_CLASS: SensorStateClass.TOTAL,
             ATTR_UNIT_OF_MEASUREMENT: self._unit,
-            ATTR_LAST_RESET: self._last_reset_date
+            ATTR_LAST_RESET: self._last_reset_date.isoformat() if self._last_reset_date is not None else None
         }
         self._attributes.update(attributes)
         self._state = state
@@ -500,6 +959,7 @@ class EnedisConsumedDailyCostCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The daily consumption history coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.HISTORY, EnedisDatasetEnum.CONTRACT)
 
     def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator, days: int):
         """
@@ -532,12 +992,27 @@ class EnedisConsumedDailyCostCoordinatorEntity(AbstractCoordinatorEntity):
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
-        today: date = date.today()
-        now: datetime = datetime.now()
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
+        day: date = date.today() - timedelta(days=self._days)
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
-        # TODO
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        attributes: dict[str, Any] = {}
+        start: datetime = datetime.combine(day, datetime.min.time())
+        # the load curve gives the cost using the peak and off-peak prices, otherwise the daily consumption is used with the peak price
+        cost: float = self._coordinator.compute_cost(start, start + timedelta(days=1))
+        if cost is None:
+            consumption: int = snapshot.get_daily_consumption(day)
+            if consumption is None:
+                # older days are read from the local history
+                consumption = self._coordinator.get_history_store().get_daily_value(day)
+            if consumption is not None:
+                cost = consumption / 1000 * self.get_price()
+        if cost is not None:
+            state = str(round(cost, 2))
+        month_cost: float = self._coordinator.compute_cost(start.replace(day=1), start + timedelta(days=1))
+        if month_cost is not None:
+            attributes[CURRENT_MONTH_ATTR] = round(month_cost, 2)
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING,
             ATTR_DEVICE_CLASS: SensorDeviceClass.MONETARY,
@@ -551,6 +1026,7 @@ class EnedisConsumedEnergyCoordinatorEntity(AbstractCoordinatorEntity):
     """
     The energy consumption coordinator
     """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.DAILY_CONSUMPTION,)
 
     @property
     def unique_id(self):
@@ -573,18 +1049,178 @@ class EnedisConsumedEnergyCoordinatorEntity(AbstractCoordinatorEntity):
         Update the sensors state
         """
         self._logger.debug("Updating state of %s", self.get_pdl())
-        today: date = date.today()
-        now: datetime = datetime.now()
+        snapshot: EnedisDataSnapshot = self.get_snapshot()
+        if snapshot is None:
+            return
+        yesterday: date = date.today() - timedelta(days=1)
         state: str = UNAVAILABLE_STATE
-        attributes: dict[str, Any] = defaultdict(int)
-        # TODO
-        attributes[LAST_UPDATE_ATTR] = now.strftime(DATE_TIME_FORMAT)
+        attributes: dict[str, Any] = {}
+        consumption: int = snapshot.get_daily_consumption(yesterday)
+        if consumption is not None:
+            state = str(consumption / 1000)
+            self._last_reset_date = datetime.combine(yesterday, datetime.min.time())
         self._attributes = {
             ATTR_ATTRIBUTION: EMPTY_STRING,
             ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
             ATTR_STATE_CLASS: SensorStateClass.TOTAL,
             ATTR_UNIT_OF_MEASUREMENT: self._unit,
-            ATTR_LAST_RESET: self._last_reset_date
+            ATTR_LAST_RESET: self._last_reset_date.isoformat() if self._last_reset_date is not None else None
         }
         self._attributes.update(attributes)
         self._state = state
+
+
+class EnedisConsumedRollingEnergyCoordinatorEntity(AbstractCoordinatorEntity):
+    """
+    The coordinator of the energy consumed during the last days, read from the sums by day of the local history
+    """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.HISTORY,)
+
+    def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator):
+        """
+        The constructor
+        :param definition: the sensor definition
+        :param parent: the parent coordinator
+        """
+        super().__init__(definition, parent)
+        self._days: int = definition[ENTITY_DAYS_KEY]
+
+    @property
+    def unique_id(self):
+        """
+        Returns the unique identifier
+        :return: the unique identifier
+        """
+        return f"{DOMAIN}.{self.get_pdl()}_{SensorDeviceClass.ENERGY}_rolling_{self._days}"
+
+    @property
+    def name(self):
+        """
+        Returns the name
+        :return: the name
+        """
+        return f"{DOMAIN}.{self.get_pdl()}_{SensorDeviceClass.ENERGY}_rolling_{self._days}"
+
+    def _update_state(self) -> None:
+        """
+        Update the sensors state
+        """
+        self._logger.debug("Updating state of %s", self.get_pdl())
+        if self.get_snapshot() is None:
+            return
+        state: str = UNAVAILABLE_STATE
+        attributes: dict[str, Any] = {}
+        # the window ends with yesterday, the consumption of the current day is never available
+        rolling: tuple[int, int] = self._coordinator.get_history_store().get_rolling_consumption(date.today(), self._days)
+        if rolling is not None:
+            state = str(rolling[0] / 1000)
+            attributes[DAYS_ATTR] = rolling[1]
+        self._attributes = {
+            ATTR_ATTRIBUTION: EMPTY_STRING,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+            ATTR_UNIT_OF_MEASUREMENT: self._unit
+        }
+        self._attributes.update(attributes)
+        self._state = state
+
+
+class EnedisDiagnosticCoordinatorEntity(AbstractCoordinatorEntity):
+    """
+    The coordinator of a metric of the refreshes or of the calls of the API, updated after each refresh
+    """
+    DATASETS: tuple[str, ...] = (EnedisDatasetEnum.REFRESH,)
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, definition: dict[str, Any], parent: EnedisDataUpdateCoordinator):
+        """
+        The constructor
+        :param definition: the sensor definition
+        :param parent: the parent coordinator
+        """
+        super().__init__(definition, parent)
+        self._metric: str = definition[ENTITY_METRIC_KEY]
+        self._type: str = definition[ENTITY_NAME_KEY]
+
+    @property
+    def unique_id(self):
+        """
+        Returns the unique identifier
+        :return: the unique identifier
+        """
+        return f"{DOMAIN}.{self.get_pdl()}_{self._type}"
+
+    @property
+    def name(self):
+        """
+        Returns the name
+        :return: the name
+        """
+        return f"{DOMAIN}.{self.get_pdl()}_{self._type}"
+
+    @property
+    def icon(self):
+        """
+        Icon to use in the frontend
+        """
+        return "mdi:chart-box-outline"
+
+    def _update_state(self) -> None:
+        """
+        Update the sensors state
+        """
+        state: str = UNAVAILABLE_STATE
+        attributes: dict[str, Any] = {}
+        if self._metric == REFRESH_HISTOGRAM:
+            histogram: LatencyHistogram = self._coordinator.get_metrics().get_histogram(REFRESH_HISTOGRAM)
+            if histogram is not None:
+                state = str(round(histogram.last * 1000))
+                attributes[COUNT_ATTR] = histogram.count
+                attributes[AVERAGE_ATTR] = round(histogram.total / histogram.count * 1000)
+                attributes[MAXIMUM_ATTR] = round(histogram.maximum * 1000)
+        else:
+            # the counters of the client are shared by the PDL of the configuration entry
+            state = str(self._coordinator.get_client().get_metrics().get_counter(self._metric))
+        self._attributes = {
+            ATTR_ATTRIBUTION: EMPTY_STRING,
+            ATTR_UNIT_OF_MEASUREMENT: self._unit
+        }
+        self._attributes.update(attributes)
+        self._state = state
+
+
+# the classes of the entities by sensor type
+SENSOR_ENTITY_CLASSES: dict[str, type[AbstractCoordinatorEntity]] = {
+    SensorTypeEnum.MAIN_SENSOR_TYPE: EnedisSensorCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_HISTORY_SENSOR_TYPE: EnedisConsumedHistoryCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_HISTORY_PEAK_HOURS_SENSOR_TYPE: EnedisConsumedHistoryCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_HISTORY_OFF_PEAK_HOURS_SENSOR_TYPE: EnedisConsumedHistoryCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE: EnedisConsumedDailyCostCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_SENSOR_TYPE: EnedisConsumedEnergyCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_SENSOR_TYPE: EnedisConsumedEnergyDetailsCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_COST_SENSOR_TYPE: EnedisConsumedEnergyCostDetailsCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_ROLLING_WEEK_SENSOR_TYPE: EnedisConsumedRollingEnergyCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_ROLLING_MONTH_SENSOR_TYPE: EnedisConsumedRollingEnergyCoordinatorEntity,
+    SensorTypeEnum.CONSUMED_ENERGY_ROLLING_YEAR_SENSOR_TYPE: EnedisConsumedRollingEnergyCoordinatorEntity,
+    SensorTypeEnum.DIAGNOSTIC_REFRESH_DURATION_SENSOR_TYPE: EnedisDiagnosticCoordinatorEntity,
+    SensorTypeEnum.DIAGNOSTIC_API_CALLS_SENSOR_TYPE: EnedisDiagnosticCoordinatorEntity,
+    SensorTypeEnum.DIAGNOSTIC_API_THROTTLED_SENSOR_TYPE: EnedisDiagnosticCoordinatorEntity,
+    SensorTypeEnum.DIAGNOSTIC_API_ERRORS_SENSOR_TYPE: EnedisDiagnosticCoordinatorEntity
+}
+
+
+def get_fetched_datasets(sensors: Iterable[str], datasets: Iterable[str]) -> frozenset[str]:
+    """
+    Return the datasets fetched from the API: the ones used by the enabled sensors and the ones selected by the options
+    :param sensors: the types of the enabled sensors
+    :param datasets: the datasets selected by the options
+    :return: the datasets
+    """
+    result: set[str] = set(datasets)
+    for sensor in sensors:
+        entity_class: type[AbstractCoordinatorEntity] = SENSOR_ENTITY_CLASSES.get(sensor)
+        if entity_class is not None:
+            result.update(entity_class.DATASETS)
+    if EnedisDatasetEnum.HISTORY in result:
+        # the local history is written from the daily consumption and the load curve
+        result.update((EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.LOAD_CURVE))
+    return frozenset(result.intersection(FETCHED_DATASETS))
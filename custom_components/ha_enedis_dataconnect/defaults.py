@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The defaults of the custom component: the version of the manifest and the default configuration of the optional default.json file.
+They are loaded once by async_setup, the file being read in an executor, and cached in the data of Home Assistant.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.loader import async_get_integration
+
+from .const import DOMAIN, VERSION, INTEGRATION_PATH, DEFAULT_PDL, DEFAULT_CLIENT_ID, DEFAULT_CLIENT_SECRET, PDL_KEY, CLIENT_ID_KEY, CLIENT_SECRET_KEY
+
+_LOGGER = logging.getLogger(__name__)
+DATA_DEFAULTS: str = DOMAIN + "_defaults"
+DEFAULT_CONFIGURATION_FILE: str = 'default.json'
+
+
+@dataclass(frozen=True)
+class EnedisDefaults:
+    """
+    The defaults of the custom component
+    """
+    version: str = VERSION
+    pdl: str = DEFAULT_PDL
+    client_id: str = DEFAULT_CLIENT_ID
+    client_secret: str = DEFAULT_CLIENT_SECRET
+
+
+def _read_configuration(path: Path) -> dict[str, Any]:
+    """
+    Read the default configuration (blocking)
+    :param path: the path of the file
+    :return: the configuration or an empty dictionary if the file does not exist
+    """
+    if not path.exists():
+        _LOGGER.debug("Default configuration not found in file: %s", path.name)
+        return {}
+    _LOGGER.debug("Reading default configuration from file: %s", path.name)
+    with path.open(mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+async def async_load_defaults(hass: HomeAssistant) -> EnedisDefaults:
+    """
+    Load the defaults, the manifest is the one already parsed by Home Assistant
+    :param hass: the Home Assistant instance
+    :return: the defaults
+    """
+    defaults: EnedisDefaults = hass.data.get(DATA_DEFAULTS)
+    if defaults is not None:
+        return defaults
+    integration = await async_get_integration(hass, DOMAIN)
+    data: dict[str, Any] = await hass.async_add_executor_job(_read_configuration, INTEGRATION_PATH.joinpath(DEFAULT_CONFIGURATION_FILE))
+    defaults = EnedisDefaults(
+        version=str(integration.version) if integration.version is not None else VERSION,
+        pdl=data.get(PDL_KEY, DEFAULT_PDL),
+        client_id=data.get(CLIENT_ID_KEY, DEFAULT_CLIENT_ID),
+        client_secret=data.get(CLIENT_SECRET_KEY, DEFAULT_CLIENT_SECRET)
+    )
+    hass.data[DATA_DEFAULTS] = defaults
+    _LOGGER.debug("Defaults loaded, version: %s", defaults.version)
+    return defaults
+
+
+def get_defaults(hass: HomeAssistant) -> EnedisDefaults:
+    """
+    Return the defaults loaded by async_setup
+    :param hass: the Home Assistant instance
+    :return: the defaults or the built-in ones if they are not loaded yet
+    """
+    defaults: EnedisDefaults = hass.data.get(DATA_DEFAULTS)
+    return defaults if defaults is not None else EnedisDefaults()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The diagnostics of a configuration entry: the metrics of the client and of the coordinators
+"""
+import logging
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CLIENT_ID_KEY, CLIENT_SECRET_KEY, CLIENT_KEY, COORDINATORS_KEY, DOMAIN, PDL_KEY
+from .coordinators import EnedisDataUpdateCoordinator
+from .enedis_client import EnedisClient
+from .models import EnedisDataSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+TO_REDACT: set[str] = {CLIENT_ID_KEY, CLIENT_SECRET_KEY, PDL_KEY}
+
+
+def _get_coordinator_diagnostics(coordinator: EnedisDataUpdateCoordinator) -> dict[str, Any]:
+    """
+    Return the diagnostics of a coordinator
+    :param coordinator: the coordinator
+    :return: the diagnostics
+    """
+    snapshot: EnedisDataSnapshot = coordinator.get_snapshot()
+    result: dict[str, Any] = {
+        'last_update_success': coordinator.last_update_success,
+        'stale_since': coordinator.get_stale_since().isoformat() if coordinator.get_stale_since() is not None else None,
+        'datasets': sorted(coordinator.get_datasets()),
+        'sensors': sorted(coordinator.get_sensors()),
+        'metrics': coordinator.get_metrics().as_dict(),
+        'history': {
+            'days': len(coordinator.get_history_store().get_daily()),
+            'intervals': len(coordinator.get_history_store().get_load_curve())
+        }
+    }
+    if snapshot is not None:
+        result['snapshot'] = {
+            'fetched_at': snapshot.fetched_at.isoformat(),
+            'daily_consumption': len(snapshot.daily_consumption),
+            'load_curve': len(snapshot.load_curve),
+            'max_power': len(snapshot.max_power),
+            'contract': snapshot.contract is not None
+        }
+    return result
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """
+    Return the diagnostics of a configuration entry
+    :param hass: the Home Assistant instance
+    :param entry: the configuration entry
+    :return: the diagnostics
+    """
+    _LOGGER.debug("Building the diagnostics of %s", entry.entry_id)
+    client: EnedisClient = hass.data[DOMAIN][entry.entry_id][CLIENT_KEY]
+    coordinators: dict[str, EnedisDataUpdateCoordinator] = hass.data[DOMAIN][entry.entry_id][COORDINATORS_KEY]
+    # the PDL identify the customer, they are replaced by their position
+    return {
+        'entry': {
+            'data': async_redact_data(entry.data, TO_REDACT),
+            'options': async_redact_data(entry.options, TO_REDACT)
+        },
+        'client': {
+            'metrics': client.get_metrics().as_dict(),
+            'rate_limiter': client.get_rate_limiter().get_metrics(),
+            'response_cache': client.get_response_cache().get_metrics(),
+            'token_fetches': client.get_token_manager().get_fetch_count(),
+            'retry_budget': client.get_retry_budget().get_metrics(),
+            'circuit_breakers': {p: b.as_dict() for p, b in client.get_breakers().items()}
+        },
+        'coordinators': [_get_coordinator_diagnostics(c) for c in coordinators.values()]
+    }
@@ -0,0 +1,559 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The client of the Enedis data-connect API
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import aiohttp
+from homeassistant.core import HomeAssistant
+from homeassistant.util.ssl import get_default_context
+
+from .const import API_THROTTLED_ATTEMPTS, API_RETRY_ATTEMPTS, API_RETRY_BASE_DELAY, API_RETRY_MAX_DELAY, PDL_SEPARATOR, RequestPriorityEnum, ENDPOINT_URL, DAILY_CONSUMPTION_PATH, CONSUMPTION_LOAD_CURVE_PATH, DAILY_CONSUMPTION_MAX_POWER_PATH, CONTRACTS_PATH, DATE_FORMAT, HTTP_TIMEOUT, HTTP_POOL_SIZE, HTTP_KEEPALIVE_TIMEOUT, TRACE_SAMPLE_RATE, TRACE_MAX_BODY, LOAD_CURVE_HISTORY_DAYS, LOAD_CURVE_MAX_DAYS
+from .exceptions import EnedisClientError, InvalidClientId, InvalidClientSecret, InvalidPdl, InvalidResponse, CannotConnect, CircuitOpen, QuotaExceeded
+from .fetch_state import EnedisFetchState
+from .metrics import EnedisMetrics, CIRCUIT_REJECTED_COUNTER, RETRY_BUDGET_EXHAUSTED_COUNTER, REQUESTS_COUNTER, CACHE_HITS_COUNTER, NOT_MODIFIED_COUNTER, RETRIES_COUNTER, THROTTLED_COUNTER, ERRORS_COUNTER, BYTES_RECEIVED_COUNTER, DECODE_HISTOGRAM
+from .models import EPOCH, HALF_HOUR_SECONDS, MeterReadings
+from .readings_decoder import ReadingsDecoder
+from .resilience import CircuitBreaker, CircuitStateEnum, RetryBudget, backoff_delay
+from .rate_limiter import TokenBucketLimiter, get_rate_limiter
+from .response_cache import CachedResponse, EnedisResponseCache, compute_expiration, get_response_cache
+from .token_manager import EnedisTokenManager, get_token_manager
+
+_LOGGER = logging.getLogger(__name__)
+# logs samples of the bodies of the responses, enabled only by setting explicitly its level to debug (custom_components.ha_enedis_dataconnect.enedis_client.trace)
+_TRACE_LOGGER = logging.getLogger(__name__ + '.trace')
+USAGE_POINT_ID_PARAM: str = 'usage_point_id'
+START_PARAM: str = 'start'
+END_PARAM: str = 'end'
+# delay in seconds before sending again a request rejected because of the quota when the response does not specify it
+DEFAULT_RETRY_AFTER: float = 1.0
+# size in bytes of the chunks of the responses decoded while they are received
+STREAM_CHUNK_SIZE: int = 16 * 1024
+# the readings are streamed only from a JSON document, a page of a gateway is an invalid response
+JSON_CONTENT_TYPE: str = 'application/json'
+READINGS_KEY_SUFFIX: str = '#readings'
+PDL_PATTERN = re.compile(r'\d{14}')
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Return true if a request failed because of the network or of the API and can be sent again
+    :param error: the error
+    :return: true if the error is transient
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return True
+
+
+def split_pdls(value: str) -> list[str]:
+    """
+    Split the PDL of a configuration entry, several PDL being separated by commas
+    :param value: the PDL
+    :return: the list of PDL without duplicates
+    """
+    result: list[str] = []
+    for pdl in (value or '').split(PDL_SEPARATOR):
+        pdl = pdl.strip()
+        if pdl and pdl not in result:
+            result.append(pdl)
+    return result
+
+
+def is_valid_pdl(value: str) -> bool:
+    """
+    Return true if the value is a list of valid PDL
+    :param value: the PDL separated by commas
+    :return: true if all the PDL are valid
+    """
+    pdls: list[str] = split_pdls(value)
+    return len(pdls) > 0 and all(PDL_PATTERN.fullmatch(pdl) for pdl in pdls)
+
+
+class EnedisClient:  # pylint: disable=too-many-instance-attributes
+    """
+    The asynchronous client of the API.
+    A single HTTP session is kept by client (so by configuration entry), its connector pools the connections and keeps them alive.
+    The client is shared by all the PDL of the entry. Its requests wait for a token of the limiter of the application, shared by all the clients, in the order of their priority.
+    """
+
+    def __init__(self, hass: HomeAssistant, client_id: str, client_secret: str, redirect_uri: str):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param client_id: the client identifier
+        :param client_secret: the client secret
+        :param redirect_uri: the redirect URI
+        """
+        if not client_id:
+            raise InvalidClientId
+        if not client_secret:
+            raise InvalidClientSecret
+        self._hass: HomeAssistant = hass
+        self._client_id: str = client_id
+        self._client_secret: str = client_secret
+        self._redirect_uri: str = redirect_uri
+        # noinspection PyTypeChecker
+        self._session: aiohttp.ClientSession = None
+        self._token_manager: EnedisTokenManager = get_token_manager(hass)
+        self._rate_limiter: TokenBucketLimiter = get_rate_limiter(hass, client_id)
+        self._cache: EnedisResponseCache = get_response_cache(hass)
+        self._metrics: EnedisMetrics = EnedisMetrics()
+        self._trace_count: int = 0
+        self._retry_budget: RetryBudget = RetryBudget()
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get_client_id(self) -> str:
+        """
+        Return the client identifier
+        :return: the identifier
+        """
+        return self._client_id
+
+    def get_redirect_uri(self) -> str:
+        """
+        Return the redirect URI
+        :return: the URI
+        """
+        return self._redirect_uri
+
+    def get_metrics(self) -> EnedisMetrics:
+        """
+        Return the metrics of the calls of the API
+        :return: the metrics
+        """
+        return self._metrics
+
+    def get_retry_budget(self) -> RetryBudget:
+        """
+        Return the budget of the retries
+        :return: the budget
+        """
+        return self._retry_budget
+
+    def get_breaker(self, path: str) -> CircuitBreaker:
+        """
+        Return the circuit breaker of an endpoint
+        :param path: the path of the endpoint
+        :return: the breaker
+        """
+        breaker: CircuitBreaker = self._breakers.get(path)
+        if breaker is None:
+            breaker = CircuitBreaker(path)
+            self._breakers[path] = breaker
+        return breaker
+
+    def get_breakers(self) -> dict[str, CircuitBreaker]:
+        """
+        Return the circuit breakers by path
+        :return: the breakers
+        """
+        return dict(self._breakers)
+
+    def get_token_manager(self) -> EnedisTokenManager:
+        """
+        Return the token manager
+        :return: the manager
+        """
+        return self._token_manager
+
+    def get_response_cache(self) -> EnedisResponseCache:
+        """
+        Return the cache of the responses
+        :return: the cache
+        """
+        return self._cache
+
+    def get_rate_limiter(self) -> TokenBucketLimiter:
+        """
+        Return the limiter of the application
+        :return: the limiter
+        """
+        return self._rate_limiter
+
+    def is_connected(self) -> bool:
+        """
+        Return true if the session is opened
+        :return: true if the session is opened
+        """
+        return self._session is not None and not self._session.closed
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the HTTP session, creating it if needed
+        :return: the session
+        """
+        if not self.is_connected():
+            _LOGGER.debug("Opening the HTTP session")
+            connector: aiohttp.TCPConnector = aiohttp.TCPConnector(limit_per_host=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, ssl=get_default_context())
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT), raise_for_status=False)
+        return self._session
+
+    async def _async_get_token(self, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> str:
+        """
+        Return a valid access token, shared with the other clients using the same credentials
+        :param priority: the priority of the call to the token endpoint if a new token is needed
+        :return: the access token
+        """
+        return await self._token_manager.async_get_token(self._client_id, self._client_secret, priority)
+
+    async def connect(self, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> None:
+        """
+        Authenticate, the session is opened on the first request
+        :param priority: the priority of the authentication
+        """
+        await self._async_get_token(priority)
+
+    async def close(self) -> None:
+        """
+        Close the session and release the pooled connections
+        """
+        session: aiohttp.ClientSession = self._session
+        # noinspection PyTypeChecker
+        self._session = None
+        if session is not None and not session.closed:
+            _LOGGER.debug("Closing the HTTP session")
+            await session.close()
+
+    async def update_data(self) -> bool:
+        """
+        Make sure the session is opened and the access token is valid
+        :return: true if the client is ready
+        """
+        await self.connect()
+        return True
+
+    async def request(self, path: str, params: dict[str, str], priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> dict[str, Any]:
+        """
+        Call an endpoint of the API
+        :param path: the path of the endpoint
+        :param params: the query parameters
+        :param priority: the priority of the request
+        :return: the decoded response, which must not be modified as it is shared with the cache
+        """
+        return await self._async_send(path, params, priority, self._cache.build_key(path, params), self._read_json)
+
+    async def request_readings(self, path: str, params: dict[str, str], priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED, load_curve: bool = False) -> MeterReadings:
+        """
+        Call an endpoint returning readings, the readings are decoded while the response is received
+        :param path: the path of the endpoint
+        :param params: the query parameters
+        :param priority: the priority of the request
+        :param load_curve: true if the readings are the ones of a load curve
+        :return: the readings, which must not be modified as they are shared with the cache
+        """
+
+        async def _read_readings(response: aiohttp.ClientResponse) -> MeterReadings:
+            """
+            Decode the readings of the response
+            :param response: the response
+            :return: the readings
+            """
+            if response.content_type != JSON_CONTENT_TYPE:
+                raise ValueError(f"Unexpected content type: {response.content_type}")
+            decoder: ReadingsDecoder = ReadingsDecoder(load_curve)
+            size: int = 0
+            elapsed: float = 0.0
+            traced: bool = self._is_traced()
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                if traced and size == 0:
+                    self._trace(response, chunk)
+                # only the decoding is timed, not the wait for the chunks
+                started: float = time.perf_counter()
+                decoder.feed(chunk)
+                elapsed += time.perf_counter() - started
+                size += len(chunk)
+            started = time.perf_counter()
+            result: MeterReadings = decoder.close()
+            self._metrics.observe(DECODE_HISTOGRAM, elapsed + time.perf_counter() - started)
+            self._metrics.increment(BYTES_RECEIVED_COUNTER, size)
+            return result
+
+        return await self._async_send(path, params, priority, self._cache.build_key(path, params) + READINGS_KEY_SUFFIX, _read_readings)
+
+    async def _async_send(self, path: str, params: dict[str, str], priority: RequestPriorityEnum, key: str, reader: Callable[[aiohttp.ClientResponse], Awaitable[Any]]) -> Any:
+        """
+        Send a request.
+        A fresh cached response is returned without calling the API, an expired one is revalidated using its validators.
+        A request rejected because its access token has been revoked is sent again once with a new token.
+        When the quota is exceeded, the limiter is paused and the request waits its turn again, a request still rejected after its last attempt counts as a failure of the endpoint.
+        A request failing because of the network or of the API is sent again after an exponential delay while the retry budget allows it, a response which cannot be decoded is not sent again.
+        The requests of an endpoint failing repeatedly are rejected without being sent until its circuit breaker probes it again.
+        :param path: the path of the endpoint
+        :param params: the query parameters
+        :param priority: the priority of the request
+        :param key: the key of the response in the cache
+        :param reader: the function decoding the response
+        :return: the decoded response
+        """
+        cached: CachedResponse = self._cache.get(key)
+        if cached is not None and cached.is_fresh():
+            self._metrics.increment(CACHE_HITS_COUNTER)
+            return cached.body
+        breaker: CircuitBreaker = self.get_breaker(path)
+        # the request probing a half-open circuit releases the probe when it ends
+        probe: bool = breaker.get_state() == CircuitStateEnum.HALF_OPEN
+        if not breaker.allow():
+            self._metrics.increment(CIRCUIT_REJECTED_COUNTER)
+            raise CircuitOpen(path, breaker.get_retry_after())
+        self._retry_budget.record_request()
+        # the attempts rejected because of the quota and the attempts failing because of the network or of the API are counted apart
+        attempt: int = 1
+        throttled: int = 0
+        reauthenticated: bool = False
+        try:
+            while True:
+                token: str = await self._async_get_token(priority)
+                await self._rate_limiter.async_acquire(priority)
+                headers: dict[str, str] = {
+                    'Authorization': f"Bearer {token}",
+                    'Accept': 'application/json'
+                }
+                if cached is not None:
+                    headers.update(cached.get_conditional_headers())
+                self._metrics.increment(REQUESTS_COUNTER)
+                started: float = time.perf_counter()
+                delay: float = 0.0
+                try:
+                    async with self._get_session().get(ENDPOINT_URL + path, params=params, headers=headers) as response:
+                        if response.status == 429:
+                            self._metrics.increment(THROTTLED_COUNTER)
+                            throttled += 1
+                            retry_after: float = self._get_retry_after(response)
+                            if throttled >= API_THROTTLED_ATTEMPTS:
+                                raise QuotaExceeded(path, retry_after)
+                            self._rate_limiter.pause(retry_after)
+                            continue
+                        if response.status == 401 and not reauthenticated:
+                            # the token has been revoked, the request is sent again once with a new token
+                            self._token_manager.invalidate(self._client_id, self._client_secret, token)
+                            reauthenticated = True
+                            continue
+                        if response.status == 304 and cached is not None:
+                            self._metrics.increment(NOT_MODIFIED_COUNTER)
+                            breaker.record_success()
+                            return self._cache.revalidate(key, cached, compute_expiration(params)).body
+                        self._check(response, token, params)
+                        body: Any = await reader(response)
+                        if priority != RequestPriorityEnum.BACKFILL:
+                            # the closed periods of a backfill are read once, caching them would evict the responses of the polls
+                            self._cache.put(key, body, response.headers.get('ETag'), response.headers.get('Last-Modified'), compute_expiration(params))
+                        breaker.record_success()
+                        return body
+                except (aiohttp.ClientError, TimeoutError) as e:
+                    self._metrics.increment(ERRORS_COUNTER)
+                    if not _is_transient(e):
+                        # the endpoint answered, the request itself is rejected
+                        breaker.record_success()
+                        raise CannotConnect(str(e)) from e
+                    breaker.record_failure()
+                    # a circuit opened by the failures is probed by a next request, not by a retry
+                    if attempt >= API_RETRY_ATTEMPTS or breaker.get_state() != CircuitStateEnum.CLOSED:
+                        raise CannotConnect(str(e)) from e
+                    if not self._retry_budget.try_acquire():
+                        self._metrics.increment(RETRY_BUDGET_EXHAUSTED_COUNTER)
+                        raise CannotConnect(str(e)) from e
+                    delay = backoff_delay(attempt, API_RETRY_BASE_DELAY, API_RETRY_MAX_DELAY)
+                    attempt += 1
+                    self._metrics.increment(RETRIES_COUNTER)
+                    _LOGGER.debug("Request of %s failed (%s), attempt %s in %.1fs", path, e, attempt, delay)
+                except ValueError as e:
+                    # the response is malformed or truncated, it is not cached
+                    self._metrics.increment(ERRORS_COUNTER)
+                    breaker.record_failure()
+                    raise InvalidResponse(f"Invalid response of {path}: {e}") from e
+                except QuotaExceeded:
+                    self._metrics.increment(ERRORS_COUNTER)
+                    # the endpoint does not serve the request, so it is not considered available
+                    breaker.record_failure()
+                    raise
+                except EnedisClientError:
+                    self._metrics.increment(ERRORS_COUNTER)
+                    breaker.record_success()
+                    raise
+                finally:
+                    # the latency includes the reading and the decoding of the response
+                    self._metrics.observe_latency(path, time.perf_counter() - started)
+                await asyncio.sleep(delay)
+        finally:
+            if probe:
+                breaker.release_probe()
+
+    @staticmethod
+    def _get_retry_after(response: aiohttp.ClientResponse) -> float:
+        """
+        Return the delay requested by the API before sending again a request
+        :param response: the response
+        :return: the delay in seconds
+        """
+        try:
+            return max(float(response.headers.get('Retry-After', DEFAULT_RETRY_AFTER)), 0)
+        except ValueError:
+            return DEFAULT_RETRY_AFTER
+
+    def _check(self, response: aiohttp.ClientResponse, token: str, params: dict[str, str]) -> None:
+        """
+        Check the status of a response
+        :param response: the response
+        :param token: the access token used by the request
+        :param params: the query parameters of the request
+        """
+        if response.status == 401:
+            # the token has been revoked, the next call will request a new one
+            self._token_manager.invalidate(self._client_id, self._client_secret, token)
+        elif response.status == 404:
+            raise InvalidPdl(f"Usage point not found: {params.get(USAGE_POINT_ID_PARAM)}")
+        response.raise_for_status()
+
+    def _is_traced(self) -> bool:
+        """
+        Return true if the body of the response being read must be logged.
+        The level of the integration does not enable the trace, so the bodies are not formatted unless the trace logger is configured.
+        :return: true if the body must be logged
+        """
+        if _TRACE_LOGGER.level == logging.NOTSET or not _TRACE_LOGGER.isEnabledFor(logging.DEBUG):
+            return False
+        traced: bool = self._trace_count % TRACE_SAMPLE_RATE == 0
+        self._trace_count += 1
+        return traced
+
+    @staticmethod
+    def _trace(response: aiohttp.ClientResponse, body: bytes) -> None:
+        """
+        Log the beginning of the body of a response
+        :param response: the response
+        :param body: the body or its first chunk
+        """
+        _TRACE_LOGGER.debug("Response %s of %s: %s", response.status, response.url.path, body[:TRACE_MAX_BODY].decode('utf-8', errors='replace'))
+
+    async def _read_json(self, response: aiohttp.ClientResponse) -> dict[str, Any]:
+        """
+        Decode a JSON response
+        :param response: the response
+        :return: the document
+        """
+        body: bytes = await response.read()
+        if self._is_traced():
+            self._trace(response, body)
+        started: float = time.perf_counter()
+        result: dict[str, Any] = json.loads(body) if body else {}
+        self._metrics.observe(DECODE_HISTOGRAM, time.perf_counter() - started)
+        self._metrics.increment(BYTES_RECEIVED_COUNTER, len(body))
+        return result
+
+
+class EnedisApiHelper:
+    """
+    The helper exposing the endpoints of the API used by the component
+    """
+
+    def __init__(self, client: EnedisClient, pdl: str, fetch_state: EnedisFetchState = None):
+        """
+        Constructor
+        :param client: the client
+        :param pdl: the PDL
+        :param fetch_state: the persisted state of the fetches used for incremental requests
+        """
+        if not pdl:
+            raise InvalidPdl
+        self._client: EnedisClient = client
+        self._pdl: str = pdl
+        self._fetch_state: EnedisFetchState = fetch_state
+
+    def get_client(self) -> EnedisClient:
+        """
+        Return the client
+        :return: the client
+        """
+        return self._client
+
+    def get_pdl(self) -> str:
+        """
+        Return the PDL
+        :return: the PDL
+        """
+        return self._pdl
+
+    def _build_params(self, start: date, end: date) -> dict[str, str]:
+        """
+        Build the query parameters of a period
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :return: the parameters
+        """
+        return {
+            USAGE_POINT_ID_PARAM: self._pdl,
+            START_PARAM: start.strftime(DATE_FORMAT),
+            END_PARAM: end.strftime(DATE_FORMAT)
+        }
+
+    async def get_daily_consumption(self, start: date, end: date, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> MeterReadings:
+        """
+        Return the daily consumption
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :param priority: the priority of the request
+        :return: the readings in Wh
+        """
+        return await self._client.request_readings(DAILY_CONSUMPTION_PATH, self._build_params(start, end), priority)
+
+    async def get_consumption_load_curve(self, start: date, end: date, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> MeterReadings:
+        """
+        Return the load curve (30 minutes intervals)
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :param priority: the priority of the request
+        :return: the readings in Wh at the start of the intervals
+        """
+        return await self._client.request_readings(CONSUMPTION_LOAD_CURVE_PATH, self._build_params(start, end), priority, load_curve=True)
+
+    async def get_consumption_load_curve_increment(self, today: date) -> MeterReadings:
+        """
+        Return the recent load curve, requesting only the days after the high-water mark of the endpoint.
+        The readings already fetched are kept in the fetch state and merged with the new ones, the whole window is requested when the helper has no fetch state.
+        :param today: the current date (exclusive end of the requests)
+        :return: the readings in Wh of the last days
+        """
+        window_start: datetime = datetime.combine(today - timedelta(days=LOAD_CURVE_HISTORY_DAYS), datetime.min.time())
+        start: date = window_start.date()
+        readings: MeterReadings = MeterReadings()
+        if self._fetch_state is not None:
+            mark: datetime = self._fetch_state.get_high_water_mark(CONSUMPTION_LOAD_CURVE_PATH)
+            if mark is not None:
+                start = max(mark.date(), start)
+            readings = self._fetch_state.get_load_curve().slice_dates(window_start.date(), today)
+        while start < today:
+            end: date = min(start + timedelta(days=LOAD_CURVE_MAX_DAYS), today)
+            _LOGGER.debug("Fetching the load curve of %s from %s to %s", self._pdl, start, end)
+            fetched: MeterReadings = await self.get_consumption_load_curve(start, end)
+            if len(fetched) > 0:
+                readings = readings.merge(fetched)
+                if self._fetch_state is not None:
+                    self._fetch_state.set_load_curve(readings)
+                    self._fetch_state.set_high_water_mark(CONSUMPTION_LOAD_CURVE_PATH, EPOCH + timedelta(seconds=fetched.get_last_timestamp() + HALF_HOUR_SECONDS))
+            start = end
+        return readings
+
+    async def get_daily_consumption_max_power(self, start: date, end: date) -> dict[str, Any]:
+        """
+        Return the daily maximum power
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :return: the response
+        """
+        return await self._client.request(DAILY_CONSUMPTION_MAX_POWER_PATH, self._build_params(start, end))
+
+    async def get_contracts(self) -> dict[str, Any]:
+        """
+        Return the contracts of the usage point
+        :return: the response
+        """
+        return await self._client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: self._pdl})
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The errors raised by the custom component
+"""
+from homeassistant.exceptions import HomeAssistantError
+
+
+class EnedisClientError(HomeAssistantError):
+    """
+    The base error raised by the client
+    """
+
+
+class InvalidClientId(EnedisClientError):
+    """
+    Raised when the client identifier is missing or rejected
+    """
+
+
+class InvalidClientSecret(EnedisClientError):
+    """
+    Raised when the client secret is missing or rejected
+    """
+
+
+class InvalidPdl(EnedisClientError):
+    """
+    Raised when the PDL is missing or rejected
+    """
+
+
+class InvalidResponse(EnedisClientError):
+    """
+    Raised when a response of the API cannot be decoded (malformed or truncated document)
+    """
+
+
+class CannotConnect(EnedisClientError):
+    """
+    Raised when the API cannot be reached
+    """
+
+
+class CircuitOpen(CannotConnect):
+    """
+    Raised when a request is not sent because the circuit of its endpoint is open
+    """
+
+    def __init__(self, path: str, retry_after: float):
+        """
+        Constructor
+        :param path: the path of the endpoint
+        :param retry_after: the delay in seconds before the endpoint is probed again
+        """
+        super().__init__(f"Circuit of {path} open, next attempt in {retry_after:.0f}s")
+        self.retry_after: float = retry_after
+
+
+class QuotaExceeded(CannotConnect):
+    """
+    Raised when a request is still rejected because of the quota after being queued again
+    """
+
+    def __init__(self, path: str, retry_after: float):
+        """
+        Constructor
+        :param path: the path of the endpoint
+        :param retry_after: the delay in seconds requested by the API before sending again a request
+        """
+        super().__init__(f"Quota exceeded for {path}, next attempt in {retry_after:.0f}s")
+        self.retry_after: float = retry_after
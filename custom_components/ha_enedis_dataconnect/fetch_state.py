@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The persisted state of the fetches of a PDL
+"""
+import logging
+from datetime import datetime
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .models import MeterReadings
+
+_LOGGER = logging.getLogger(__name__)
+STORAGE_VERSION: int = 1
+# delay in seconds used to group the writes of the storage
+STORAGE_SAVE_DELAY: int = 10
+MARKS_FIELD: str = 'marks'
+LOAD_CURVE_FIELD: str = 'load_curve'
+
+
+class EnedisFetchState:
+    """
+    Keep, by endpoint, the end of the last interval fetched successfully (the high-water mark) and the recent readings of the load curve.
+    The state is persisted in the Home Assistant storage so a restart resumes where the previous run stopped.
+    """
+
+    def __init__(self, hass: HomeAssistant, pdl: str):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param pdl: the PDL
+        """
+        self._pdl: str = pdl
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{pdl}.fetch_state")
+        self._marks: dict[str, datetime] = {}
+        self._load_curve: MeterReadings = MeterReadings()
+
+    async def async_load(self) -> None:
+        """
+        Load the state from the storage
+        """
+        data: dict[str, Any] = await self._store.async_load()
+        if not data:
+            return
+        _LOGGER.debug("Restoring the fetch state of %s", self._pdl)
+        self._marks = {k: datetime.fromisoformat(v) for k, v in data.get(MARKS_FIELD, {}).items()}
+        if LOAD_CURVE_FIELD in data:
+            self._load_curve = MeterReadings.from_json(data[LOAD_CURVE_FIELD])
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """
+        Return the data to store
+        :return: the data
+        """
+        return {
+            MARKS_FIELD: {k: v.isoformat() for k, v in self._marks.items()},
+            LOAD_CURVE_FIELD: self._load_curve.to_json()
+        }
+
+    def get_high_water_mark(self, endpoint: str) -> datetime | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the end of the last interval fetched successfully
+        :param endpoint: the path of the endpoint
+        :return: the date and time or None if nothing was fetched yet
+        """
+        return self._marks.get(endpoint)
+
+    def set_high_water_mark(self, endpoint: str, value: datetime) -> None:
+        """
+        Set the end of the last interval fetched successfully and schedule the save
+        :param endpoint: the path of the endpoint
+        :param value: the date and time
+        """
+        self._marks[endpoint] = value
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def get_load_curve(self) -> MeterReadings:
+        """
+        Return the recent readings of the load curve
+        :return: the readings
+        """
+        return self._load_curve
+
+    def set_load_curve(self, readings: MeterReadings) -> None:
+        """
+        Set the recent readings of the load curve, saved with the next high-water mark
+        :param readings: the readings
+        """
+        self._load_curve = readings
+
+    async def async_remove(self) -> None:
+        """
+        Remove the state from the storage
+        """
+        await self._store.async_remove()
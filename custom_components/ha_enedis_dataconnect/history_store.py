@@ -0,0 +1,426 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The on-disk columnar cache of the historical consumption of a PDL
+"""
+import asyncio
+import logging
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from homeassistant.core import HomeAssistant
+
+from .aggregates import PrefixIndex
+from .const import DOMAIN, EnedisSeriesEnum
+from .models import EPOCH, SECONDS_PER_DAY, HOUR_SECONDS, MeterReadings, day_to_timestamp
+
+_LOGGER = logging.getLogger(__name__)
+TIMESTAMPS_SUFFIX: str = '.ts'
+VALUES_SUFFIX: str = '.wh'
+TEMPORARY_SUFFIX: str = '.tmp'
+DAILY_SERIES: str = 'daily'
+LOAD_CURVE_SERIES: str = 'load_curve'
+
+
+def to_timestamp(value: datetime) -> int:
+    """
+    Convert a local date and time to the number of seconds since the epoch, the local time being stored as if it was UTC.
+    So a day always starts on a multiple of 86400 seconds.
+    :param value: the local date and time
+    :return: the seconds
+    """
+    return int((value - EPOCH).total_seconds())
+
+
+class ColumnarSeries:
+    """
+    A series of readings sorted by time, stored in two files: the timestamps as int64 and the values in Wh as int32.
+    The files are memory-mapped so the series is not loaded in memory and a time window is found by bisection.
+    The methods opening, writing or closing the files are blocking and must be called in an executor, one at a time.
+    A write interrupted between the two files is completed or rolled back when the series is opened.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Constructor
+        :param path: the path of the files, without suffix
+        """
+        self._timestamps_path: Path = path.with_name(path.name + TIMESTAMPS_SUFFIX)
+        self._values_path: Path = path.with_name(path.name + VALUES_SUFFIX)
+        self._maps: list[mmap.mmap] = []
+        self._timestamps: memoryview = memoryview(array('q'))
+        self._values: memoryview = memoryview(array('i'))
+
+    def __len__(self) -> int:
+        """
+        Return the number of readings
+        :return: the number of readings
+        """
+        return len(self._timestamps)
+
+    @staticmethod
+    def _map(path: Path, type_code: str, maps: list[mmap.mmap]) -> memoryview:
+        """
+        Map a file in memory
+        :param path: the path of the file
+        :param type_code: the type of the items
+        :param maps: the list receiving the opened map
+        :return: the typed view on the file
+        """
+        if not path.exists() or path.stat().st_size == 0:
+            return memoryview(array(type_code))
+        with path.open(mode='rb') as f:
+            mapped: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        maps.append(mapped)
+        return memoryview(mapped).cast(type_code)
+
+    def _recover(self) -> None:
+        """
+        Complete or roll back an interrupted write, so the two files hold the same readings.
+        A rewrite renames the values last, so a remaining temporary file of the values completes it. An append writes the timestamps first, so the readings without value are truncated.
+        """
+        timestamps_tmp: Path = self._timestamps_path.with_name(self._timestamps_path.name + TEMPORARY_SUFFIX)
+        values_tmp: Path = self._values_path.with_name(self._values_path.name + TEMPORARY_SUFFIX)
+        if values_tmp.exists() and not timestamps_tmp.exists():
+            _LOGGER.warning("Interrupted rewrite of %s completed", self._values_path)
+            os.replace(values_tmp, self._values_path)
+        timestamps_tmp.unlink(missing_ok=True)
+        values_tmp.unlink(missing_ok=True)
+        sizes: list[tuple[Path, int, int]] = [
+            (self._timestamps_path, self._timestamps_path.stat().st_size if self._timestamps_path.exists() else 0, array('q').itemsize),
+            (self._values_path, self._values_path.stat().st_size if self._values_path.exists() else 0, array('i').itemsize)
+        ]
+        count: int = min(size // item_size for _, size, item_size in sizes)
+        for path, size, item_size in sizes:
+            if size != count * item_size:
+                _LOGGER.warning("Interrupted write of %s, truncated to %s readings", path, count)
+                os.truncate(path, count * item_size)
+
+    def open(self) -> None:
+        """
+        Map the files in memory.
+        The views are replaced at once, so readers of the event loop see either the previous or the new content while the files are written in an executor.
+        """
+        self._recover()
+        maps: list[mmap.mmap] = []
+        timestamps: memoryview = self._map(self._timestamps_path, 'q', maps)
+        values: memoryview = self._map(self._values_path, 'i', maps)
+        previous: list[mmap.mmap] = self._maps
+        self._timestamps, self._values, self._maps = timestamps, values, maps
+        self._close_maps(previous)
+
+    def close(self) -> None:
+        """
+        Release the mapped files
+        """
+        previous: list[mmap.mmap] = self._maps
+        self._timestamps, self._values, self._maps = memoryview(array('q')), memoryview(array('i')), []
+        self._close_maps(previous)
+
+    @staticmethod
+    def _close_maps(maps: list[mmap.mmap]) -> None:
+        """
+        Close the maps which are not used anymore
+        :param maps: the maps
+        """
+        for mapped in maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # a view is still referenced, the map will be released with it
+                pass
+
+    def get_readings(self) -> tuple[memoryview, memoryview]:
+        """
+        Return all the readings
+        :return: the timestamps and the values
+        """
+        return self._timestamps, self._values
+
+    def get_last_timestamp(self) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the timestamp of the last reading
+        :return: the timestamp or None if the series is empty
+        """
+        return self._timestamps[-1] if len(self._timestamps) > 0 else None
+
+    def index(self, timestamp: int) -> int:
+        """
+        Return the position of the first reading at or after the timestamp
+        :param timestamp: the timestamp
+        :return: the position
+        """
+        return bisect_left(self._timestamps, timestamp)
+
+    def slice(self, start: int, end: int) -> tuple[memoryview, memoryview]:
+        """
+        Return the readings of a time window
+        :param start: the start timestamp (inclusive)
+        :param end: the end timestamp (exclusive)
+        :return: the timestamps and the values
+        """
+        i: int = self.index(start)
+        j: int = self.index(end)
+        return self._timestamps[i:j], self._values[i:j]
+
+    def sum(self, start: int, end: int) -> int:
+        """
+        Return the sum of the values of a time window
+        :param start: the start timestamp (inclusive)
+        :param end: the end timestamp (exclusive)
+        :return: the sum in Wh
+        """
+        return sum(self.slice(start, end)[1])
+
+    def write(self, readings: Iterable[tuple[int, int]]) -> int:
+        """
+        Add or replace readings, the readings already stored with the same value are skipped.
+        The files are appended when the remaining readings are after the last one, otherwise they are rewritten.
+        :param readings: the timestamps and values
+        :return: the number of readings added or changed
+        """
+        items: dict[int, int] = dict(readings)
+        last: int = self.get_last_timestamp()
+        if last is not None:
+            for timestamp in [t for t in items if t <= last]:
+                i: int = self.index(timestamp)
+                if i < len(self._timestamps) and self._timestamps[i] == timestamp and self._values[i] == items[timestamp]:
+                    del items[timestamp]
+        if not items:
+            return 0
+        keys: list[int] = sorted(items)
+        self._timestamps_path.parent.mkdir(parents=True, exist_ok=True)
+        if last is None or keys[0] > last:
+            with self._timestamps_path.open(mode='ab') as f:
+                array('q', keys).tofile(f)
+            with self._values_path.open(mode='ab') as f:
+                array('i', [items[k] for k in keys]).tofile(f)
+        else:
+            merged: dict[int, int] = dict(zip(self._timestamps, self._values))
+            merged.update(items)
+            keys = sorted(merged)
+            self._replace(array('q', keys), array('i', [merged[k] for k in keys]))
+        self.open()
+        return len(items)
+
+    def _replace(self, timestamps: array, values: array) -> None:
+        """
+        Replace the content of the files, both are written aside before being renamed, the values last
+        :param timestamps: the timestamps
+        :param values: the values
+        """
+        timestamps_tmp: Path = self._timestamps_path.with_name(self._timestamps_path.name + TEMPORARY_SUFFIX)
+        values_tmp: Path = self._values_path.with_name(self._values_path.name + TEMPORARY_SUFFIX)
+        with timestamps_tmp.open(mode='wb') as f:
+            timestamps.tofile(f)
+        with values_tmp.open(mode='wb') as f:
+            values.tofile(f)
+        os.replace(timestamps_tmp, self._timestamps_path)
+        os.replace(values_tmp, self._values_path)
+
+
+class EnedisHistoryStore:
+    """
+    The local history of a PDL: the daily consumption and the load curve, stored under the .storage directory of Home Assistant.
+    The sums by day of the daily consumption and by hour of the load curve are indexed when the series are opened and written, so the total of a window does not read the series.
+    The polls and the backfill write the same files in executors, so the operations on the files are serialized by a lock.
+    """
+
+    def __init__(self, hass: HomeAssistant, pdl: str):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param pdl: the PDL
+        """
+        self._hass: HomeAssistant = hass
+        self._pdl: str = pdl
+        path: Path = Path(hass.config.path('.storage'))
+        self._daily: ColumnarSeries = ColumnarSeries(path.joinpath(f"{DOMAIN}.{pdl}.{DAILY_SERIES}"))
+        self._load_curve: ColumnarSeries = ColumnarSeries(path.joinpath(f"{DOMAIN}.{pdl}.{LOAD_CURVE_SERIES}"))
+        self._daily_index: PrefixIndex = PrefixIndex(SECONDS_PER_DAY)
+        self._hourly_index: PrefixIndex = PrefixIndex(HOUR_SECONDS)
+        # incremented when the content changes
+        self._version: int = 0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def get_daily(self) -> ColumnarSeries:
+        """
+        Return the daily consumption
+        :return: the series
+        """
+        return self._daily
+
+    def get_load_curve(self) -> ColumnarSeries:
+        """
+        Return the load curve
+        :return: the series
+        """
+        return self._load_curve
+
+    def get_version(self) -> int:
+        """
+        Return the version of the content, incremented by each write changing it
+        :return: the version
+        """
+        return self._version
+
+    def get_daily_index(self) -> PrefixIndex:
+        """
+        Return the sums by day of the daily consumption
+        :return: the index
+        """
+        return self._daily_index
+
+    def get_hourly_index(self) -> PrefixIndex:
+        """
+        Return the sums by hour of the load curve
+        :return: the index
+        """
+        return self._hourly_index
+
+    def get_daily_consumption(self, start: date, end: date) -> int:
+        """
+        Return the consumption between two dates
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :return: the consumption in Wh
+        """
+        return self._daily_index.get_sum(day_to_timestamp(start), day_to_timestamp(end))
+
+    def get_daily_value(self, day: date) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the consumption of a day
+        :param day: the day
+        :return: the consumption in Wh or None if the day is not stored
+        """
+        start: int = day_to_timestamp(day)
+        return self._daily_index.get_total(start, start + SECONDS_PER_DAY)
+
+    def get_rolling_consumption(self, end: date, days: int) -> tuple[int, int] | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the consumption of the days before a date
+        :param end: the date following the last day of the window
+        :param days: the number of days of the window
+        :return: the consumption in Wh and the number of days stored in the window or None if no day is stored
+        """
+        start: int = day_to_timestamp(end - timedelta(days=days))
+        stop: int = day_to_timestamp(end)
+        total: int = self._daily_index.get_total(start, stop)
+        if total is None:
+            return None
+        return total, self._daily_index.get_count(start, stop)
+
+    def get_hourly_consumption(self, start: datetime, end: datetime) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the consumption of the load curve between two dates, rounded to the hours
+        :param start: the start (inclusive)
+        :param end: the end (exclusive)
+        :return: the consumption in Wh or None if no interval is stored
+        """
+        return self._hourly_index.get_total(to_timestamp(start), to_timestamp(end))
+
+    def get_series(self, series: str, start: int, end: int) -> tuple[list[int], list[int]]:
+        """
+        Return the readings or the sums by period of a time window
+        :param series: the series (see EnedisSeriesEnum)
+        :param start: the start timestamp (inclusive)
+        :param end: the end timestamp (exclusive)
+        :return: the timestamps of the readings or of the start of the periods and the values in Wh
+        """
+        if series == EnedisSeriesEnum.LOAD_CURVE:
+            timestamps, values = self._load_curve.slice(start, end)
+            return timestamps.tolist(), values.tolist()
+        if series == EnedisSeriesEnum.HOURLY:
+            buckets: list[tuple[int, int]] = self._hourly_index.get_buckets(start, end)
+        elif series == EnedisSeriesEnum.DAILY:
+            buckets = self._daily_index.get_buckets(start, end)
+        else:
+            months: dict[int, int] = {}
+            for timestamp, value in self._daily_index.get_buckets(start, end):
+                day: date = EPOCH.date() + timedelta(seconds=timestamp)
+                key: int = day_to_timestamp(day.replace(day=1))
+                months[key] = months.get(key, 0) + value
+            buckets = list(months.items())
+        return [t for t, _ in buckets], [v for _, v in buckets]
+
+    def _open(self) -> None:
+        """
+        Open the series
+        """
+        self._daily.open()
+        self._load_curve.open()
+        self._daily_index.update(*self._daily.get_readings())
+        self._hourly_index.update(*self._load_curve.get_readings())
+        self._version += 1
+        _LOGGER.debug("History of %s opened: %s days, %s intervals", self._pdl, len(self._daily), len(self._load_curve))
+
+    async def async_open(self) -> None:
+        """
+        Open the series in an executor
+        """
+        async with self._lock:
+            await self._hass.async_add_executor_job(self._open)
+
+    def _write(self, daily: MeterReadings, load_curve: MeterReadings) -> None:
+        """
+        Write the readings
+        :param daily: the daily readings
+        :param load_curve: the readings of the load curve
+        """
+        changed: bool = False
+        # the indexes are updated from the oldest reading written, the readings of a backfill are not sorted
+        if self._daily.write(daily) > 0:
+            self._daily_index.update(*self._daily.get_readings(), since=min(daily.timestamps))
+            changed = True
+        if self._load_curve.write(load_curve) > 0:
+            self._hourly_index.update(*self._load_curve.get_readings(), since=min(load_curve.timestamps))
+            changed = True
+        if changed:
+            self._version += 1
+
+    async def async_write(self, daily: MeterReadings, load_curve: MeterReadings) -> None:
+        """
+        Write the readings in an executor, the readings up to the last stored ones are skipped
+        :param daily: the daily readings
+        :param load_curve: the readings of the load curve
+        """
+        async with self._lock:
+            last_day: int = self._daily.get_last_timestamp()
+            last_interval: int = self._load_curve.get_last_timestamp()
+            if last_day is not None:
+                daily = daily.after(last_day)
+            if last_interval is not None:
+                load_curve = load_curve.after(last_interval)
+            if len(daily) > 0 or len(load_curve) > 0:
+                await self._hass.async_add_executor_job(self._write, daily, load_curve)
+
+    async def async_merge(self, daily: MeterReadings, load_curve: MeterReadings) -> None:
+        """
+        Merge readings, possibly older than the stored ones, in an executor
+        :param daily: the daily readings
+        :param load_curve: the readings of the load curve
+        """
+        if len(daily) > 0 or len(load_curve) > 0:
+            async with self._lock:
+                await self._hass.async_add_executor_job(self._write, daily, load_curve)
+
+    async def async_close(self) -> None:
+        """
+        Close the series in an executor
+        """
+        async with self._lock:
+            await self._hass.async_add_executor_job(self._close)
+
+    def _close(self) -> None:
+        """
+        Close the series
+        """
+        self._daily.close()
+        self._load_curve.close()
+        self._daily_index.update((), ())
+        self._hourly_index.update((), ())
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The import of the consumption in the long-term statistics of Home Assistant
+"""
+import logging
+from datetime import datetime, timedelta, tzinfo
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .fetch_state import EnedisFetchState
+from .aggregates import PrefixIndex
+from .history_store import EnedisHistoryStore, EPOCH, SECONDS_PER_DAY, to_timestamp
+
+_LOGGER = logging.getLogger(__name__)
+SECONDS_PER_HOUR: int = 3600
+# maximum number of statistics sent to the recorder at once
+STATISTICS_BATCH_SIZE: int = 1000
+HOURLY_STATISTICS_MARK: str = 'statistics_hourly'
+DAILY_STATISTICS_MARK: str = 'statistics_daily'
+
+
+def _aggregate(index: PrefixIndex, start: int) -> tuple[float, list[tuple[int, int]]]:
+    """
+    Return the sums by period of a series from its index
+    :param index: the index of the series
+    :param start: the timestamp of the first period (aligned on the period)
+    :return: the sum in Wh before the start and the timestamps and sums in Wh of the periods
+    """
+    return index.get_sum(0, start), index.get_buckets(start)
+
+
+class EnedisStatisticsImporter:
+    """
+    Import the hourly consumption (from the load curve) and the daily consumption of a PDL as external statistics.
+    The statistics are computed from the local history, so importing the same period again rewrites the same rows with the same cumulative sums.
+    """
+
+    def __init__(self, hass: HomeAssistant, pdl: str, history_store: EnedisHistoryStore, fetch_state: EnedisFetchState):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param pdl: the PDL
+        :param history_store: the local history
+        :param fetch_state: the persisted state used to remember the last imported periods
+        """
+        self._hass: HomeAssistant = hass
+        self._pdl: str = pdl
+        self._history_store: EnedisHistoryStore = history_store
+        self._fetch_state: EnedisFetchState = fetch_state
+        self._hourly_metadata: StatisticMetaData = self._build_metadata('consumption_hourly', 'hourly consumption')
+        self._daily_metadata: StatisticMetaData = self._build_metadata('consumption_daily', 'daily consumption')
+
+    def _build_metadata(self, suffix: str, label: str) -> StatisticMetaData:
+        """
+        Build the metadata of a statistic
+        :param suffix: the suffix of the identifier
+        :param label: the label used in the name
+        :return: the metadata
+        """
+        return StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=f"Enedis {self._pdl} {label}",
+            source=DOMAIN,
+            statistic_id=f"{DOMAIN}:{self._pdl}_{suffix}",
+            unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR
+        )
+
+    def get_statistic_ids(self) -> list[str]:
+        """
+        Return the identifiers of the statistics
+        :return: the identifiers
+        """
+        return [self._hourly_metadata['statistic_id'], self._daily_metadata['statistic_id']]
+
+    @staticmethod
+    def _build_statistics(base: float, periods: list[tuple[int, int]], time_zone: tzinfo) -> list[StatisticData]:
+        """
+        Build the statistics with their cumulative sums
+        :param base: the sum in Wh before the first period
+        :param periods: the timestamps and sums in Wh of the periods
+        :param time_zone: the time zone of the local timestamps
+        :return: the statistics in kWh
+        """
+        result: list[StatisticData] = []
+        total: float = base
+        for timestamp, value in periods:
+            total += value
+            start: datetime = (EPOCH + timedelta(seconds=timestamp)).replace(tzinfo=time_zone)
+            result.append(StatisticData(start=start, state=value / 1000, sum=total / 1000))
+        return result
+
+    def _compute(self, hourly_start: int, daily_start: int) -> tuple[list[StatisticData], list[StatisticData]]:
+        """
+        Compute the statistics from the local history (blocking)
+        :param hourly_start: the timestamp of the first hour
+        :param daily_start: the timestamp of the first day
+        :return: the hourly and daily statistics
+        """
+        # the time zone of the configuration, get_default_time_zone being available only since Home Assistant 2024.6
+        time_zone: tzinfo = dt_util.get_time_zone(self._hass.config.time_zone) or dt_util.DEFAULT_TIME_ZONE
+        base, hours = _aggregate(self._history_store.get_hourly_index(), hourly_start)
+        hourly: list[StatisticData] = self._build_statistics(base, hours, time_zone)
+        base, days = _aggregate(self._history_store.get_daily_index(), daily_start)
+        daily: list[StatisticData] = self._build_statistics(base, days, time_zone)
+        return hourly, daily
+
+    def _add(self, metadata: StatisticMetaData, statistics: list[StatisticData]) -> None:
+        """
+        Send the statistics to the recorder by batches
+        :param metadata: the metadata
+        :param statistics: the statistics
+        """
+        for i in range(0, len(statistics), STATISTICS_BATCH_SIZE):
+            async_add_external_statistics(self._hass, metadata, statistics[i:i + STATISTICS_BATCH_SIZE])
+
+    async def async_import(self, since: datetime = None) -> int:
+        """
+        Import the statistics of the periods after the last import, or after the given date
+        :param since: the local date and time from which the statistics are rewritten, the last import is used if not specified
+        :return: the number of statistics imported
+        """
+        hourly_mark: datetime = since or self._fetch_state.get_high_water_mark(HOURLY_STATISTICS_MARK) or EPOCH
+        daily_mark: datetime = since or self._fetch_state.get_high_water_mark(DAILY_STATISTICS_MARK) or EPOCH
+        hourly_start: int = to_timestamp(hourly_mark)
+        daily_start: int = to_timestamp(daily_mark)
+        hourly, daily = await self._hass.async_add_executor_job(self._compute, hourly_start - hourly_start % SECONDS_PER_HOUR, daily_start - daily_start % SECONDS_PER_DAY)
+        # the last period can be completed by the next fetch, so it is imported again next time
+        if hourly:
+            self._add(self._hourly_metadata, hourly)
+            self._fetch_state.set_high_water_mark(HOURLY_STATISTICS_MARK, hourly[-1]['start'].replace(tzinfo=None))
+        if daily:
+            self._add(self._daily_metadata, daily)
+            self._fetch_state.set_high_water_mark(DAILY_STATISTICS_MARK, daily[-1]['start'].replace(tzinfo=None))
+        _LOGGER.debug("%s hourly and %s daily statistics imported for %s", len(hourly), len(daily), self._pdl)
+        return len(hourly) + len(daily)
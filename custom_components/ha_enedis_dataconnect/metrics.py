@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The metrics of the hot paths: the calls of the API, the decoding of the responses, the refreshes and the updates of the entities
+"""
+import logging
+import time
+from bisect import bisect_left
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+# upper bounds in seconds of the buckets of the histograms, the last bucket is unbounded
+LATENCY_BUCKETS: tuple[float, ...] = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# counters of the client
+REQUESTS_COUNTER: str = 'requests'
+CACHE_HITS_COUNTER: str = 'cache_hits'
+NOT_MODIFIED_COUNTER: str = 'not_modified'
+RETRIES_COUNTER: str = 'retries'
+THROTTLED_COUNTER: str = 'throttled'
+ERRORS_COUNTER: str = 'errors'
+BYTES_RECEIVED_COUNTER: str = 'bytes_received'
+CIRCUIT_REJECTED_COUNTER: str = 'circuit_rejected'
+RETRY_BUDGET_EXHAUSTED_COUNTER: str = 'retry_budget_exhausted'
+# counters of the coordinator
+REFRESHES_COUNTER: str = 'refreshes'
+REFRESH_FAILURES_COUNTER: str = 'refresh_failures'
+STALE_REFRESHES_COUNTER: str = 'stale_refreshes'
+ENTITY_WRITES_COUNTER: str = 'entity_writes'
+ENTITY_SKIPPED_WRITES_COUNTER: str = 'entity_skipped_writes'
+# histograms
+DECODE_HISTOGRAM: str = 'decode'
+REFRESH_HISTOGRAM: str = 'refresh'
+AGGREGATE_HISTOGRAM: str = 'aggregate'
+LATENCY_HISTOGRAM_PREFIX: str = 'latency '
+
+
+class LatencyHistogram:
+    """
+    A histogram of durations using fixed buckets, so observing a duration does not allocate
+    """
+    __slots__ = ('counts', 'count', 'total', 'maximum', 'last')
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.counts: list[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.maximum: float = 0.0
+        self.last: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Add a duration
+        :param seconds: the duration in seconds
+        """
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return the histogram as a dictionary, the durations in milliseconds
+        :return: the dictionary
+        """
+        buckets: dict[str, int] = {f"<={int(b * 1000)}ms": c for b, c in zip(LATENCY_BUCKETS, self.counts)}
+        buckets['+inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'average_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.maximum * 1000, 3),
+            'last_ms': round(self.last * 1000, 3),
+            'buckets': buckets
+        }
+
+
+class EnedisMetrics:
+    """
+    The counters and the histograms of a component (client or coordinator), updated from the event loop
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._counters: dict[str, int] = {}
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._started: float = time.monotonic()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """
+        Increment a counter
+        :param name: the name of the counter
+        :param value: the increment
+        """
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Add a duration to a histogram
+        :param name: the name of the histogram
+        :param seconds: the duration in seconds
+        """
+        histogram: LatencyHistogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self._histograms[name] = histogram
+        histogram.observe(seconds)
+
+    def observe_latency(self, path: str, seconds: float) -> None:
+        """
+        Add the duration of a call of an endpoint
+        :param path: the path of the endpoint
+        :param seconds: the duration in seconds
+        """
+        self.observe(LATENCY_HISTOGRAM_PREFIX + path, seconds)
+
+    def get_counter(self, name: str) -> int:
+        """
+        Return the value of a counter
+        :param name: the name of the counter
+        :return: the value
+        """
+        return self._counters.get(name, 0)
+
+    def get_histogram(self, name: str) -> LatencyHistogram | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return a histogram
+        :param name: the name of the histogram
+        :return: the histogram or None if no duration was observed
+        """
+        return self._histograms.get(name)
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return the metrics as a dictionary
+        :return: the dictionary
+        """
+        return {
+            'uptime_seconds': round(time.monotonic() - self._started),
+            'counters': dict(self._counters),
+            'histograms': {n: h.as_dict() for n, h in sorted(self._histograms.items())}
+        }
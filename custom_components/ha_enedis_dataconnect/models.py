@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The data model shared by the client, the coordinator and the entities
+"""
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from .const import DATE_FORMAT, EnedisDatasetEnum
+from .utils import get_numpy
+
+METER_READING_FIELD: str = 'meter_reading'
+INTERVAL_READING_FIELD: str = 'interval_reading'
+READING_TYPE_FIELD: str = 'reading_type'
+VALUE_FIELD: str = 'value'
+DATE_FIELD: str = 'date'
+DATE_TIME_SECONDS_FORMAT: str = '%Y-%m-%d %H:%M:%S'
+EPOCH: datetime = datetime(1970, 1, 1)
+EPOCH_DATE: date = EPOCH.date()
+SECONDS_PER_DAY: int = 86400
+HOUR_SECONDS: int = 3600
+HALF_HOUR_SECONDS: int = 1800
+
+
+@dataclass(frozen=True, slots=True)
+class IntervalReading:
+    """
+    A reading of the meter, the start is the beginning of the interval
+    """
+    start: datetime
+    value: int
+
+
+class MeterReadings:
+    """
+    A series of readings sorted by time, stored in typed arrays: the start of the intervals as local timestamps (see history_store) and the values.
+    A year of 30 minutes intervals takes about 200 KB, a time window is found by bisection and NumPy, when available, works on the arrays without copy.
+    """
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self, timestamps: array = None, values: array = None):
+        """
+        Constructor
+        :param timestamps: the timestamps as an array of int64
+        :param values: the values as an array of int32
+        """
+        self.timestamps: array = timestamps if timestamps is not None else array('q')
+        self.values: array = values if values is not None else array('i')
+
+    def __len__(self) -> int:
+        """
+        Return the number of readings
+        :return: the number of readings
+        """
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        """
+        Iterate over the timestamps and the values
+        :return: the iterator
+        """
+        return zip(self.timestamps, self.values)
+
+    def append(self, timestamp: int, value: int) -> None:
+        """
+        Add a reading
+        :param timestamp: the timestamp
+        :param value: the value
+        """
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+    def get_last_timestamp(self) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the timestamp of the last reading
+        :return: the timestamp or None if there is no reading
+        """
+        return self.timestamps[-1] if len(self.timestamps) > 0 else None
+
+    def index(self, timestamp: int) -> int:
+        """
+        Return the position of the first reading at or after the timestamp
+        :param timestamp: the timestamp
+        :return: the position
+        """
+        return bisect_left(self.timestamps, timestamp)
+
+    def get_value(self, timestamp: int) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the value of the reading starting at the timestamp
+        :param timestamp: the timestamp
+        :return: the value or None if there is no reading at this time
+        """
+        i: int = self.index(timestamp)
+        if i < len(self.timestamps) and self.timestamps[i] == timestamp:
+            return self.values[i]
+        return None
+
+    def slice(self, start: int, end: int) -> 'MeterReadings':
+        """
+        Return the readings of a time window
+        :param start: the start timestamp (inclusive)
+        :param end: the end timestamp (exclusive)
+        :return: the readings
+        """
+        i: int = self.index(start)
+        j: int = self.index(end)
+        return MeterReadings(self.timestamps[i:j], self.values[i:j])
+
+    def since(self, timestamp: int) -> 'MeterReadings':
+        """
+        Return the readings at or after a time
+        :param timestamp: the timestamp (inclusive)
+        :return: the readings
+        """
+        i: int = self.index(timestamp)
+        return MeterReadings(self.timestamps[i:], self.values[i:])
+
+    def after(self, timestamp: int) -> 'MeterReadings':
+        """
+        Return the readings after a time
+        :param timestamp: the timestamp (exclusive)
+        :return: the readings
+        """
+        i: int = bisect_right(self.timestamps, timestamp)
+        return MeterReadings(self.timestamps[i:], self.values[i:])
+
+    def slice_dates(self, start: date, end: date) -> 'MeterReadings':
+        """
+        Return the readings of a range of days
+        :param start: the start date (inclusive)
+        :param end: the end date (exclusive)
+        :return: the readings
+        """
+        return self.slice(day_to_timestamp(start), day_to_timestamp(end))
+
+    def sum(self) -> int:
+        """
+        Return the sum of the values
+        :return: the sum
+        """
+        np = get_numpy()
+        if np is not None and len(self.values) > 0:
+            return int(np.frombuffer(self.values, dtype=np.int32).sum(dtype=np.int64))
+        return sum(self.values)
+
+    def merge(self, other: 'MeterReadings') -> 'MeterReadings':
+        """
+        Return the union of the readings, the readings of the other series replacing the ones at the same time
+        :param other: the other readings
+        :return: the readings
+        """
+        last: int = self.get_last_timestamp()
+        if last is None or (len(other) > 0 and other.timestamps[0] > last):
+            return MeterReadings(self.timestamps + other.timestamps, self.values + other.values)
+        items: dict[int, int] = dict(zip(self.timestamps, self.values))
+        items.update(zip(other.timestamps, other.values))
+        keys: list[int] = sorted(items)
+        return MeterReadings(array('q', keys), array('i', [items[k] for k in keys]))
+
+    def get_fingerprint(self) -> int:
+        """
+        Return a checksum of the readings, computed on the raw arrays
+        :return: the checksum
+        """
+        return zlib.crc32(self.values.tobytes(), zlib.crc32(self.timestamps.tobytes()))
+
+    def to_json(self) -> list[list[int]]:
+        """
+        Return the readings as JSON compatible lists
+        :return: the timestamps and the values
+        """
+        return [self.timestamps.tolist(), self.values.tolist()]
+
+    @staticmethod
+    def from_json(value: list[list[int]]) -> 'MeterReadings':
+        """
+        Build the readings from JSON compatible lists
+        :param value: the timestamps and the values
+        :return: the readings
+        """
+        return MeterReadings(array('q', value[0]), array('i', value[1]))
+
+
+@dataclass(frozen=True, slots=True)
+class MaxPowerReading:
+    """
+    The maximum power of a day in VA, reached at the given time
+    """
+    time: datetime
+    value: int
+
+
+@dataclass(frozen=True, slots=True)
+class ContractInfo:
+    """
+    The contract of the usage point
+    """
+    subscribed_power: str | None = None  # pylint: disable=unsupported-binary-operation
+    offpeak_hours: str | None = None  # pylint: disable=unsupported-binary-operation
+    distribution_tariff: str | None = None  # pylint: disable=unsupported-binary-operation
+    contract_status: str | None = None  # pylint: disable=unsupported-binary-operation
+    last_activation_date: date | None = None  # pylint: disable=unsupported-binary-operation
+
+
+@dataclass(frozen=True, slots=True)
+class EnedisDataSnapshot:
+    """
+    The data fetched by the coordinator during one refresh, shared by all the entities of the PDL.
+    Daily consumption and load curve values are in Wh, max power values are in VA.
+    """
+    pdl: str
+    fetched_at: datetime
+    daily_consumption: MeterReadings = field(default_factory=MeterReadings)
+    load_curve: MeterReadings = field(default_factory=MeterReadings)
+    max_power: tuple[MaxPowerReading, ...] = ()
+    contract: ContractInfo | None = None  # pylint: disable=unsupported-binary-operation
+
+    def get_fingerprints(self) -> dict[str, int]:
+        """
+        Return the fingerprints of the datasets, the time of the fetch excluded, so two fetches of the same data have the same fingerprints
+        :return: the fingerprints by dataset
+        """
+        return {
+            EnedisDatasetEnum.DAILY_CONSUMPTION: self.daily_consumption.get_fingerprint(),
+            EnedisDatasetEnum.LOAD_CURVE: self.load_curve.get_fingerprint(),
+            EnedisDatasetEnum.MAX_POWER: hash(self.max_power),
+            EnedisDatasetEnum.CONTRACT: hash(self.contract)
+        }
+
+    def get_daily_consumption(self, day: date) -> int | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the consumption of the given day
+        :param day: the day
+        :return: the consumption in Wh or None if not available
+        """
+        return self.daily_consumption.get_value(day_to_timestamp(day))
+
+    def get_max_power(self, day: date) -> MaxPowerReading | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the maximum power of the given day
+        :param day: the day
+        :return: the reading in VA or None if not available
+        """
+        for reading in reversed(self.max_power):
+            if reading.time.date() == day:
+                return reading
+        return None
+
+    def get_last_complete_hour(self) -> IntervalReading | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the consumption of the last complete hour of the load curve
+        :return: the reading in Wh or None if not available
+        """
+        last: int = self.load_curve.get_last_timestamp()
+        if last is None:
+            return None
+        end: int = (last + HALF_HOUR_SECONDS) // HOUR_SECONDS * HOUR_SECONDS
+        return IntervalReading(EPOCH + timedelta(seconds=end - HOUR_SECONDS), self.load_curve.slice(end - HOUR_SECONDS, end).sum())
+
+    def get_load_curve(self, day: date) -> MeterReadings:
+        """
+        Return the load curve of the given day
+        :param day: the day
+        :return: the readings in Wh
+        """
+        return self.load_curve.slice_dates(day, day + timedelta(days=1))
+
+
+def day_to_timestamp(value: date) -> int:
+    """
+    Convert a date to the local timestamp of its start
+    :param value: the date
+    :return: the seconds
+    """
+    return (value - EPOCH_DATE).days * SECONDS_PER_DAY
+
+
+def _get_interval_readings(response: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Return the raw readings of a response
+    :param response: the response of the API
+    :return: the readings
+    """
+    if not response or METER_READING_FIELD not in response:
+        return []
+    return response[METER_READING_FIELD].get(INTERVAL_READING_FIELD) or []
+
+
+def parse_max_power_readings(response: dict[str, Any]) -> tuple[MaxPowerReading, ...]:
+    """
+    Parse a daily max power response
+    :param response: the response of the API
+    :return: the readings in VA
+    """
+    result: list[MaxPowerReading] = []
+    for r in _get_interval_readings(response):
+        value: str = r[DATE_FIELD]
+        time: datetime = datetime.strptime(value, DATE_TIME_SECONDS_FORMAT) if len(value) > 10 else datetime.strptime(value, DATE_FORMAT)
+        result.append(MaxPowerReading(time, int(r[VALUE_FIELD])))
+    return tuple(result)
+
+
+def _parse_date(value: str) -> date | None:  # pylint: disable=unsupported-binary-operation
+    """
+    Parse a date of the API which can be suffixed by a time zone like 2013-08-14+01:00
+    :param value: the value
+    :return: the date or None
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[0:10], DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+def parse_contract(response: dict[str, Any], pdl: str) -> ContractInfo | None:  # pylint: disable=unsupported-binary-operation
+    """
+    Parse a contracts response
+    :param response: the response of the API
+    :param pdl: the PDL
+    :return: the contract or None if not found
+    """
+    if not response or 'customer' not in response:
+        return None
+    for usage_point in response['customer'].get('usage_points') or []:
+        if usage_point.get('usage_point', {}).get('usage_point_id') not in (None, pdl):
+            continue
+        contracts: dict[str, Any] = usage_point.get('contracts') or {}
+        return ContractInfo(
+            subscribed_power=contracts.get('subscribed_power'),
+            offpeak_hours=contracts.get('offpeak_hours'),
+            distribution_tariff=contracts.get('distribution_tariff'),
+            contract_status=contracts.get('contract_status'),
+            last_activation_date=_parse_date(contracts.get('last_activation_date'))
+        )
+    return None
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The limiters of the rate of the requests sent to the API
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import API_RATE_LIMIT, API_BURST, DOMAIN, RequestPriorityEnum
+
+_LOGGER = logging.getLogger(__name__)
+DATA_RATE_LIMITERS: str = DOMAIN + "_rate_limiters"
+QUEUE_DEPTH_METRIC: str = 'queue_depth'
+GRANTED_METRIC: str = 'granted'
+THROTTLED_METRIC: str = 'throttled'
+AVERAGE_WAIT_METRIC: str = 'average_wait'
+MAX_WAIT_METRIC: str = 'max_wait'
+
+
+class RateLimiter:
+    """
+    Space the requests to respect a maximum rate
+    """
+
+    def __init__(self, rate: float):
+        """
+        Constructor
+        :param rate: the maximum number of requests per second
+        """
+        self._interval: float = 1 / rate if rate > 0 else 0
+        self._next: float = 0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def async_acquire(self) -> None:
+        """
+        Wait until the next request can be sent
+        """
+        async with self._lock:
+            now: float = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self._interval
+
+
+class TokenBucketLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    Share the quota of an application between all its callers.
+    The bucket is refilled at the rate of the quota up to the burst size, each request takes a token.
+    When the bucket is empty the callers wait in a queue ordered by priority then by arrival, so an interactive validation goes before the polls and the polls before a backfill.
+    """
+
+    def __init__(self, rate: float = API_RATE_LIMIT, burst: int = API_BURST):
+        """
+        Constructor
+        :param rate: the number of tokens added per second
+        :param burst: the maximum number of tokens
+        """
+        self._rate: float = rate
+        self._burst: int = burst
+        self._tokens: float = burst
+        self._updated: float = time.monotonic()
+        self._paused_until: float = 0
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        # noinspection PyTypeChecker
+        self._timer: asyncio.TimerHandle = None
+        self._granted: dict[RequestPriorityEnum, int] = {p: 0 for p in RequestPriorityEnum}
+        self._wait_time: dict[RequestPriorityEnum, float] = {p: 0.0 for p in RequestPriorityEnum}
+        self._max_wait: float = 0
+        self._throttled: int = 0
+
+    def get_queue_depth(self) -> int:
+        """
+        Return the number of callers waiting for a token
+        :return: the number of callers
+        """
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def get_metrics(self) -> dict[str, Any]:
+        """
+        Return the metrics of the limiter
+        :return: the queue depth, the number of granted requests and the average wait time in seconds by priority, the maximum wait time and the number of throttled responses
+        """
+        depth: dict[str, int] = {p.name.lower(): 0 for p in RequestPriorityEnum}
+        for priority, _, future in self._queue:
+            if not future.done():
+                depth[RequestPriorityEnum(priority).name.lower()] += 1
+        return {
+            QUEUE_DEPTH_METRIC: depth,
+            GRANTED_METRIC: {p.name.lower(): v for p, v in self._granted.items()},
+            AVERAGE_WAIT_METRIC: {p.name.lower(): round(self._wait_time[p] / v, 3) if v else 0.0 for p, v in self._granted.items()},
+            MAX_WAIT_METRIC: round(self._max_wait, 3),
+            THROTTLED_METRIC: self._throttled
+        }
+
+    async def async_acquire(self, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> float:
+        """
+        Wait for a token
+        :param priority: the priority of the request
+        :return: the time waited in seconds
+        """
+        start: float = time.monotonic()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._dispatch()
+        # a cancelled caller stays in the queue as a done future and is skipped by the dispatch
+        await future
+        waited: float = time.monotonic() - start
+        self._granted[priority] += 1
+        self._wait_time[priority] += waited
+        self._max_wait = max(self._max_wait, waited)
+        if waited > 1 and _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Request of priority %s waited %.1fs, %s request(s) queued", priority.name, waited, self.get_queue_depth())
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop granting tokens for a while, used when the API reports that the quota is exceeded
+        :param seconds: the duration of the pause
+        """
+        self._throttled += 1
+        self._tokens = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        _LOGGER.warning("Quota of the API exceeded, requests paused for %.1fs", seconds)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """
+        Grant the available tokens to the queued callers and schedule the next dispatch if callers remain
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            # noinspection PyTypeChecker
+            self._timer = None
+        now: float = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        while self._queue:
+            if self._queue[0][2].done():
+                heapq.heappop(self._queue)
+            elif now < self._paused_until:
+                delay: float = self._paused_until - now
+                break
+            elif self._tokens < 1:
+                delay = (1 - self._tokens) / self._rate
+                break
+            else:
+                self._tokens -= 1
+                heapq.heappop(self._queue)[2].set_result(None)
+        else:
+            return
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+def get_rate_limiter(hass: HomeAssistant, client_id: str) -> TokenBucketLimiter:
+    """
+    Return the limiter of an application, shared by all the clients and configuration entries using it
+    :param hass: the Home Assistant instance
+    :param client_id: the client identifier of the application
+    :return: the limiter
+    """
+    limiters: dict[str, TokenBucketLimiter] = hass.data.setdefault(DATA_RATE_LIMITERS, {})
+    limiter: TokenBucketLimiter = limiters.get(client_id)
+    if limiter is None:
+        limiter = TokenBucketLimiter()
+        limiters[client_id] = limiter
+    return limiter
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The incremental decoding of the readings of the responses of the API
+"""
+import codecs
+import re
+from datetime import date
+
+from .models import MeterReadings
+
+EPOCH_ORDINAL: int = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY: int = 86400
+DEFAULT_INTERVAL_SECONDS: int = 1800
+# number of characters kept while the array of readings is not found, enough to hold a split field name
+TAIL_LENGTH: int = 64
+ARRAY_START_PATTERN = re.compile(r'"interval_reading"\s*:\s*\[')
+DOCUMENT_PATTERN = re.compile(r'"meter_reading"\s*:')
+# the readings are flat objects, so an object is complete once its closing brace is received
+READING_PATTERN = re.compile(r'\s*,?\s*(\{[^{}]*})')
+ARRAY_END_PATTERN = re.compile(r'\s*,?\s*]')
+VALUE_PATTERN = re.compile(r'"value"\s*:\s*"?(-?\d+)')
+DATE_PATTERN = re.compile(r'"date"\s*:\s*"([^"]+)"')
+INTERVAL_LENGTH_FIELD_PATTERN = re.compile(r'"interval_length"\s*:\s*"([^"]*)"')
+INTERVAL_LENGTH_PATTERN = re.compile(r'PT(\d+)([MH])')
+
+
+def parse_timestamp(value: str) -> int:
+    """
+    Convert a date (2024-01-31) or a date and time (2024-01-31 12:30:00) of the API to a local timestamp (see history_store)
+    :param value: the date and time
+    :return: the seconds
+    """
+    result: int = (date(int(value[0:4]), int(value[5:7]), int(value[8:10])).toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+    if len(value) >= 19:
+        result += int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+    return result
+
+
+def parse_interval_seconds(value: str) -> int:
+    """
+    Parse an ISO 8601 duration like PT30M
+    :param value: the duration
+    :return: the seconds
+    """
+    match: re.Match = INTERVAL_LENGTH_PATTERN.fullmatch(value or '')
+    if match is None:
+        return DEFAULT_INTERVAL_SECONDS
+    return int(match.group(1)) * (60 if match.group(2) == 'M' else 3600)
+
+
+class ReadingsDecoder:
+    """
+    Decode the interval_reading array of a response while it is received, each reading going straight into the typed arrays of the result.
+    Only the current reading is kept as text, the document and the readings are never built as Python objects.
+    For a load curve, the API gives the average power in W at the end of each interval, the readings are converted to energy in Wh at the start of the interval.
+    """
+
+    def __init__(self, load_curve: bool = False):
+        """
+        Constructor
+        :param load_curve: true to convert the readings of a load curve
+        """
+        self._load_curve: bool = load_curve
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer: str = ''
+        self._in_document: bool = False
+        self._in_array: bool = False
+        self._done: bool = False
+        self._lengths: dict[str, int] = {}
+        self._result: MeterReadings = MeterReadings()
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Decode a chunk of the response
+        :param chunk: the bytes
+        """
+        if self._done:
+            return
+        buffer: str = self._buffer + self._decoder.decode(chunk)
+        position: int = 0
+        if not self._in_array:
+            self._in_document = self._in_document or DOCUMENT_PATTERN.search(buffer) is not None
+            match: re.Match = ARRAY_START_PATTERN.search(buffer)
+            if match is None:
+                self._buffer = buffer[-TAIL_LENGTH:]
+                return
+            self._in_array = True
+            position = match.end()
+        match = READING_PATTERN.match(buffer, position)
+        while match is not None:
+            self._add(match.group(1))
+            position = match.end()
+            match = READING_PATTERN.match(buffer, position)
+        if ARRAY_END_PATTERN.match(buffer, position):
+            self._done = True
+            buffer = ''
+            position = 0
+        self._buffer = buffer[position:]
+
+    def _add(self, reading: str) -> None:
+        """
+        Convert a reading and add it to the result
+        :param reading: the text of the reading
+        """
+        date_match: re.Match = DATE_PATTERN.search(reading)
+        value_match: re.Match = VALUE_PATTERN.search(reading)
+        if date_match is None or value_match is None:
+            raise ValueError(f"Malformed reading: {reading}")
+        timestamp: int = parse_timestamp(date_match.group(1))
+        value: int = int(value_match.group(1))
+        if self._load_curve:
+            match: re.Match = INTERVAL_LENGTH_FIELD_PATTERN.search(reading)
+            text: str = match.group(1) if match else ''
+            length: int = self._lengths.get(text)
+            if length is None:
+                length = self._lengths.setdefault(text, parse_interval_seconds(text))
+            timestamp -= length
+            value = value * length // 3600
+        self._result.append(timestamp, value)
+
+    def close(self) -> MeterReadings:
+        """
+        Return the decoded readings, a document of readings without readings giving no reading
+        :return: the readings
+        """
+        if not self._in_document and not self._in_array:
+            # an error document or the page of a gateway must not be cached as a period without readings
+            raise ValueError("Not a document of readings")
+        if self._in_array and not self._done:
+            # the partial readings of a truncated response must not be cached
+            raise ValueError(f"Truncated readings after {len(self._result)} reading(s)")
+        return self._result
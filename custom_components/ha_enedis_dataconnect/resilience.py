@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The protections of the API during failures: the exponential backoff, the retry budget and the circuit breakers of the endpoints
+"""
+import logging
+import random
+import time
+from collections import deque
+from enum import StrEnum
+from typing import Any
+
+from .const import RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN, RETRY_BUDGET_WINDOW, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, BREAKER_MAX_RESET_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """
+    Return the delay before an attempt, doubled after each attempt and randomized in its upper half so the callers failing together do not retry together
+    :param attempt: the number of the failed attempts, starting at 1
+    :param base: the delay after the first failed attempt in seconds
+    :param maximum: the maximum delay in seconds
+    :return: the delay in seconds
+    """
+    delay: float = min(maximum, base * 2 ** min(max(attempt - 1, 0), 32))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryBudget:
+    """
+    Limit the retries to a ratio of the requests sent during a sliding window.
+    When the API fails, the retries stop once the budget is spent instead of multiplying the requests.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN, window: int = RETRY_BUDGET_WINDOW):
+        """
+        Constructor
+        :param ratio: the ratio of the requests which can be retried
+        :param minimum: the number of retries always allowed during the window
+        :param window: the length of the window in seconds
+        """
+        self._ratio: float = ratio
+        self._minimum: int = minimum
+        self._window: int = window
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        """
+        Forget the requests and the retries older than the window
+        :param now: the current monotonic time
+        """
+        limit: float = now - self._window
+        while self._requests and self._requests[0] < limit:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < limit:
+            self._retries.popleft()
+
+    def record_request(self) -> None:
+        """
+        Record a request sent for the first time
+        """
+        now: float = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """
+        Take a retry from the budget
+        :return: true if the retry is allowed
+        """
+        now: float = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= max(self._minimum, int(len(self._requests) * self._ratio)):
+            return False
+        self._retries.append(now)
+        return True
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Return the requests and the retries of the window
+        :return: the metrics
+        """
+        self._trim(time.monotonic())
+        return {'requests': len(self._requests), 'retries': len(self._retries)}
+
+
+class CircuitStateEnum(StrEnum):
+    """
+    The enumeration representing the state of a circuit
+    """
+    # the requests are sent
+    CLOSED = 'closed'
+    # the requests fail without being sent
+    OPEN = 'open'
+    # one request probes the endpoint, the others fail without being sent
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Stop sending the requests of an endpoint failing repeatedly.
+    The circuit opens after consecutive failures, then a single request probes the endpoint once the reset delay expired.
+    A successful probe closes the circuit, a failed one opens it again for a doubled delay.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT, max_reset_timeout: float = BREAKER_MAX_RESET_TIMEOUT):
+        """
+        Constructor
+        :param name: the name of the endpoint
+        :param threshold: the number of consecutive failures opening the circuit
+        :param reset_timeout: the delay in seconds before the first probe
+        :param max_reset_timeout: the maximum delay in seconds before a probe
+        """
+        self._name: str = name
+        self._threshold: int = threshold
+        self._reset_timeout: float = reset_timeout
+        self._max_reset_timeout: float = max_reset_timeout
+        self._failures: int = 0
+        # the number of consecutive openings, used to compute the delay before the next probe
+        self._openings: int = 0
+        self._open_until: float = 0.0
+        self._probing: bool = False
+
+    def get_state(self) -> CircuitStateEnum:
+        """
+        Return the state of the circuit
+        :return: the state
+        """
+        if self._openings == 0:
+            return CircuitStateEnum.CLOSED
+        if time.monotonic() < self._open_until:
+            return CircuitStateEnum.OPEN
+        return CircuitStateEnum.HALF_OPEN
+
+    def get_retry_after(self) -> float:
+        """
+        Return the delay before the next probe
+        :return: the delay in seconds, 0 if the circuit is closed or can be probed
+        """
+        return max(0.0, self._open_until - time.monotonic()) if self._openings > 0 else 0.0
+
+    def allow(self) -> bool:
+        """
+        Return true if a request can be sent, the first request allowed after the reset delay is the probe
+        :return: true if the request can be sent
+        """
+        state: CircuitStateEnum = self.get_state()
+        if state == CircuitStateEnum.CLOSED:
+            return True
+        if state == CircuitStateEnum.OPEN or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """
+        Release the probe when its request ends without its result being recorded (cancelled or failed unexpectedly), so the next request probes the endpoint
+        """
+        self._probing = False
+
+    def record_success(self) -> None:
+        """
+        Record a request answered by the endpoint, the circuit is closed
+        """
+        if self._openings > 0:
+            _LOGGER.info("Circuit of %s closed", self._name)
+        self._failures = 0
+        self._openings = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """
+        Record a request failing because of the network or of the endpoint
+        """
+        self._failures += 1
+        if self._probing or (self._openings == 0 and self._failures >= self._threshold):
+            self._openings += 1
+            self._probing = False
+            delay: float = backoff_delay(self._openings, self._reset_timeout, self._max_reset_timeout)
+            self._open_until = time.monotonic() + delay
+            _LOGGER.warning("Circuit of %s opened for %.0fs after %s failure(s)", self._name, delay, self._failures)
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Return the state of the circuit as a dictionary
+        :return: the dictionary
+        """
+        return {
+            'state': self.get_state(),
+            'failures': self._failures,
+            'retry_after': round(self.get_retry_after())
+        }
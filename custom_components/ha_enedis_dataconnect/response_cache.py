@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The persisted cache of the responses of the API
+"""
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, DATE_FORMAT, RESPONSE_CACHE_SIZE, OPEN_PERIOD_TTL, UNDATED_TTL
+from .models import MeterReadings
+
+_LOGGER = logging.getLogger(__name__)
+DATA_RESPONSE_CACHE: str = DOMAIN + "_response_cache"
+STORAGE_VERSION: int = 1
+# delay in seconds used to group the writes of the storage
+STORAGE_SAVE_DELAY: int = 30
+END_PARAM: str = 'end'
+ENTRIES_FIELD: str = 'entries'
+
+
+class CachedResponse:
+    """
+    A decoded response (the JSON document or the readings decoded while the response was received), its validators and its expiration
+    """
+    __slots__ = ('body', 'etag', 'last_modified', 'expiration')
+
+    def __init__(self, body: dict[str, Any] | MeterReadings, etag: str | None, last_modified: str | None, expiration: float | None):  # pylint: disable=unsupported-binary-operation
+        """
+        Constructor
+        :param body: the decoded response
+        :param etag: the entity tag returned by the API
+        :param last_modified: the last modification date returned by the API
+        :param expiration: the time (seconds since the epoch) of the expiration or None if the response never expires
+        """
+        self.body: dict[str, Any] | MeterReadings = body  # pylint: disable=unsupported-binary-operation
+        self.etag: str = etag
+        self.last_modified: str = last_modified
+        self.expiration: float = expiration
+
+    def is_fresh(self) -> bool:
+        """
+        Return true if the response can be used without asking the API
+        :return: true if the response is fresh
+        """
+        return self.expiration is None or time.time() < self.expiration
+
+    def get_conditional_headers(self) -> dict[str, str]:
+        """
+        Return the headers used to revalidate the response
+        :return: the headers
+        """
+        result: dict[str, str] = {}
+        if self.etag:
+            result['If-None-Match'] = self.etag
+        if self.last_modified:
+            result['If-Modified-Since'] = self.last_modified
+        return result
+
+
+def compute_expiration(params: dict[str, str]) -> float | None:  # pylint: disable=unsupported-binary-operation
+    """
+    Return the expiration of the response of a request.
+    A period ending before yesterday is closed, its data will not change anymore, so it never expires.
+    :param params: the query parameters of the request
+    :return: the time (seconds since the epoch) of the expiration or None if the response never expires
+    """
+    if END_PARAM not in params:
+        return time.time() + UNDATED_TTL
+    try:
+        end: date = datetime.strptime(params[END_PARAM], DATE_FORMAT).date()
+    except ValueError:
+        return time.time() + OPEN_PERIOD_TTL
+    if end <= date.today() - timedelta(days=1):
+        return None
+    return time.time() + OPEN_PERIOD_TTL
+
+
+class EnedisResponseCache:
+    """
+    Cache the responses by endpoint and query parameters (so by PDL and period), the least recently used responses being evicted above the maximum size.
+    The cache is shared by all the clients and persisted in the Home Assistant storage, so the closed periods are not fetched again after a restart.
+    """
+
+    def __init__(self, hass: HomeAssistant, size: int = RESPONSE_CACHE_SIZE):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param size: the maximum number of responses
+        """
+        self._size: int = size
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.response_cache")
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._loaded: bool = False
+        self._hits: int = 0
+        self._misses: int = 0
+        self._revalidations: int = 0
+
+    @staticmethod
+    def build_key(path: str, params: dict[str, str]) -> str:
+        """
+        Build the key of a request
+        :param path: the path of the endpoint
+        :param params: the query parameters
+        :return: the key
+        """
+        return path + '?' + '&'.join(f"{k}={params[k]}" for k in sorted(params))
+
+    def get_metrics(self) -> dict[str, int]:
+        """
+        Return the metrics of the cache
+        :return: the number of responses, hits, misses and revalidated responses
+        """
+        return {'size': len(self._entries), 'hits': self._hits, 'misses': self._misses, 'revalidations': self._revalidations}
+
+    async def async_load(self) -> None:
+        """
+        Load the cache from the storage, the expired responses are kept for their validators
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        data: dict[str, Any] = await self._store.async_load()
+        if not data:
+            return
+        for key, (body, etag, last_modified, expiration, readings) in data.get(ENTRIES_FIELD, {}).items():
+            self._entries[key] = CachedResponse(MeterReadings.from_json(body) if readings else body, etag, last_modified, expiration)
+        _LOGGER.debug("%s cached responses restored", len(self._entries))
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """
+        Return the data to store
+        :return: the data
+        """
+        result: dict[str, list[Any]] = {}
+        for key, entry in self._entries.items():
+            readings: bool = isinstance(entry.body, MeterReadings)
+            result[key] = [entry.body.to_json() if readings else entry.body, entry.etag, entry.last_modified, entry.expiration, readings]
+        return {ENTRIES_FIELD: result}
+
+    def get(self, key: str) -> CachedResponse | None:  # pylint: disable=unsupported-binary-operation
+        """
+        Return the cached response of a request, fresh or not
+        :param key: the key of the request
+        :return: the response or None
+        """
+        entry: CachedResponse = self._entries.get(key)
+        if entry is None or not entry.is_fresh():
+            self._misses += 1
+        else:
+            self._hits += 1
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: dict[str, Any] | MeterReadings, etag: str | None, last_modified: str | None, expiration: float | None) -> None:  # pylint: disable=unsupported-binary-operation
+        """
+        Store a response and evict the least recently used ones
+        :param key: the key of the request
+        :param body: the decoded response
+        :param etag: the entity tag returned by the API
+        :param last_modified: the last modification date returned by the API
+        :param expiration: the time of the expiration or None if the response never expires
+        """
+        self._entries[key] = CachedResponse(body, etag, last_modified, expiration)
+        self._entries.move_to_end(key)
+        self._evict()
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def _evict(self) -> None:
+        """
+        Evict the least recently used responses above the maximum size
+        """
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def revalidate(self, key: str, entry: CachedResponse, expiration: float | None) -> CachedResponse:  # pylint: disable=unsupported-binary-operation
+        """
+        Extend the expiration of a response confirmed as unchanged by the API
+        :param key: the key of the request
+        :param entry: the response sent to the API with its validators, stored again if it was evicted during the request
+        :param expiration: the new expiration
+        :return: the response
+        """
+        entry.expiration = expiration
+        if key not in self._entries:
+            self._entries[key] = entry
+            self._evict()
+        self._revalidations += 1
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+        return entry
+
+
+def get_response_cache(hass: HomeAssistant) -> EnedisResponseCache:
+    """
+    Return the cache of the Home Assistant instance, creating it if needed
+    :param hass: the Home Assistant instance
+    :return: the cache
+    """
+    cache: EnedisResponseCache = hass.data.get(DATA_RESPONSE_CACHE)
+    if cache is None:
+        cache = EnedisResponseCache(hass)
+        hass.data[DATA_RESPONSE_CACHE] = cache
+    return cache
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The scheduler of the polls aligned with the publication of the data by Enedis
+"""
+import logging
+import random
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from .const import PUBLICATION_WINDOW_START_HOUR, PUBLICATION_WINDOW_END_HOUR, LATE_PUBLICATION_INTERVAL, PDL_JITTER, DEFAULT_DATASETS, EnedisDatasetEnum
+from .models import EnedisDataSnapshot, day_to_timestamp
+
+_LOGGER = logging.getLogger(__name__)
+# random part of the jitter in seconds, added to the part derived from the PDL
+RANDOM_JITTER: int = 60
+# start of the last interval of a day in seconds
+LAST_INTERVAL_OFFSET: int = 23 * 3600 + 30 * 60
+
+
+def is_day_complete(snapshot: EnedisDataSnapshot, day: date, datasets: frozenset[str] = frozenset(DEFAULT_DATASETS)) -> bool:
+    """
+    Return true if the daily consumption and the whole load curve of a day are available
+    :param snapshot: the data
+    :param day: the day
+    :param datasets: the datasets fetched, the daily consumption and the load curve are not expected if they are not fetched
+    :return: true if the day is complete
+    """
+    if snapshot is None:
+        return False
+    if EnedisDatasetEnum.DAILY_CONSUMPTION in datasets and snapshot.get_daily_consumption(day) is None:
+        return False
+    if EnedisDatasetEnum.LOAD_CURVE not in datasets:
+        return True
+    last: int = snapshot.load_curve.get_last_timestamp()
+    return last is not None and last >= day_to_timestamp(day) + LAST_INTERVAL_OFFSET
+
+
+class EnedisPollingScheduler:
+    """
+    Decide when the next poll of a PDL happens.
+    Enedis publishes the data of a day once, during the morning of the next day. Once the previous day is complete, the next poll is in the publication window of the next day.
+    Inside the window, the polls follow the configured scan interval. After the window, a late publication is polled every hour.
+    The start of the window is shifted by PDL so the polls of many meters are spread.
+    """
+
+    def __init__(self, pdl: str, scan_interval: int, datasets: frozenset[str] = frozenset(DEFAULT_DATASETS)):
+        """
+        Constructor
+        :param pdl: the PDL
+        :param scan_interval: the interval in seconds between polls inside the publication window
+        :param datasets: the datasets fetched
+        """
+        self._pdl: str = pdl
+        self._datasets: frozenset[str] = datasets
+        self._scan_interval: timedelta = timedelta(seconds=scan_interval)
+        self._jitter: timedelta = timedelta(seconds=zlib.crc32(pdl.encode('utf-8')) % PDL_JITTER)
+
+    def get_window(self, day: date) -> tuple[datetime, datetime]:
+        """
+        Return the publication window of a day, shifted for the PDL
+        :param day: the day of the publication
+        :return: the start and the end of the window
+        """
+        start: datetime = datetime.combine(day, time(PUBLICATION_WINDOW_START_HOUR)) + self._jitter
+        end: datetime = datetime.combine(day, time(PUBLICATION_WINDOW_END_HOUR)) + self._jitter
+        return start, end
+
+    def next_interval(self, snapshot: EnedisDataSnapshot, now: datetime) -> timedelta:
+        """
+        Return the delay before the next poll
+        :param snapshot: the data of the last poll
+        :param now: the current local date and time
+        :return: the delay
+        """
+        start, end = self.get_window(now.date())
+        if is_day_complete(snapshot, now.date() - timedelta(days=1), self._datasets):
+            # nothing new before the publication of the next day
+            target: datetime = self.get_window(now.date() + timedelta(days=1))[0]
+        elif now < start:
+            target = start
+        elif now < end:
+            target = now + self._scan_interval
+        else:
+            target = now + timedelta(seconds=LATE_PUBLICATION_INTERVAL)
+        result: timedelta = max(target - now, self._scan_interval) + timedelta(seconds=random.uniform(0, RANDOM_JITTER))
+        _LOGGER.debug("Next poll of %s in %s", self._pdl, result)
+        return result
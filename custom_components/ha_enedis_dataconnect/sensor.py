@@ -4,14 +4,25 @@
 The sensor
 """
 import logging
+from typing import Any
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 
-from .const import COORDINATOR_KEY, DOMAIN, SENSOR_TYPES, SensorTypeEnum, EnedisHistoryDetailsTypeEnum, EnedisDetailsPeriodEnum
-from .coordinators import EnedisDataUpdateCoordinator, EnedisSensorCoordinatorEntity, EnedisConsumedHistoryCoordinatorEntity, EnedisConsumedDailyCostCoordinatorEntity, EnedisConsumedEnergyCoordinatorEntity, EnedisConsumedEnergyDetailsCoordinatorEntity, EnedisConsumedEnergyCostDetailsCoordinatorEntity
+from .const import COORDINATORS_KEY, DOMAIN, SENSOR_TYPES, SensorTypeEnum, EnedisHistoryDetailsTypeEnum, EnedisDetailsPeriodEnum
+from .coordinators import SENSOR_ENTITY_CLASSES, AbstractCoordinatorEntity, EnedisDataUpdateCoordinator
 
 ICON = "mdi:currency-euro"
 _LOGGER = logging.getLogger(__name__)
+# the arguments given to the constructor of the entity class of a sensor type (see SENSOR_ENTITY_CLASSES), after its definition and its coordinator
+SENSOR_ENTITY_ARGUMENTS: dict[str, dict[str, Any]] = {
+    SensorTypeEnum.CONSUMED_HISTORY_SENSOR_TYPE: {'details_type': EnedisHistoryDetailsTypeEnum.ALL},
+    SensorTypeEnum.CONSUMED_HISTORY_PEAK_HOURS_SENSOR_TYPE: {'details_type': EnedisHistoryDetailsTypeEnum.PEAK_HOURS},
+    SensorTypeEnum.CONSUMED_HISTORY_OFF_PEAK_HOURS_SENSOR_TYPE: {'details_type': EnedisHistoryDetailsTypeEnum.OFF_PEAK_HOURS},
+    SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE: {'days': 1},
+    SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_SENSOR_TYPE: {'details_type': EnedisDetailsPeriodEnum.HOURS},
+    SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_COST_SENSOR_TYPE: {'details_type': EnedisDetailsPeriodEnum.HOURS}
+}
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):  # pylint: disable=missing-type-doc
@@ -22,24 +33,25 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
     :param async_add_entities: the function used to add devices
     """
     _LOGGER.debug("Setting the entry of the sensor...")
-    coordinator: EnedisDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR_KEY]
+    coordinators: dict[str, EnedisDataUpdateCoordinator] = hass.data[DOMAIN][entry.entry_id][COORDINATORS_KEY]
     entities = []
-    for key, value in SENSOR_TYPES.items():
-        if key == SensorTypeEnum.MAIN_SENSOR_TYPE:
-            entities.append(EnedisSensorCoordinatorEntity(value, coordinator))
-        elif key == SensorTypeEnum.CONSUMED_HISTORY_SENSOR_TYPE:
-            entities.append(EnedisConsumedHistoryCoordinatorEntity(value, coordinator, details_type=EnedisHistoryDetailsTypeEnum.ALL))
-        elif key == SensorTypeEnum.CONSUMED_HISTORY_PEAK_HOURS_SENSOR_TYPE:
-            entities.append(EnedisConsumedHistoryCoordinatorEntity(value, coordinator, details_type=EnedisHistoryDetailsTypeEnum.PEAK_HOURS))
-        elif key == SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE:
-            entities.append(EnedisConsumedDailyCostCoordinatorEntity(value, coordinator, 1))
-        elif key == SensorTypeEnum.CONSUMED_ENERGY_SENSOR_TYPE:
-            entities.append(EnedisConsumedEnergyCoordinatorEntity(value, coordinator))
-        elif key == SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_SENSOR_TYPE:
-            entities.append(EnedisConsumedEnergyDetailsCoordinatorEntity(value, coordinator, details_type=EnedisDetailsPeriodEnum.HOURS))
-        elif key == SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_COST_SENSOR_TYPE:
-            entities.append(EnedisConsumedEnergyCostDetailsCoordinatorEntity(value, coordinator, details_type=EnedisDetailsPeriodEnum.HOURS))
+    for coordinator in coordinators.values():
+        _add_entities(coordinator, entities)
     async_add_entities(
         entities,
         False,
     )
+
+
+def _add_entities(coordinator: EnedisDataUpdateCoordinator, entities: list) -> None:
+    """
+    Build the entities of a PDL
+    :param coordinator: the coordinator of the PDL
+    :param entities: the list receiving the entities
+    """
+    # the disabled sensors are not built, so they are not notified and their datasets are not fetched
+    sensors: frozenset[str] = coordinator.get_sensors()
+    for key, value in SENSOR_TYPES.items():
+        entity_class: type[AbstractCoordinatorEntity] = SENSOR_ENTITY_CLASSES.get(key)
+        if key in sensors and entity_class is not None:
+            entities.append(entity_class(value, coordinator, **SENSOR_ENTITY_ARGUMENTS.get(key, {})))
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The services of the custom component
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+
+from .backfill import EnedisBackfill
+from .const import DOMAIN, COORDINATORS_KEY, PDL_KEY, BACKFILL_SERVICE, START_DATE_KEY, END_DATE_KEY, CONCURRENCY_KEY, RATE_KEY, DEFAULT_BACKFILL_CONCURRENCY, DEFAULT_BACKFILL_RATE, GET_HISTORY_SERVICE, SERIES_KEY, SERIES_MAX_POINTS, EnedisSeriesEnum
+from .coordinators import EnedisDataUpdateCoordinator
+from .history_store import EnedisHistoryStore
+from .models import EPOCH, day_to_timestamp
+
+_LOGGER = logging.getLogger(__name__)
+BACKFILL_SCHEMA = vol.Schema({
+    vol.Required(PDL_KEY): cv.string,
+    vol.Required(START_DATE_KEY): cv.date,
+    vol.Optional(END_DATE_KEY): cv.date,
+    vol.Optional(CONCURRENCY_KEY, default=DEFAULT_BACKFILL_CONCURRENCY): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+    vol.Optional(RATE_KEY, default=DEFAULT_BACKFILL_RATE): vol.All(vol.Coerce(float), vol.Range(min=0.01, max=10))
+})
+GET_HISTORY_SCHEMA = vol.Schema({
+    vol.Required(PDL_KEY): cv.string,
+    vol.Required(SERIES_KEY): vol.In([e.value for e in EnedisSeriesEnum]),
+    vol.Required(START_DATE_KEY): cv.date,
+    vol.Optional(END_DATE_KEY): cv.date
+})
+TIMESTAMPS_KEY: str = 'timestamps'
+VALUES_KEY: str = 'values'
+UNIT_KEY: str = 'unit'
+WATT_HOUR: str = 'Wh'
+
+
+def get_coordinator(hass: HomeAssistant, pdl: str) -> EnedisDataUpdateCoordinator:
+    """
+    Return the coordinator of a PDL
+    :param hass: the Home Assistant instance
+    :param pdl: the PDL
+    :return: the coordinator
+    """
+    for data in hass.data.get(DOMAIN, {}).values():
+        coordinator: EnedisDataUpdateCoordinator = data.get(COORDINATORS_KEY, {}).get(pdl)
+        if coordinator:
+            return coordinator
+    raise ServiceValidationError(f"PDL not configured: {pdl}")
+
+
+def build_series_response(coordinator: EnedisDataUpdateCoordinator, series: str, start: date, end: date = None) -> dict[str, Any]:
+    """
+    Build the response serving a series of the local history, the values are given in columns to keep the payload small
+    :param coordinator: the coordinator of the PDL
+    :param series: the series (see EnedisSeriesEnum)
+    :param start: the start date (inclusive)
+    :param end: the end date (exclusive), tomorrow if not specified
+    :return: the response
+    """
+    end = end or date.today() + timedelta(days=1)
+    if start >= end:
+        raise ServiceValidationError(f"Invalid range of dates: {start} - {end}")
+    history: EnedisHistoryStore = coordinator.get_history_store()
+    timestamps, values = history.get_series(series, day_to_timestamp(start), day_to_timestamp(end))
+    if len(timestamps) > SERIES_MAX_POINTS:
+        raise ServiceValidationError(f"Too many readings ({len(timestamps)}), the maximum is {SERIES_MAX_POINTS}: {start} - {end}")
+    return {
+        PDL_KEY: coordinator.get_pdl(),
+        SERIES_KEY: series,
+        START_DATE_KEY: start.isoformat(),
+        END_DATE_KEY: end.isoformat(),
+        UNIT_KEY: WATT_HOUR,
+        TIMESTAMPS_KEY: [(EPOCH + timedelta(seconds=t)).isoformat() for t in timestamps],
+        VALUES_KEY: values
+    }
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """
+    Register the services
+    :param hass: the Home Assistant instance
+    """
+
+    async def async_backfill(call: ServiceCall) -> ServiceResponse:
+        """
+        Fetch the history of a PDL over a range of dates
+        :param call: the call of the service
+        :return: the summary of the backfill
+        """
+        coordinator: EnedisDataUpdateCoordinator = get_coordinator(hass, call.data[PDL_KEY])
+        start: date = call.data[START_DATE_KEY]
+        # the data of the current day is never available
+        end: date = min(call.data.get(END_DATE_KEY, date.today()), date.today())
+        if start >= end:
+            raise ServiceValidationError(f"Invalid range of dates: {start} - {end}")
+        backfill: EnedisBackfill = EnedisBackfill(coordinator.get_api_helper(), coordinator.get_history_store(), call.data[CONCURRENCY_KEY], call.data[RATE_KEY])
+        result: dict[str, Any] = await backfill.async_run(start, end)
+        # the cumulative sums change from the start of the backfill
+        await coordinator.get_statistics_importer().async_import(datetime.combine(start, datetime.min.time()))
+        coordinator.async_history_changed()
+        _LOGGER.info("Backfill of %s done: %s", call.data[PDL_KEY], result)
+        return result
+
+    async def async_get_history(call: ServiceCall) -> ServiceResponse:
+        """
+        Return a series of the local history, the series are not exposed in the attributes of the entities
+        :param call: the call of the service
+        :return: the series
+        """
+        coordinator: EnedisDataUpdateCoordinator = get_coordinator(hass, call.data[PDL_KEY])
+        return build_series_response(coordinator, call.data[SERIES_KEY], call.data[START_DATE_KEY], call.data.get(END_DATE_KEY))
+
+    hass.services.async_register(DOMAIN, BACKFILL_SERVICE, async_backfill, schema=BACKFILL_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, GET_HISTORY_SERVICE, async_get_history, schema=GET_HISTORY_SCHEMA, supports_response=SupportsResponse.ONLY)
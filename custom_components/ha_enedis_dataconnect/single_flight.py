@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The coalescing of concurrent calls
+"""
+import asyncio
+from collections.abc import Awaitable, Callable
+from functools import partial
+from typing import Any
+
+
+class SingleFlight:
+    """
+    Run a single call by key at a time: the callers arriving while a call is in progress wait for it and share its result or its error.
+    The call runs in its own task, so a cancelled caller only stops waiting and the other callers still receive the result.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._pending: dict[str, asyncio.Task] = {}
+
+    def is_running(self, key: str) -> bool:
+        """
+        Return true if a call is in progress for the key
+        :param key: the key
+        :return: true if a call is in progress
+        """
+        return key in self._pending
+
+    async def async_run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run the call of the key or join the one in progress
+        :param key: the key
+        :param factory: the function creating the call
+        :return: the result of the call
+        """
+        task: asyncio.Task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._pending[key] = task
+            task.add_done_callback(partial(self._release, key))
+        return await asyncio.shield(task)
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        """
+        Forget the completed call
+        :param key: the key
+        :param task: the task of the call
+        """
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            # the error is retrieved even if all the callers were cancelled
+            task.exception()
+
+    def cancel(self) -> None:
+        """
+        Cancel the calls in progress, their callers receive a CancelledError
+        """
+        for task in self._pending.values():
+            task.cancel()
@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The tariff engine computing the costs of the consumption
+"""
+import math
+import operator
+import re
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from enum import StrEnum
+from collections.abc import Sequence
+from itertools import repeat
+
+from .utils import get_numpy
+
+SECONDS_PER_DAY: int = 86400
+SLOT_SECONDS: int = 1800
+SLOTS_PER_DAY: int = SECONDS_PER_DAY // SLOT_SECONDS
+EPOCH_DATE: date = date(1970, 1, 1)
+# the days of the Tempo option start at 6:00
+TEMPO_DAY_OFFSET: int = 6 * 3600
+DEFAULT_TEMPO_OFF_PEAK_HOURS: str = 'HC (22H00-6H00)'
+OFF_PEAK_HOURS_PATTERN = re.compile(r'(\d{1,2})H(\d{2})\s*-\s*(\d{1,2})H(\d{2})')
+
+
+class TariffOptionEnum(StrEnum):
+    """
+    The enumeration representing the pricing option of the contract
+    """
+    BASE = 'base'
+    PEAK_OFF_PEAK = 'peak_off_peak'
+    TEMPO = 'tempo'
+
+
+class TempoColorEnum(StrEnum):
+    """
+    The enumeration representing the color of a Tempo day
+    """
+    BLUE = 'blue'
+    WHITE = 'white'
+    RED = 'red'
+
+
+def parse_off_peak_hours(value: str) -> tuple[tuple[int, int], ...]:
+    """
+    Parse the off-peak hours of a contract like 'HC (22H30-6H30;12H30-14H30)'
+    :param value: the off-peak hours
+    :return: the windows as start and end minutes of the day, a window crossing midnight is split
+    """
+    result: list[tuple[int, int]] = []
+    for match in OFF_PEAK_HOURS_PATTERN.finditer(value or ''):
+        start: int = int(match.group(1)) * 60 + int(match.group(2))
+        end: int = int(match.group(3)) * 60 + int(match.group(4))
+        if start < end:
+            result.append((start, end))
+        elif start > end:
+            result.append((start, 24 * 60))
+            result.append((0, end))
+    return tuple(result)
+
+
+@dataclass(frozen=True, slots=True)
+class TariffDefinition:
+    """
+    The definition of a tariff, prices are by kWh.
+    For the Tempo option, the prices are given by color and the colors by day, the days without color use the blue prices.
+    """
+    option: TariffOptionEnum = TariffOptionEnum.BASE
+    base_price: float = 0.0
+    peak_price: float = 0.0
+    off_peak_price: float = 0.0
+    off_peak_windows: tuple[tuple[int, int], ...] = ()
+    tempo_prices: dict[TempoColorEnum, tuple[float, float]] = field(default_factory=dict)
+    tempo_days: dict[date, TempoColorEnum] = field(default_factory=dict)
+
+
+class TariffEngine:
+    """
+    Compute the costs of a load curve given as timestamps (local time as seconds since the epoch, see history_store) and values in Wh.
+    The price of each interval is looked up in a table of 48 half-hour slots by day, using NumPy when available and C-level map operations otherwise, so there is no Python loop by interval.
+    """
+
+    def __init__(self, tariff: TariffDefinition):
+        """
+        Constructor
+        :param tariff: the tariff
+        """
+        self._tariff: TariffDefinition = tariff
+        windows: tuple[tuple[int, int], ...] = tariff.off_peak_windows
+        if tariff.option == TariffOptionEnum.TEMPO and not windows:
+            windows = parse_off_peak_hours(DEFAULT_TEMPO_OFF_PEAK_HOURS)
+        # 1 for the off-peak slots, 0 otherwise
+        self._off_peak_slots: list[int] = [int(any(s <= slot * 30 < e for s, e in windows)) for slot in range(SLOTS_PER_DAY)]
+        # start of the days of the tariff after midnight
+        self._offset: int = TEMPO_DAY_OFFSET if tariff.option == TariffOptionEnum.TEMPO else 0
+
+    def get_tariff(self) -> TariffDefinition:
+        """
+        Return the tariff
+        :return: the tariff
+        """
+        return self._tariff
+
+    def _slot_prices(self, color: TempoColorEnum = None) -> list[float]:
+        """
+        Return the price of each slot of a day of the tariff, the first slot being at the start of the day of the tariff
+        :param color: the Tempo color of the day
+        :return: the prices
+        """
+        tariff: TariffDefinition = self._tariff
+        if tariff.option == TariffOptionEnum.BASE:
+            return [tariff.base_price] * SLOTS_PER_DAY
+        peak, off_peak = tariff.peak_price, tariff.off_peak_price
+        if tariff.option == TariffOptionEnum.TEMPO:
+            peak, off_peak = tariff.tempo_prices.get(color or TempoColorEnum.BLUE, (peak, off_peak))
+        shift: int = self._offset // SLOT_SECONDS
+        return [off_peak if s else peak for s in self._off_peak_slots[shift:] + self._off_peak_slots[:shift]]
+
+    def _price_table(self, first_day: int, last_day: int) -> list[float]:
+        """
+        Return the prices of all the slots of a range of days, one row of 48 slots by day
+        :param first_day: the index of the first day since the epoch
+        :param last_day: the index of the last day since the epoch (inclusive)
+        :return: the flat table of prices
+        """
+        if self._tariff.option != TariffOptionEnum.TEMPO:
+            return self._slot_prices() * (last_day - first_day + 1)
+        result: list[float] = []
+        colors: dict[date, TempoColorEnum] = self._tariff.tempo_days
+        for day in range(first_day, last_day + 1):
+            result.extend(self._slot_prices(colors.get(EPOCH_DATE + timedelta(days=day))))
+        return result
+
+    def interval_costs(self, timestamps: Sequence[int], values: Sequence[int]) -> Sequence[float]:
+        """
+        Return the cost of each interval
+        :param timestamps: the timestamps
+        :param values: the values in Wh
+        :return: the costs
+        """
+        if len(timestamps) == 0:
+            return []
+        first_day: int = int(timestamps[0] - self._offset) // SECONDS_PER_DAY
+        last_day: int = int(timestamps[-1] - self._offset) // SECONDS_PER_DAY
+        base: int = first_day * SECONDS_PER_DAY + self._offset
+        table: list[float] = self._price_table(first_day, last_day)
+        np = get_numpy()
+        if np is not None:
+            indexes = (np.asarray(timestamps, dtype=np.int64) - base) // SLOT_SECONDS
+            return np.asarray(values, dtype=np.float64) * np.asarray(table, dtype=np.float64)[indexes] / 1000
+        # index of the slot in the table: number of half hours since the start of the first day
+        # without NumPy, the chained maps of the operators keep the loop over the readings out of the interpreter
+        # pylint: disable=bad-builtin
+        indexes: map = map(operator.floordiv, map(operator.sub, timestamps, repeat(base)), repeat(SLOT_SECONDS))
+        return array('d', map(operator.truediv, map(operator.mul, values, map(table.__getitem__, indexes)), repeat(1000)))
+
+    def total_cost(self, timestamps: Sequence[int], values: Sequence[int]) -> float:
+        """
+        Return the cost of all the intervals
+        :param timestamps: the timestamps
+        :param values: the values in Wh
+        :return: the cost
+        """
+        if len(timestamps) == 0:
+            return 0.0
+        costs: Sequence[float] = self.interval_costs(timestamps, values)
+        if get_numpy() is not None:
+            return float(costs.sum())
+        return math.fsum(costs)
+
+    def energy_split(self, timestamps: Sequence[int], values: Sequence[int]) -> tuple[int, int]:
+        """
+        Return the energy consumed during the peak and the off-peak hours
+        :param timestamps: the timestamps
+        :param values: the values in Wh
+        :return: the peak and off-peak energy in Wh
+        """
+        if len(timestamps) == 0:
+            return 0, 0
+        np = get_numpy()
+        if np is not None:
+            ts = np.asarray(timestamps, dtype=np.int64)
+            mask = np.asarray(self._off_peak_slots, dtype=np.int64)[(ts % SECONDS_PER_DAY) // SLOT_SECONDS]
+            vs = np.asarray(values, dtype=np.int64)
+            off_peak = int((vs * mask).sum())
+            return int(vs.sum()) - off_peak, off_peak
+        # pylint: disable=bad-builtin
+        slots: map = map(operator.floordiv, map(operator.mod, timestamps, repeat(SECONDS_PER_DAY)), repeat(SLOT_SECONDS))
+        off_peak = sum(map(operator.mul, values, map(self._off_peak_slots.__getitem__, slots)))
+        return sum(values) - off_peak, off_peak
+
+    def daily_costs(self, timestamps: Sequence[int], values: Sequence[int]) -> list[tuple[date, float]]:
+        """
+        Return the cost of each day
+        :param timestamps: the timestamps
+        :param values: the values in Wh
+        :return: the days and their costs
+        """
+        if len(timestamps) == 0:
+            return []
+        costs: Sequence[float] = self.interval_costs(timestamps, values)
+        first_day: int = timestamps[0] // SECONDS_PER_DAY
+        np = get_numpy()
+        if np is not None:
+            days = np.asarray(timestamps, dtype=np.int64) // SECONDS_PER_DAY - first_day
+            sums = np.bincount(days, weights=costs)
+            present = np.bincount(days)
+            return [(EPOCH_DATE + timedelta(days=first_day + int(i)), float(sums[i])) for i in np.nonzero(present)[0]]
+        result: list[tuple[date, float]] = []
+        last_day: int = timestamps[-1] // SECONDS_PER_DAY
+        start: int = 0
+        for day in range(first_day, last_day + 1):
+            end: int = bisect_left(timestamps, (day + 1) * SECONDS_PER_DAY, start)
+            if end > start:
+                result.append((EPOCH_DATE + timedelta(days=day), sum(costs[start:end])))
+            start = end
+        return result
+
+    def monthly_costs(self, timestamps: Sequence[int], values: Sequence[int]) -> list[tuple[str, float]]:
+        """
+        Return the cost of each month
+        :param timestamps: the timestamps
+        :param values: the values in Wh
+        :return: the months (YYYY-MM) and their costs
+        """
+        result: dict[str, float] = {}
+        for day, cost in self.daily_costs(timestamps, values):
+            key: str = day.strftime('%Y-%m')
+            result[key] = result.get(key, 0.0) + cost
+        return list(result.items())
@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The manager of the OAuth2 access tokens shared by all the clients
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from functools import partial
+from typing import Any
+
+import aiohttp
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, Event, CALLBACK_TYPE
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import ENDPOINT_TOKEN_URL, DOMAIN, RequestPriorityEnum
+from .exceptions import CannotConnect, InvalidClientSecret
+from .rate_limiter import get_rate_limiter
+from .single_flight import SingleFlight
+
+_LOGGER = logging.getLogger(__name__)
+DATA_TOKEN_MANAGER: str = DOMAIN + "_token_manager"
+ACCESS_TOKEN_FIELD: str = 'access_token'
+EXPIRES_IN_FIELD: str = 'expires_in'
+# the token is considered as expired this number of seconds before its real expiration
+TOKEN_EXPIRATION_MARGIN: int = 60
+# the token is refreshed in background this number of seconds before it is considered as expired
+TOKEN_REFRESH_MARGIN: int = 120
+
+
+class _CachedToken:
+    """
+    An access token and its expiration
+    """
+    __slots__ = ('access_token', 'expiration', 'used')
+
+    def __init__(self, access_token: str, expiration: float):
+        """
+        Constructor
+        :param access_token: the access token
+        :param expiration: the monotonic time of the expiration
+        """
+        self.access_token: str = access_token
+        self.expiration: float = expiration
+        self.used: bool = False
+
+    def is_valid(self) -> bool:
+        """
+        Return true if the token can still be used
+        :return: true if the token is valid
+        """
+        return time.monotonic() < self.expiration
+
+
+class EnedisTokenManager:
+    """
+    Cache the access tokens by credentials.
+    Concurrent requests for the same credentials share a single call to the token endpoint, and the tokens which are in use are refreshed in background before their expiration.
+    The manager is stored in the Home Assistant data, outside the data of the entries, so it survives the reloads of the entries.
+    """
+
+    def __init__(self, hass: HomeAssistant, session: aiohttp.ClientSession = None):
+        """
+        Constructor
+        :param hass: the Home Assistant instance
+        :param session: the HTTP session calling the token endpoint, the shared session of Home Assistant by default
+        """
+        self._hass: HomeAssistant = hass
+        self._session: aiohttp.ClientSession = session
+        self._tokens: dict[str, _CachedToken] = {}
+        self._single_flight: SingleFlight = SingleFlight()
+        self._timers: dict[str, CALLBACK_TYPE] = {}
+        self._secrets: dict[str, tuple[str, str]] = {}
+        self._fetch_count: int = 0
+
+    @staticmethod
+    def _build_key(client_id: str, client_secret: str) -> str:
+        """
+        Build the key of the cache, the secret is hashed to avoid keeping it as a key
+        :param client_id: the client identifier
+        :param client_secret: the client secret
+        :return: the key
+        """
+        return client_id + ':' + hashlib.sha256(client_secret.encode('utf-8')).hexdigest()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the HTTP session calling the token endpoint
+        :return: the session
+        """
+        if self._session is None:
+            return async_get_clientsession(self._hass)
+        return self._session
+
+    def get_fetch_count(self) -> int:
+        """
+        Return the number of calls made to the token endpoint
+        :return: the number of calls
+        """
+        return self._fetch_count
+
+    async def async_get_token(self, client_id: str, client_secret: str, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> str:
+        """
+        Return a valid access token for the given credentials
+        :param client_id: the client identifier
+        :param client_secret: the client secret
+        :param priority: the priority of the call to the token endpoint if a new token is needed
+        :return: the access token
+        """
+        key: str = self._build_key(client_id, client_secret)
+        token: _CachedToken = self._tokens.get(key)
+        if token is not None and token.is_valid():
+            token.used = True
+            return token.access_token
+        self._secrets[key] = (client_id, client_secret)
+        token = await self._async_acquire(key, priority)
+        token.used = True
+        return token.access_token
+
+    def invalidate(self, client_id: str, client_secret: str, access_token: str) -> None:
+        """
+        Invalidate the token when it has been rejected by the API
+        :param client_id: the client identifier
+        :param client_secret: the client secret
+        :param access_token: the rejected access token
+        """
+        key: str = self._build_key(client_id, client_secret)
+        token: _CachedToken = self._tokens.get(key)
+        if token is not None and token.access_token == access_token:
+            _LOGGER.debug("Access token of %s invalidated", client_id)
+            self._tokens.pop(key)
+
+    async def _async_acquire(self, key: str, priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> _CachedToken:
+        """
+        Fetch a token, concurrent callers for the same key wait for the same call.
+        A cancelled caller only stops waiting, the others still receive the token.
+        :param key: the key of the credentials
+        :param priority: the priority of the call
+        :return: the token
+        """
+        return await self._single_flight.async_run(key, partial(self._async_fetch_and_store, key, priority))
+
+    async def _async_fetch_and_store(self, key: str, priority: RequestPriorityEnum) -> _CachedToken:
+        """
+        Fetch a token and cache it
+        :param key: the key of the credentials
+        :param priority: the priority of the call
+        :return: the token
+        """
+        token: _CachedToken = await self._async_fetch(key, priority)
+        self._tokens[key] = token
+        self._schedule_refresh(key, token)
+        return token
+
+    async def _async_fetch(self, key: str, priority: RequestPriorityEnum) -> _CachedToken:
+        """
+        Call the token endpoint, the call counts in the quota of the application
+        :param key: the key of the credentials
+        :param priority: the priority of the call
+        :return: the token
+        """
+        client_id, client_secret = self._secrets[key]
+        await get_rate_limiter(self._hass, client_id).async_acquire(priority)
+        _LOGGER.debug("Requesting an access token for %s", client_id)
+        payload: dict[str, str] = {
+            'grant_type': 'client_credentials',
+            'client_id': client_id,
+            'client_secret': client_secret
+        }
+        self._fetch_count += 1
+        try:
+            async with self._get_session().post(ENDPOINT_TOKEN_URL + 'token', data=payload) as response:
+                if response.status in {400, 401}:
+                    raise InvalidClientSecret(f"Authentication rejected: {response.status}")
+                response.raise_for_status()
+                data: dict[str, Any] = await response.json()
+        except aiohttp.ClientError as e:
+            raise CannotConnect(str(e)) from e
+        except ValueError as e:
+            raise CannotConnect(f"Invalid response of the token endpoint: {e}") from e
+        if not isinstance(data, dict) or not data.get(ACCESS_TOKEN_FIELD):
+            raise CannotConnect("No access token in the response of the token endpoint")
+        return _CachedToken(data[ACCESS_TOKEN_FIELD], time.monotonic() + int(data.get(EXPIRES_IN_FIELD, 0)) - TOKEN_EXPIRATION_MARGIN)
+
+    def _schedule_refresh(self, key: str, token: _CachedToken) -> None:
+        """
+        Schedule the refresh of the token before its expiration
+        :param key: the key of the credentials
+        :param token: the token
+        """
+        cancel: CALLBACK_TYPE = self._timers.pop(key, None)
+        if cancel:
+            cancel()
+        delay: float = token.expiration - time.monotonic() - TOKEN_REFRESH_MARGIN
+        if delay <= 0:
+            return
+        handle: asyncio.TimerHandle = self._hass.loop.call_later(delay, self._refresh, key, token)
+        self._timers[key] = handle.cancel
+
+    def _refresh(self, key: str, token: _CachedToken) -> None:
+        """
+        Refresh the token in background if it has been used since it was issued, otherwise forget it
+        :param key: the key of the credentials
+        :param token: the token which is about to expire
+        """
+        self._timers.pop(key, None)
+        if not token.used or self._tokens.get(key) is not token:
+            _LOGGER.debug("Access token not used, no refresh")
+            return
+        self._hass.async_create_background_task(self._async_refresh(key), name=f"{DOMAIN} token refresh")
+
+    async def _async_refresh(self, key: str) -> None:
+        """
+        Refresh the token
+        :param key: the key of the credentials
+        """
+        # noinspection PyBroadException
+        try:
+            await self._async_acquire(key)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.warning("Cannot refresh the access token in background, it will be requested on the next call")
+
+    async def async_shutdown(self, *_) -> None:
+        """
+        Cancel the scheduled refreshes and the calls in progress
+        """
+        for cancel in self._timers.values():
+            cancel()
+        self._timers.clear()
+        self._single_flight.cancel()
+
+
+def get_token_manager(hass: HomeAssistant) -> EnedisTokenManager:
+    """
+    Return the token manager of the Home Assistant instance, creating it if needed
+    :param hass: the Home Assistant instance
+    :return: the manager
+    """
+    manager: EnedisTokenManager = hass.data.get(DATA_TOKEN_MANAGER)
+    if manager is None:
+        manager = EnedisTokenManager(hass)
+        hass.data[DATA_TOKEN_MANAGER] = manager
+
+        async def _async_shutdown(event: Event) -> None:
+            """
+            Listen to the stop event
+            :param event: the event
+            """
+            await manager.async_shutdown()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_shutdown)
+    return manager
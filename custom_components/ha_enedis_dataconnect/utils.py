@@ -3,6 +3,8 @@
 """
 The utilities of the custom component
 """
+import functools
+from typing import Any
 
 
 class Singleton(type):
@@ -21,3 +23,16 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+@functools.cache
+def get_numpy() -> Any:
+    """
+    Return NumPy, imported on the first call and preloaded in an executor by async_setup, so importing the component does not load it
+    :return: the module or None if NumPy is not installed
+    """
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+        return numpy
+    except ImportError:
+        return None
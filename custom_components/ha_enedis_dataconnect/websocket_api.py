@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+# -*- coding: utf-8-
+"""
+The websocket commands of the custom component, serving the series of the local history on demand
+"""
+import logging
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+
+from .const import PDL_KEY, SERIES_KEY, START_DATE_KEY, END_DATE_KEY, WEBSOCKET_HISTORY_COMMAND, EnedisSeriesEnum
+from .coordinators import EnedisDataUpdateCoordinator
+from .services import build_series_response, get_coordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@websocket_api.websocket_command({
+    vol.Required('type'): WEBSOCKET_HISTORY_COMMAND,
+    vol.Required(PDL_KEY): cv.string,
+    vol.Required(SERIES_KEY): vol.In([e.value for e in EnedisSeriesEnum]),
+    vol.Required(START_DATE_KEY): cv.date,
+    vol.Optional(END_DATE_KEY): cv.date
+})
+@callback
+def websocket_get_history(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]) -> None:
+    """
+    Send a series of the local history, read from the mapped files and the indexes without I/O
+    :param hass: the Home Assistant instance
+    :param connection: the websocket connection
+    :param msg: the message
+    """
+    try:
+        coordinator: EnedisDataUpdateCoordinator = get_coordinator(hass, msg[PDL_KEY])
+    except ServiceValidationError as e:
+        connection.send_error(msg['id'], websocket_api.ERR_NOT_FOUND, str(e))
+        return
+    try:
+        result: dict[str, Any] = build_series_response(coordinator, msg[SERIES_KEY], msg[START_DATE_KEY], msg.get(END_DATE_KEY))
+    except ServiceValidationError as e:
+        connection.send_error(msg['id'], websocket_api.ERR_INVALID_FORMAT, str(e))
+        return
+    connection.send_result(msg['id'], result)
+
+
+@callback
+def async_setup_websocket_api(hass: HomeAssistant) -> None:
+    """
+    Register the websocket commands
+    :param hass: the Home Assistant instance
+    """
+    websocket_api.async_register_command(hass, websocket_get_history)
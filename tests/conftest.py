@@ -0,0 +1,122 @@
+"""
+The fixtures shared by the tests
+"""
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.ha_enedis_dataconnect import long_term_statistics
+from custom_components.ha_enedis_dataconnect.const import CLIENT_ID_KEY, CLIENT_SECRET_KEY, COORDINATORS_KEY, CONSUMPTION_LOAD_CURVE_PATH, CONTRACTS_PATH, DAILY_CONSUMPTION_MAX_POWER_PATH, DOMAIN, PDL_KEY, RequestPriorityEnum
+from custom_components.ha_enedis_dataconnect.coordinators import EnedisDataUpdateCoordinator
+from custom_components.ha_enedis_dataconnect.enedis_client import START_PARAM, END_PARAM
+from custom_components.ha_enedis_dataconnect.history_store import to_timestamp
+from custom_components.ha_enedis_dataconnect.metrics import EnedisMetrics
+from custom_components.ha_enedis_dataconnect.models import HALF_HOUR_SECONDS, MeterReadings
+
+PDL: str = '12345678901234'
+
+
+class FakeApiClient:
+    """
+    A client serving deterministic readings for the requested periods, the data of the current day being never available
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.requests: list[str] = []
+        # the errors raised by path
+        self.errors: dict[str, Exception] = {}
+        # the daily maximum power in VA
+        self.max_power: int = 4000
+        self._metrics: EnedisMetrics = EnedisMetrics()
+
+    def get_metrics(self) -> EnedisMetrics:
+        """
+        Return the metrics
+        :return: the metrics
+        """
+        return self._metrics
+
+    def _check(self, path: str) -> None:
+        """
+        Record the request and raise the error of the path
+        :param path: the path
+        """
+        self.requests.append(path)
+        if path in self.errors:
+            raise self.errors[path]
+
+    async def request_readings(self, path: str, params: dict[str, str], priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED, load_curve: bool = False) -> MeterReadings:
+        """
+        Return the readings of the period
+        """
+        self._check(path)
+        start: int = to_timestamp(datetime.strptime(params[START_PARAM], '%Y-%m-%d'))
+        end: int = min(to_timestamp(datetime.strptime(params[END_PARAM], '%Y-%m-%d')), to_timestamp(datetime.combine(datetime.now().date(), datetime.min.time())))
+        step: int = HALF_HOUR_SECONDS if path == CONSUMPTION_LOAD_CURVE_PATH else 86400
+        timestamps: array = array('q', range(start, end, step))
+        return MeterReadings(timestamps, array('i', [t // step % 1000 for t in timestamps]))
+
+    async def request(self, path: str, params: dict[str, str], priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED) -> dict[str, Any]:
+        """
+        Return the daily maximum power or the contract
+        """
+        self._check(path)
+        if path == CONTRACTS_PATH:
+            return {'customer': {'usage_points': [{'usage_point': {'usage_point_id': PDL}, 'contracts': {'subscribed_power': '9 kVA', 'offpeak_hours': 'HC (22H00-6H00)'}}]}}
+        assert path == DAILY_CONSUMPTION_MAX_POWER_PATH
+        day: datetime = datetime.strptime(params[START_PARAM], '%Y-%m-%d')
+        readings: list[dict[str, str]] = []
+        while day.strftime('%Y-%m-%d') < min(params[END_PARAM], datetime.now().strftime('%Y-%m-%d')):
+            readings.append({'date': (day + timedelta(hours=19)).strftime('%Y-%m-%d %H:%M:%S'), 'value': str(self.max_power)})
+            day += timedelta(days=1)
+        return {'meter_reading': {'interval_reading': readings}}
+
+
+@pytest.fixture
+def statistics(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, list]]:
+    """
+    Record the statistics sent to the recorder
+    """
+    result: list[tuple[str, list]] = []
+    monkeypatch.setattr(long_term_statistics, 'async_add_external_statistics', lambda hass, metadata, data: result.append((metadata['statistic_id'], data)))
+    return result
+
+
+@pytest.fixture
+def api_client() -> FakeApiClient:
+    """
+    Return the client serving the readings
+    """
+    return FakeApiClient()
+
+
+@pytest.fixture
+async def coordinator(hass: HomeAssistant, tmp_path: Path, api_client: FakeApiClient, statistics: list) -> EnedisDataUpdateCoordinator:
+    """
+    Return a coordinator of all the sensors, its local history being written in a temporary directory
+    """
+    hass.config.config_dir = str(tmp_path)
+    entry: MockConfigEntry = MockConfigEntry(domain=DOMAIN, data={CLIENT_ID_KEY: 'client', CLIENT_SECRET_KEY: 'secret', PDL_KEY: PDL})
+    entry.add_to_hass(hass)
+    result: EnedisDataUpdateCoordinator = EnedisDataUpdateCoordinator(hass, entry, api_client, PDL)
+    await result.async_setup()
+    yield result
+    await result.async_shutdown()
+
+
+@pytest.fixture
+async def registered_coordinator(hass: HomeAssistant, coordinator: EnedisDataUpdateCoordinator) -> EnedisDataUpdateCoordinator:
+    """
+    Return the coordinator after a refresh, registered in the data of its entry as by the setup of the entry
+    """
+    await coordinator.async_refresh()
+    hass.data.setdefault(DOMAIN, {})[coordinator.config_entry.entry_id] = {COORDINATORS_KEY: {PDL: coordinator}}
+    return coordinator
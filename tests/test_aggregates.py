@@ -0,0 +1,79 @@
+"""
+Tests of the prefix sums of the series
+"""
+from array import array
+
+from custom_components.ha_enedis_dataconnect.aggregates import PrefixIndex
+
+HOUR: int = 3600
+HALF_HOUR: int = 1800
+
+
+def _series(values: list[int], start: int = 0, step: int = HALF_HOUR) -> tuple[array, array]:
+    """
+    Build a series at a regular interval
+    :param values: the values
+    :param start: the first timestamp
+    :param step: the interval in seconds
+    :return: the timestamps and the values
+    """
+    return array('q', [start + i * step for i in range(len(values))]), array('i', values)
+
+
+def test_sums_of_the_windows() -> None:
+    """
+    The sums of the windows are the sums of the readings of their periods, a period without reading being empty
+    """
+    index: PrefixIndex = PrefixIndex(HOUR)
+    timestamps, values = _series([1, 2, 3, 4, 5, 6], start=10 * HOUR)
+    # a gap of one hour
+    timestamps.extend([15 * HOUR, 15 * HOUR + HALF_HOUR])
+    values.extend([7, 8])
+    index.update(timestamps, values)
+    assert len(index) == 6
+    assert index.get_sum(10 * HOUR, 11 * HOUR) == 3
+    assert index.get_sum(0, 100 * HOUR) == 36
+    assert index.get_sum(11 * HOUR, 13 * HOUR) == 18
+    # the bounds are rounded up to a period
+    assert index.get_sum(10 * HOUR + 1, 12 * HOUR) == 7
+    assert index.get_count(10 * HOUR, 16 * HOUR) == 8
+    assert index.get_total(13 * HOUR, 15 * HOUR) is None
+    assert index.get_total(13 * HOUR, 16 * HOUR) == 15
+    assert index.get_buckets(12 * HOUR) == [(12 * HOUR, 11), (15 * HOUR, 15)]
+
+
+def test_incremental_update_matches_a_rebuild() -> None:
+    """
+    An update from the oldest reading written gives the sums of a rebuilt index
+    """
+    index: PrefixIndex = PrefixIndex(HOUR)
+    timestamps, values = _series(list(range(48)))
+    index.update(timestamps, values)
+    # a reading is changed and readings are appended
+    values[40] = 1000
+    more_timestamps, more_values = _series(list(range(10)), start=48 * HALF_HOUR)
+    timestamps.extend(more_timestamps)
+    values.extend(more_values)
+    index.update(timestamps, values, since=40 * HALF_HOUR)
+    rebuilt: PrefixIndex = PrefixIndex(HOUR)
+    rebuilt.update(timestamps, values)
+    assert len(index) == len(rebuilt) == 29
+    assert index.get_buckets(0) == rebuilt.get_buckets(0)
+    assert index.get_sum(0, 29 * HOUR) == sum(values)
+    # readings older than the first period rebuild the index
+    older_timestamps, older_values = _series([5, 5], start=-HOUR)
+    index.update(older_timestamps + timestamps, older_values + values, since=-HOUR)
+    assert index.get_sum(-HOUR, 29 * HOUR) == sum(values) + 10
+
+
+def test_empty_index() -> None:
+    """
+    An empty index has no sum
+    """
+    index: PrefixIndex = PrefixIndex(HOUR)
+    assert index.get_sum(0, HOUR) == 0
+    assert index.get_total(0, HOUR) is None
+    assert not index.get_buckets(0)
+    index.update(*_series([1, 2]))
+    index.update(array('q'), array('i'))
+    assert len(index) == 0
@@ -0,0 +1,158 @@
+"""
+Tests of the backfill of the history
+"""
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect import backfill
+from custom_components.ha_enedis_dataconnect.backfill import CHUNKS_KEY, DAILY_READINGS_KEY, FAILED_CHUNKS_KEY, LOAD_CURVE_READINGS_KEY, EnedisBackfill, split_range
+from custom_components.ha_enedis_dataconnect.const import BACKFILL_MAX_ATTEMPTS, RequestPriorityEnum
+from custom_components.ha_enedis_dataconnect.exceptions import CannotConnect, InvalidPdl, QuotaExceeded
+from custom_components.ha_enedis_dataconnect.history_store import to_timestamp
+from custom_components.ha_enedis_dataconnect.models import MeterReadings
+
+START: date = date(2024, 1, 1)
+
+
+class _Helper:
+    """
+    A helper returning one reading by day of the requested chunks, the errors of a chunk being raised before its readings
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.requests: list[tuple[str, date]] = []
+        # the errors raised by the successive requests of a chunk, by dataset and start date
+        self.errors: dict[tuple[str, date], list[Exception]] = {}
+
+    async def _async_fetch(self, dataset: str, start: date, end: date, priority: RequestPriorityEnum) -> MeterReadings:
+        """
+        Record the request and return the readings of the chunk
+        """
+        assert priority == RequestPriorityEnum.BACKFILL
+        self.requests.append((dataset, start))
+        errors: list[Exception] = self.errors.get((dataset, start), [])
+        if errors:
+            raise errors.pop(0)
+        days: int = (end - start).days
+        return MeterReadings(array('q', [to_timestamp(datetime.combine(start + timedelta(days=d), datetime.min.time())) for d in range(days)]), array('i', [100] * days))
+
+    async def get_daily_consumption(self, start: date, end: date, priority: RequestPriorityEnum) -> MeterReadings:
+        """
+        Return the daily consumption
+        """
+        return await self._async_fetch(backfill.DAILY_DATASET, start, end, priority)
+
+    async def get_consumption_load_curve(self, start: date, end: date, priority: RequestPriorityEnum) -> MeterReadings:
+        """
+        Return the load curve
+        """
+        return await self._async_fetch(backfill.LOAD_CURVE_DATASET, start, end, priority)
+
+
+class _HistoryStore:
+    """
+    A local history recording its writes
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.writes: list[tuple[int, int]] = []
+        self._daily: int = 0
+        self._load_curve: int = 0
+
+    async def async_merge(self, daily: MeterReadings, load_curve: MeterReadings) -> None:
+        """
+        Record the write
+        """
+        self.writes.append((len(daily), len(load_curve)))
+        self._daily += len(daily)
+        self._load_curve += len(load_curve)
+
+    def get_daily(self) -> list:
+        """
+        Return the daily readings
+        """
+        return [None] * self._daily
+
+    def get_load_curve(self) -> list:
+        """
+        Return the readings of the load curve
+        """
+        return [None] * self._load_curve
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Retry the chunks without delay
+    """
+    monkeypatch.setattr(backfill, 'backoff_delay', lambda *_: 0.0)
+
+
+def test_split_range_in_chunks() -> None:
+    """
+    The chunks cover the range without overlap, the last one being shorter
+    """
+    start: date = date(2024, 1, 1)
+    chunks: list[tuple[date, date]] = split_range(start, start + timedelta(days=17), 7)
+    assert chunks == [
+        (start, start + timedelta(days=7)),
+        (start + timedelta(days=7), start + timedelta(days=14)),
+        (start + timedelta(days=14), start + timedelta(days=17))
+    ]
+    assert split_range(start, start + timedelta(days=14), 7)[-1] == (start + timedelta(days=7), start + timedelta(days=14))
+    assert not split_range(start, start, 7)
+    assert not split_range(start, start - timedelta(days=1), 7)
+
+
+async def test_transient_errors_are_retried() -> None:
+    """
+    A chunk failing because the API cannot be reached is fetched again, after the delay requested when the quota is exceeded
+    """
+    helper: _Helper = _Helper()
+    helper.errors[backfill.LOAD_CURVE_DATASET, START + timedelta(days=7)] = [CannotConnect('network'), QuotaExceeded('load curve', 0.2)]
+    store: _HistoryStore = _HistoryStore()
+    started: float = time.monotonic()
+    result: dict = await EnedisBackfill(helper, store, rate=0).async_run(START, START + timedelta(days=14))
+    assert time.monotonic() - started >= 0.2
+    assert result[FAILED_CHUNKS_KEY] == []
+    assert helper.requests.count((backfill.LOAD_CURVE_DATASET, START + timedelta(days=7))) == 3
+    assert result[DAILY_READINGS_KEY] == result[LOAD_CURVE_READINGS_KEY] == 14
+
+
+async def test_failed_chunks_are_reported() -> None:
+    """
+    A chunk rejected by the API is not retried, a chunk failing at each attempt is reported, the other chunks are written
+    """
+    helper: _Helper = _Helper()
+    helper.errors[backfill.DAILY_DATASET, START] = [InvalidPdl('rejected')]
+    helper.errors[backfill.LOAD_CURVE_DATASET, START + timedelta(days=7)] = [CannotConnect('network')] * BACKFILL_MAX_ATTEMPTS
+    store: _HistoryStore = _HistoryStore()
+    result: dict = await EnedisBackfill(helper, store, rate=0).async_run(START, START + timedelta(days=14))
+    assert result[CHUNKS_KEY] == 3
+    assert result[FAILED_CHUNKS_KEY] == [f"{backfill.DAILY_DATASET} 2024-01-01 2024-01-15", f"{backfill.LOAD_CURVE_DATASET} 2024-01-08 2024-01-15"]
+    assert helper.requests.count((backfill.DAILY_DATASET, START)) == 1
+    assert helper.requests.count((backfill.LOAD_CURVE_DATASET, START + timedelta(days=7))) == BACKFILL_MAX_ATTEMPTS
+    assert result[DAILY_READINGS_KEY] == 0
+    assert result[LOAD_CURVE_READINGS_KEY] == 7
+
+
+async def test_readings_are_flushed_by_groups_of_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The readings are written each time enough chunks are received and once at the end
+    """
+    monkeypatch.setattr(backfill, 'BACKFILL_FLUSH_CHUNKS', 2)
+    store: _HistoryStore = _HistoryStore()
+    result: dict = await EnedisBackfill(_Helper(), store, concurrency=1, rate=0).async_run(START, START + timedelta(days=21))
+    assert result[CHUNKS_KEY] == 4
+    assert len(store.writes) == 3
+    assert sum(w[0] for w in store.writes) == result[DAILY_READINGS_KEY] == 21
+    assert sum(w[1] for w in store.writes) == result[LOAD_CURVE_READINGS_KEY] == 21
@@ -0,0 +1,26 @@
+"""
+Tests of the configuration and options flows
+"""
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import FlowResultType
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.ha_enedis_dataconnect.config_flow import OptionsFlow
+from custom_components.ha_enedis_dataconnect.const import DATASETS_KEY, DEFAULT_DATASETS, DEFAULT_SENSORS, DOMAIN, PEAK_HOUR_COST_KEY, SENSORS_KEY, EnedisDatasetEnum, SensorTypeEnum
+
+
+async def test_options_select_the_sensors_and_the_datasets(hass: HomeAssistant) -> None:
+    """
+    The options flow shows the enabled sensors and datasets and replaces them, the other options being kept
+    """
+    entry: MockConfigEntry = MockConfigEntry(domain=DOMAIN, data={}, options={PEAK_HOUR_COST_KEY: 0.2})
+    entry.add_to_hass(hass)
+    flow: OptionsFlow = OptionsFlow(entry)
+    flow.hass = hass
+    result = await flow.async_step_init()
+    assert result['type'] == FlowResultType.FORM
+    defaults: dict = {str(k): k.default() for k in result['data_schema'].schema}
+    assert defaults == {SENSORS_KEY: list(DEFAULT_SENSORS), DATASETS_KEY: list(DEFAULT_DATASETS)}
+    result = await flow.async_step_init({SENSORS_KEY: [SensorTypeEnum.MAIN_SENSOR_TYPE], DATASETS_KEY: [EnedisDatasetEnum.MAX_POWER]})
+    assert result['type'] == FlowResultType.CREATE_ENTRY
+    assert result['data'] == {PEAK_HOUR_COST_KEY: 0.2, SENSORS_KEY: [SensorTypeEnum.MAIN_SENSOR_TYPE], DATASETS_KEY: [EnedisDatasetEnum.MAX_POWER]}
@@ -0,0 +1,280 @@
+"""
+Tests of the coordinator and of its entities
+"""
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.ha_enedis_dataconnect import coordinators
+from custom_components.ha_enedis_dataconnect.const import CONSUMPTION_LOAD_CURVE_PATH, CONTRACTS_PATH, DAILY_CONSUMPTION_MAX_POWER_PATH, DAILY_CONSUMPTION_PATH, SENSOR_TYPES, EnedisDatasetEnum, SensorTypeEnum
+from custom_components.ha_enedis_dataconnect.coordinators import EnedisDataUpdateCoordinator, EnedisConsumedEnergyCoordinatorEntity, LAST_UPDATE_ATTR, SENSOR_ENTITY_CLASSES, get_fetched_datasets
+from custom_components.ha_enedis_dataconnect.exceptions import CannotConnect
+from custom_components.ha_enedis_dataconnect.models import EnedisDataSnapshot
+from custom_components.ha_enedis_dataconnect.sensor import _add_entities
+
+
+async def test_unchanged_poll_changes_no_dataset(coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    A poll returning the data of the previous one changes neither the datasets nor the local history
+    """
+    # pylint: disable=protected-access
+    await coordinator._async_fetch_snapshot()
+    assert coordinator._changed
+    version: int = coordinator.get_history_store().get_version()
+    coordinator._changed = set()
+    await coordinator._async_fetch_snapshot()
+    assert coordinator._changed == set()
+    assert coordinator.get_history_store().get_version() == version
+
+
+async def test_unchanged_state_keeps_the_attributes(hass: HomeAssistant, coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    The time of the last update of an entity is the time of the last change of its state
+    """
+    # pylint: disable=protected-access
+    await coordinator.async_refresh()
+    entity: EnedisConsumedEnergyCoordinatorEntity = EnedisConsumedEnergyCoordinatorEntity(SENSOR_TYPES[SensorTypeEnum.CONSUMED_ENERGY_SENSOR_TYPE], coordinator)
+    entity.hass = hass
+    assert entity._refresh_state()
+    attributes: dict = entity.extra_state_attributes
+    assert LAST_UPDATE_ATTR in attributes
+    await coordinator.async_refresh()
+    assert not entity._refresh_state()
+    # the state is computed again but does not change
+    entity._fingerprint = None
+    assert not entity._refresh_state()
+    assert entity.extra_state_attributes is attributes
+
+
+async def test_failed_dataset_keeps_the_previous_one(coordinator: EnedisDataUpdateCoordinator, api_client, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    A dataset failing while the others are fetched is replaced by the previous one, the refresh fails when every dataset fails
+    """
+    # pylint: disable=protected-access
+    previous: EnedisDataSnapshot = await coordinator.async_update_data()
+    coordinator.data = previous
+    api_client.errors[DAILY_CONSUMPTION_PATH] = CannotConnect('daily')
+    snapshot: EnedisDataSnapshot = await coordinator._async_fetch_snapshot()
+    assert snapshot.daily_consumption is previous.daily_consumption
+    assert snapshot.max_power == previous.max_power
+    assert EnedisDatasetEnum.DAILY_CONSUMPTION not in coordinator._changed
+    api_client.errors[DAILY_CONSUMPTION_MAX_POWER_PATH] = CannotConnect('maximum power')
+    snapshot = await coordinator._async_fetch_snapshot()
+    assert snapshot.max_power is previous.max_power
+
+    async def _fail(*_) -> None:
+        """
+        Fail the fetch of the load curve
+        """
+        raise CannotConnect('load curve')
+
+    monkeypatch.setattr(coordinator._api_helper, 'get_consumption_load_curve_increment', _fail)
+    with pytest.raises(CannotConnect):
+        await coordinator._async_fetch_snapshot()
+
+
+async def test_failed_dataset_without_previous_data(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    Without previous snapshot, a failing dataset fails the refresh
+    """
+    # pylint: disable=protected-access
+    api_client.errors[CONSUMPTION_LOAD_CURVE_PATH] = CannotConnect('load curve')
+    with pytest.raises(CannotConnect):
+        await coordinator._async_fetch_snapshot()
+
+
+async def test_update_requests_are_coalesced(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    The update requests received during a refresh join it, the requests received while the data is younger than the minimum refresh age are skipped
+    """
+    # pylint: disable=protected-access
+    await asyncio.gather(*(coordinator.async_request_update() for _ in range(3)))
+    assert api_client.requests.count(DAILY_CONSUMPTION_PATH) == 1
+    assert coordinator.get_snapshot() is not None
+    await coordinator.async_request_update()
+    assert api_client.requests.count(DAILY_CONSUMPTION_PATH) == 1
+    coordinator._min_refresh_age = timedelta(0)
+    await coordinator.async_request_update()
+    assert api_client.requests.count(DAILY_CONSUMPTION_PATH) == 2
+
+
+async def test_kept_dataset_marks_the_data_as_stale(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    The data is stale while a dataset is served from the previous snapshot, so the update requests are not skipped
+    """
+    await coordinator.async_refresh()
+    assert coordinator.get_stale_since() is None
+    api_client.errors[DAILY_CONSUMPTION_PATH] = CannotConnect('daily')
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    stale_since = coordinator.get_stale_since()
+    assert stale_since is not None
+    count: int = api_client.requests.count(DAILY_CONSUMPTION_PATH)
+    await coordinator.async_request_update()
+    assert api_client.requests.count(DAILY_CONSUMPTION_PATH) == count + 1
+    assert coordinator.get_stale_since() == stale_since
+    del api_client.errors[DAILY_CONSUMPTION_PATH]
+    await coordinator.async_refresh()
+    assert coordinator.get_stale_since() is None
+
+
+def test_fetched_datasets_follow_the_sensors() -> None:
+    """
+    The datasets used by the enabled sensors are fetched with the ones selected by the options, the history needing the daily consumption and the load curve
+    """
+    assert get_fetched_datasets([SensorTypeEnum.CONSUMED_ENERGY_DETAILS_HOURS_SENSOR_TYPE], []) == {EnedisDatasetEnum.LOAD_CURVE}
+    assert get_fetched_datasets([SensorTypeEnum.CONSUMED_ENERGY_ROLLING_WEEK_SENSOR_TYPE], []) == {EnedisDatasetEnum.DAILY_CONSUMPTION, EnedisDatasetEnum.LOAD_CURVE}
+    assert get_fetched_datasets([SensorTypeEnum.DIAGNOSTIC_API_CALLS_SENSOR_TYPE], [EnedisDatasetEnum.MAX_POWER]) == {EnedisDatasetEnum.MAX_POWER}
+    assert get_fetched_datasets(['unknown'], []) == frozenset()
+
+
+async def test_entities_are_built_for_the_enabled_sensors(coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    An entity of the class of its type is built for each enabled sensor
+    """
+    # pylint: disable=protected-access
+    assert set(SENSOR_ENTITY_CLASSES) == set(SENSOR_TYPES)
+    entities: list = []
+    _add_entities(coordinator, entities)
+    assert [type(e) for e in entities] == [SENSOR_ENTITY_CLASSES[k] for k in SENSOR_TYPES]
+    coordinator._sensors = frozenset((SensorTypeEnum.MAIN_SENSOR_TYPE, SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE))
+    entities = []
+    _add_entities(coordinator, entities)
+    assert [type(e) for e in entities] == [SENSOR_ENTITY_CLASSES[SensorTypeEnum.MAIN_SENSOR_TYPE], SENSOR_ENTITY_CLASSES[SensorTypeEnum.CONSUMED_YESTERDAY_COST_SENSOR_TYPE]]
+
+
+def test_entities_log_with_the_name_of_their_class(coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    The records of an entity are logged by a child of the logger of the module named after its class
+    """
+    # pylint: disable=protected-access
+    entity: EnedisConsumedEnergyCoordinatorEntity = EnedisConsumedEnergyCoordinatorEntity(SENSOR_TYPES[SensorTypeEnum.CONSUMED_ENERGY_SENSOR_TYPE], coordinator)
+    assert entity._logger.name == 'custom_components.ha_enedis_dataconnect.coordinators.EnedisConsumedEnergyCoordinatorEntity'
+    assert coordinator._logger.name == 'custom_components.ha_enedis_dataconnect.coordinators.EnedisDataUpdateCoordinator'
+
+
+class _Listener:
+    """
+    A listener of the coordinator counting its notifications
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.count: int = 0
+
+    def __call__(self) -> None:
+        """
+        Count the notification
+        """
+        self.count += 1
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """
+    Replace the monotonic clock of the coordinator, the event loop keeping its own clock
+    """
+    result: SimpleNamespace = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(coordinators, 'time', SimpleNamespace(monotonic=lambda: result.now, perf_counter=lambda: result.now))
+    return result
+
+
+async def test_listeners_are_notified_of_their_datasets_only(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    A refresh changing only the maximum power notifies the entities of the maximum power only
+    """
+    await coordinator.async_refresh()
+    daily: _Listener = _Listener()
+    max_power: _Listener = _Listener()
+    coordinator.async_add_listener(daily, ((EnedisDatasetEnum.DAILY_CONSUMPTION,), 0))
+    coordinator.async_add_listener(max_power, ((EnedisDatasetEnum.MAX_POWER,), 0))
+    api_client.max_power = 5000
+    await coordinator.async_refresh()
+    assert (daily.count, max_power.count) == (0, 1)
+    await coordinator.async_refresh()
+    assert (daily.count, max_power.count) == (0, 1)
+
+
+async def test_changes_inside_the_delay_are_deferred(coordinator: EnedisDataUpdateCoordinator, clock: SimpleNamespace) -> None:
+    """
+    The changes received less than the delay of an entity after its notification are delivered once by the timer of the coordinator
+    """
+    # pylint: disable=protected-access
+    listener: _Listener = _Listener()
+    coordinator.async_add_listener(listener, ((EnedisDatasetEnum.MAX_POWER,), 60))
+    for _ in range(3):
+        coordinator._changed = {EnedisDatasetEnum.MAX_POWER}
+        coordinator.async_update_listeners()
+        clock.now += 1
+    assert listener.count == 1
+    assert coordinator._pending == {listener: 1060.0}
+    timer = coordinator._pending_timer
+    assert timer is not None
+    clock.now = 1060.0
+    timer.cancel()
+    coordinator._notify_pending()
+    assert listener.count == 2
+    assert coordinator._pending == {}
+    assert coordinator._pending_timer is None
+
+
+async def test_pending_notification_of_a_removed_entity_is_dropped(coordinator: EnedisDataUpdateCoordinator, clock: SimpleNamespace) -> None:
+    """
+    An entity removed while its notification is deferred is not notified
+    """
+    # pylint: disable=protected-access
+    listener: _Listener = _Listener()
+    remove = coordinator.async_add_listener(listener, ((EnedisDatasetEnum.MAX_POWER,), 60))
+    for _ in range(2):
+        coordinator._changed = {EnedisDatasetEnum.MAX_POWER}
+        coordinator.async_update_listeners()
+    assert listener in coordinator._pending
+    remove()
+    clock.now += 60
+    coordinator._pending_timer.cancel()
+    coordinator._notify_pending()
+    assert listener.count == 1
+    assert coordinator._pending == {}
+    assert listener not in coordinator._notified
+
+
+async def test_failure_and_day_change_notify_all_the_entities(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    All the entities are notified when a refresh fails or when the day changes, whatever their datasets
+    """
+    # pylint: disable=protected-access
+    await coordinator.async_refresh()
+    listeners: list[_Listener] = [_Listener(), _Listener()]
+    coordinator.async_add_listener(listeners[0], ((EnedisDatasetEnum.DAILY_CONSUMPTION,), 0))
+    coordinator.async_add_listener(listeners[1], ((EnedisDatasetEnum.CONTRACT,), 0))
+    for path in (DAILY_CONSUMPTION_PATH, CONSUMPTION_LOAD_CURVE_PATH, DAILY_CONSUMPTION_MAX_POWER_PATH):
+        api_client.errors[path] = CannotConnect(path)
+    await coordinator.async_refresh()
+    assert [listener.count for listener in listeners] == [1, 1]
+    api_client.errors.clear()
+    await coordinator.async_refresh()
+    assert [listener.count for listener in listeners] == [2, 2]
+    coordinator._dispatched_day = date.today() - timedelta(days=1)
+    coordinator._changed = set()
+    coordinator.async_update_listeners()
+    assert [listener.count for listener in listeners] == [3, 3]
+
+
+async def test_failed_contract_is_fetched_again(coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    A failed fetch of the contract does not fail the refresh, the contract is fetched again by the next refresh
+    """
+    api_client.errors[CONTRACTS_PATH] = CannotConnect('contract')
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert coordinator.get_snapshot().contract is None
+    del api_client.errors[CONTRACTS_PATH]
+    await coordinator.async_refresh()
+    assert coordinator.get_snapshot().contract is not None
+    await coordinator.async_refresh()
+    assert api_client.requests.count(CONTRACTS_PATH) == 2
@@ -0,0 +1,85 @@
+"""
+Tests of the diagnostics of a configuration entry and of the diagnostic sensors
+"""
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker, AiohttpClientMockResponse
+
+from custom_components.ha_enedis_dataconnect.const import CLIENT_ID_KEY, CLIENT_KEY, CLIENT_SECRET_KEY, CONTRACTS_PATH, DAILY_CONSUMPTION_PATH, DOMAIN, ENDPOINT_URL, PDL_KEY, SENSOR_TYPES, SensorTypeEnum
+from custom_components.ha_enedis_dataconnect.coordinators import COUNT_ATTR, EnedisDataUpdateCoordinator, EnedisDiagnosticCoordinatorEntity
+from custom_components.ha_enedis_dataconnect.diagnostics import async_get_config_entry_diagnostics
+from custom_components.ha_enedis_dataconnect.enedis_client import EnedisClient, END_PARAM, START_PARAM, USAGE_POINT_ID_PARAM
+from custom_components.ha_enedis_dataconnect.metrics import DECODE_HISTOGRAM, LATENCY_HISTOGRAM_PREFIX, REQUESTS_COUNTER, RETRIES_COUNTER, THROTTLED_COUNTER
+
+REDACTED: str = '**REDACTED**'
+
+
+@pytest.fixture
+async def client(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker, monkeypatch: pytest.MonkeyPatch) -> EnedisClient:
+    """
+    Return a client sending its requests to the mock, with a fixed access token
+    """
+    result: EnedisClient = EnedisClient(hass, 'client', 'secret', 'https://localhost')
+    session = aioclient_mock.create_session(hass.loop)
+
+    async def _async_get_token(*_) -> str:
+        """
+        Return the access token
+        """
+        return 'token'
+
+    monkeypatch.setattr(result, '_get_session', lambda: session)
+    monkeypatch.setattr(result, '_async_get_token', _async_get_token)
+    yield result
+    await session.close()
+
+
+async def test_diagnostics_give_the_metrics_without_the_credentials(hass: HomeAssistant, client: EnedisClient, aioclient_mock: AiohttpClientMocker, registered_coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    The diagnostics give the latency by endpoint, the retries, the throttled responses and the decoding of the client and the metrics of the refreshes, the credentials being redacted
+    """
+    statuses: list[int] = [429, 500, 200]
+
+    async def _side_effect(method, url, _data):
+        """
+        Return the next response
+        """
+        return AiohttpClientMockResponse(method, url, status=statuses.pop(0), json={}, headers={'Retry-After': '0'})
+
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_side_effect)
+    aioclient_mock.get(ENDPOINT_URL + DAILY_CONSUMPTION_PATH, json={'meter_reading': {'interval_reading': [{'date': '2024-03-01', 'value': '1000'}]}}, headers={'Content-Type': 'application/json'})
+    pdl: str = registered_coordinator.get_pdl()
+    await client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: pdl})
+    await client.request_readings(DAILY_CONSUMPTION_PATH, {USAGE_POINT_ID_PARAM: pdl, START_PARAM: '2024-03-01', END_PARAM: '2024-03-02'})
+    entry = registered_coordinator.config_entry
+    hass.data[DOMAIN][entry.entry_id][CLIENT_KEY] = client
+    result: dict = await async_get_config_entry_diagnostics(hass, entry)
+    assert {k: result['entry']['data'][k] for k in (CLIENT_ID_KEY, CLIENT_SECRET_KEY, PDL_KEY)} == {CLIENT_ID_KEY: REDACTED, CLIENT_SECRET_KEY: REDACTED, PDL_KEY: REDACTED}
+    assert "'secret'" not in str(result) and pdl not in str(result)
+    counters: dict = result['client']['metrics']['counters']
+    assert counters[THROTTLED_COUNTER] == 1
+    assert counters[RETRIES_COUNTER] == 1
+    assert counters[REQUESTS_COUNTER] >= 2
+    histograms: dict = result['client']['metrics']['histograms']
+    assert histograms[DECODE_HISTOGRAM]['count'] >= 1
+    assert histograms[LATENCY_HISTOGRAM_PREFIX + CONTRACTS_PATH]['count'] >= 1
+    assert histograms[LATENCY_HISTOGRAM_PREFIX + DAILY_CONSUMPTION_PATH]['count'] == 1
+    assert result['client']['circuit_breakers'].keys() == {CONTRACTS_PATH, DAILY_CONSUMPTION_PATH}
+    assert result['coordinators'][0]['metrics']['counters']['refreshes'] == 1
+    assert result['coordinators'][0]['snapshot']['contract']
+
+
+async def test_diagnostic_sensors_give_the_metrics(hass: HomeAssistant, registered_coordinator: EnedisDataUpdateCoordinator, api_client) -> None:
+    """
+    The diagnostic sensors give the duration of the last refresh and the counters of the client
+    """
+    # pylint: disable=protected-access
+    api_client.get_metrics().increment(REQUESTS_COUNTER, 5)
+    duration: EnedisDiagnosticCoordinatorEntity = EnedisDiagnosticCoordinatorEntity(SENSOR_TYPES[SensorTypeEnum.DIAGNOSTIC_REFRESH_DURATION_SENSOR_TYPE], registered_coordinator)
+    calls: EnedisDiagnosticCoordinatorEntity = EnedisDiagnosticCoordinatorEntity(SENSOR_TYPES[SensorTypeEnum.DIAGNOSTIC_API_CALLS_SENSOR_TYPE], registered_coordinator)
+    for entity in (duration, calls):
+        entity.hass = hass
+        assert entity._refresh_state()
+    assert int(duration._state) >= 0
+    assert duration._attributes[COUNT_ATTR] == 1
+    assert calls._state == '5'
@@ -0,0 +1,230 @@
+"""
+Tests of the client of the API and of its helper
+"""
+import asyncio
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker, AiohttpClientMockResponse
+
+from custom_components.ha_enedis_dataconnect.const import CONSUMPTION_LOAD_CURVE_PATH, CONTRACTS_PATH, DAILY_CONSUMPTION_PATH, ENDPOINT_URL, LOAD_CURVE_HISTORY_DAYS, RequestPriorityEnum
+from custom_components.ha_enedis_dataconnect import enedis_client
+from custom_components.ha_enedis_dataconnect.enedis_client import EnedisApiHelper, EnedisClient, START_PARAM, END_PARAM, USAGE_POINT_ID_PARAM
+from custom_components.ha_enedis_dataconnect.exceptions import CannotConnect, InvalidResponse, QuotaExceeded
+from custom_components.ha_enedis_dataconnect.history_store import to_timestamp
+from custom_components.ha_enedis_dataconnect.metrics import ERRORS_COUNTER
+from custom_components.ha_enedis_dataconnect.models import MeterReadings
+from custom_components.ha_enedis_dataconnect.resilience import CircuitBreaker, CircuitStateEnum
+
+PDL: str = '12345678901234'
+JSON_HEADERS: dict[str, str] = {'Content-Type': 'application/json'}
+
+
+class _ReadingsClient:
+    """
+    A client returning one reading at the start of each requested period
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.requests: list[tuple[str, str, str]] = []
+
+    async def request_readings(self, path: str, params: dict[str, str], priority: RequestPriorityEnum = RequestPriorityEnum.SCHEDULED, load_curve: bool = False) -> MeterReadings:
+        """
+        Record the request and return a reading
+        """
+        self.requests.append((path, params[START_PARAM], params[END_PARAM]))
+        start: datetime = datetime.strptime(params[START_PARAM], '%Y-%m-%d')
+        return MeterReadings(array('q', [to_timestamp(start)]), array('i', [100]))
+
+
+@pytest.fixture
+async def client(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker, monkeypatch: pytest.MonkeyPatch) -> EnedisClient:
+    """
+    Return a client sending its requests to the mock, with a fixed access token
+    """
+    result: EnedisClient = EnedisClient(hass, 'client', 'secret', 'https://localhost')
+    session = aioclient_mock.create_session(hass.loop)
+
+    async def _async_get_token(*_) -> str:
+        """
+        Return the access token
+        """
+        return 'token'
+
+    monkeypatch.setattr(result, '_get_session', lambda: session)
+    monkeypatch.setattr(result, '_async_get_token', _async_get_token)
+    yield result
+    await session.close()
+
+
+def _responses(statuses: list[int]):
+    """
+    Build the responses of successive requests, the throttled ones asking to be sent again immediately
+    :param statuses: the statuses of the responses
+    :return: the side effect of the mock
+    """
+    remaining: list[int] = list(statuses)
+
+    async def _side_effect(method, url, _data):
+        """
+        Return the next response
+        """
+        return AiohttpClientMockResponse(method, url, status=remaining.pop(0), json={}, headers={'Retry-After': '0'})
+
+    return _side_effect
+
+
+async def test_load_curve_increment_without_fetch_state() -> None:
+    """
+    Without fetch state, the whole window of the load curve is requested
+    """
+    client: _ReadingsClient = _ReadingsClient()
+    helper: EnedisApiHelper = EnedisApiHelper(client, PDL)
+    today: date = date(2024, 3, 15)
+    readings: MeterReadings = await helper.get_consumption_load_curve_increment(today)
+    assert client.requests[0][:2] == (CONSUMPTION_LOAD_CURVE_PATH, (today - timedelta(days=LOAD_CURVE_HISTORY_DAYS)).isoformat())
+    assert client.requests[-1][2] == today.isoformat()
+    assert len(readings) == len(client.requests)
+
+
+async def test_cancelled_probe_is_released(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A request probing a half-open circuit and cancelled before its response lets the next request probe the endpoint
+    """
+
+    async def _side_effect(method, url, _data):
+        """
+        Return the response after the cancellation of the request
+        """
+        await asyncio.sleep(10)
+        return AiohttpClientMockResponse(method, url, json={})
+
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_side_effect)
+    breaker: CircuitBreaker = client.get_breaker(CONTRACTS_PATH)
+    breaker._reset_timeout = 0  # pylint: disable=protected-access
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.get_state() == CircuitStateEnum.HALF_OPEN
+    task: asyncio.Task = asyncio.create_task(client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: PDL}))
+    await asyncio.sleep(0.05)
+    assert not breaker.allow()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert breaker.allow()
+
+
+async def test_throttled_attempts_are_counted_apart(client: EnedisClient, aioclient_mock: AiohttpClientMocker, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    The attempts rejected because of the quota do not use the attempts of the failing requests
+    """
+    monkeypatch.setattr(enedis_client, 'backoff_delay', lambda *_: 0.0)
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_responses([429, 500, 429, 500, 200]))
+    assert await client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: PDL}) == {}
+    assert aioclient_mock.call_count == 5
+
+
+async def test_final_throttled_attempt_is_a_failure(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A request still rejected because of the quota after its last attempt fails and is not recorded as a success of the endpoint
+    """
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_responses([429, 429, 429]))
+    breaker: CircuitBreaker = client.get_breaker(CONTRACTS_PATH)
+    breaker.record_failure()
+    with pytest.raises(QuotaExceeded):
+        await client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: PDL})
+    assert aioclient_mock.call_count == 3
+    assert breaker.as_dict()['failures'] == 2
+
+
+async def test_expired_response_is_revalidated(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    An expired cached response is sent with its validators and served again when the API confirms it is unchanged
+    """
+    params: dict[str, str] = {USAGE_POINT_ID_PARAM: PDL}
+    # pylint: disable=protected-access
+    client._cache.put(client._cache.build_key(CONTRACTS_PATH, params), {'cached': True}, '"v1"', None, time.time() - 1)
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_responses([304]))
+    assert await client.request(CONTRACTS_PATH, params) == {'cached': True}
+    assert aioclient_mock.mock_calls[0][3]['If-None-Match'] == '"v1"'
+    # the revalidated response is fresh again
+    assert await client.request(CONTRACTS_PATH, params) == {'cached': True}
+    assert aioclient_mock.call_count == 1
+
+
+async def test_truncated_response_is_an_error(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A response truncated inside the readings fails the request as a failure of the endpoint and is not cached
+    """
+    params: dict[str, str] = {USAGE_POINT_ID_PARAM: PDL, START_PARAM: '2024-03-01', END_PARAM: '2024-03-03'}
+    aioclient_mock.get(ENDPOINT_URL + DAILY_CONSUMPTION_PATH, text='{"meter_reading": {"interval_reading": [{"date": "2024-03-01", "value": "1000"}, {"date": "2024-03-', headers=JSON_HEADERS)
+    breaker: CircuitBreaker = client.get_breaker(DAILY_CONSUMPTION_PATH)
+    with pytest.raises(InvalidResponse):
+        await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    assert client.get_metrics().get_counter(ERRORS_COUNTER) == 1
+    assert breaker.as_dict()['failures'] == 1
+    with pytest.raises(InvalidResponse):
+        await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    assert aioclient_mock.call_count == 2
+
+
+async def test_other_documents_are_errors(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A successful response which is not a document of readings fails the request and is not cached as a period without readings
+    """
+    params: dict[str, str] = {USAGE_POINT_ID_PARAM: PDL, START_PARAM: '2024-03-01', END_PARAM: '2024-03-03'}
+    aioclient_mock.get(ENDPOINT_URL + DAILY_CONSUMPTION_PATH, text='<html><body>Bad gateway</body></html>', headers={'Content-Type': 'text/html'})
+    with pytest.raises(InvalidResponse):
+        await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(ENDPOINT_URL + DAILY_CONSUMPTION_PATH, json={'error': 'x'}, headers=JSON_HEADERS)
+    with pytest.raises(InvalidResponse):
+        await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    with pytest.raises(InvalidResponse):
+        await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    assert aioclient_mock.call_count == 2
+
+
+async def test_revoked_token_is_replaced_once(client: EnedisClient, aioclient_mock: AiohttpClientMocker, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    A request rejected because of its access token is sent again once with a new token
+    """
+    tokens: list[str] = []
+
+    async def _async_get_token(*_) -> str:
+        """
+        Return a new access token on each call
+        """
+        tokens.append(f"token-{len(tokens)}")
+        return tokens[-1]
+
+    monkeypatch.setattr(client, '_async_get_token', _async_get_token)
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_responses([401, 200]))
+    assert await client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: PDL}) == {}
+    assert [c[3]['Authorization'] for c in aioclient_mock.mock_calls] == ['Bearer token-0', 'Bearer token-1']
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(ENDPOINT_URL + CONTRACTS_PATH, side_effect=_responses([401, 401, 200]))
+    with pytest.raises(CannotConnect):
+        await client.request(CONTRACTS_PATH, {USAGE_POINT_ID_PARAM: PDL, START_PARAM: '2024-03-01'})
+    assert aioclient_mock.call_count == 2
+
+
+async def test_backfill_responses_are_not_cached(client: EnedisClient, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    The closed periods requested by a backfill are not kept in the cache of the responses
+    """
+    params: dict[str, str] = {USAGE_POINT_ID_PARAM: PDL, START_PARAM: '2024-03-01', END_PARAM: '2024-03-02'}
+    aioclient_mock.get(ENDPOINT_URL + DAILY_CONSUMPTION_PATH, json={'meter_reading': {'interval_reading': [{'date': '2024-03-01', 'value': '1000'}]}}, headers=JSON_HEADERS)
+    for _ in range(2):
+        assert len(await client.request_readings(DAILY_CONSUMPTION_PATH, params, RequestPriorityEnum.BACKFILL)) == 1
+    assert aioclient_mock.call_count == 2
+    # the same period requested by a poll is cached
+    await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    await client.request_readings(DAILY_CONSUMPTION_PATH, params)
+    assert aioclient_mock.call_count == 3
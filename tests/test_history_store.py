@@ -0,0 +1,183 @@
+"""
+Tests of the on-disk history
+"""
+import asyncio
+from array import array
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.ha_enedis_dataconnect.history_store import ColumnarSeries, EnedisHistoryStore
+from custom_components.ha_enedis_dataconnect.models import EPOCH_DATE, SECONDS_PER_DAY, HALF_HOUR_SECONDS, MeterReadings
+
+PDL: str = '12345678901234'
+
+
+def _readings(start: int, step: int, values: list[int]) -> MeterReadings:
+    """
+    Build readings at a regular interval
+    :param start: the first timestamp
+    :param step: the interval in seconds
+    :param values: the values
+    :return: the readings
+    """
+    return MeterReadings(array('q', [start + i * step for i in range(len(values))]), array('i', values))
+
+
+def _count_replacements(monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    """
+    Record the rewrites of the series
+    :param monkeypatch: the fixture
+    :return: the paths of the rewritten series
+    """
+    replaced: list[Path] = []
+    replace = ColumnarSeries._replace  # pylint: disable=protected-access
+
+    def _replace(series: ColumnarSeries, timestamps: array, values: array) -> None:
+        """
+        Record the path and replace the files
+        """
+        # pylint: disable=protected-access
+        replaced.append(series._timestamps_path)
+        replace(series, timestamps, values)
+
+    monkeypatch.setattr(ColumnarSeries, '_replace', _replace)
+    return replaced
+
+
+@pytest.fixture
+def store(hass: HomeAssistant, tmp_path: Path) -> EnedisHistoryStore:
+    """
+    Return a store writing in a temporary directory
+    """
+    hass.config.config_dir = str(tmp_path)
+    return EnedisHistoryStore(hass, PDL)
+
+
+def test_write_appends_readings_after_the_last_one(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Readings after the last one are appended without rewriting the files
+    """
+    replaced: list[Path] = _count_replacements(monkeypatch)
+    series: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    assert series.write(_readings(0, SECONDS_PER_DAY, [1, 2, 3])) == 3
+    assert series.write(_readings(3 * SECONDS_PER_DAY, SECONDS_PER_DAY, [4, 5])) == 2
+    assert not replaced
+    timestamps, values = series.get_readings()
+    assert values.tolist() == [1, 2, 3, 4, 5]
+    assert timestamps.tolist() == [i * SECONDS_PER_DAY for i in range(5)]
+    # the content is read again from the files
+    other: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    other.open()
+    assert other.get_readings()[1].tolist() == [1, 2, 3, 4, 5]
+    series.close()
+    other.close()
+
+
+def test_write_skips_the_readings_already_stored(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Readings overlapping the stored ones with the same values do not rewrite the files
+    """
+    replaced: list[Path] = _count_replacements(monkeypatch)
+    series: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    series.write(_readings(0, SECONDS_PER_DAY, [1, 2, 3]))
+    assert series.write(_readings(0, SECONDS_PER_DAY, [1, 2, 3])) == 0
+    assert series.write(_readings(SECONDS_PER_DAY, SECONDS_PER_DAY, [2, 3, 4])) == 1
+    assert not replaced
+    assert series.get_readings()[1].tolist() == [1, 2, 3, 4]
+    series.close()
+
+
+def test_write_merges_changed_and_older_readings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Readings changing a stored value or older than the last one rewrite the files in order
+    """
+    replaced: list[Path] = _count_replacements(monkeypatch)
+    series: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    series.write(_readings(2 * SECONDS_PER_DAY, SECONDS_PER_DAY, [3, 4]))
+    assert series.write(_readings(0, SECONDS_PER_DAY, [1, 2, 30])) == 3
+    assert len(replaced) == 1
+    timestamps, values = series.get_readings()
+    assert timestamps.tolist() == [0, SECONDS_PER_DAY, 2 * SECONDS_PER_DAY, 3 * SECONDS_PER_DAY]
+    assert values.tolist() == [1, 2, 30, 4]
+    assert series.sum(SECONDS_PER_DAY, 3 * SECONDS_PER_DAY) == 32
+    series.close()
+
+
+async def test_unchanged_poll_keeps_the_version(store: EnedisHistoryStore, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Writing again the readings of the previous poll neither rewrites the files nor changes the version
+    """
+    await store.async_open()
+    daily: MeterReadings = _readings(0, SECONDS_PER_DAY, [1000, 2000, 3000])
+    load_curve: MeterReadings = _readings(0, HALF_HOUR_SECONDS, [100] * 96)
+    await store.async_write(daily, load_curve)
+    version: int = store.get_version()
+    replaced: list[Path] = _count_replacements(monkeypatch)
+    await store.async_write(daily, load_curve)
+    assert not replaced
+    assert store.get_version() == version
+    # a new day is appended and changes the version
+    await store.async_write(_readings(0, SECONDS_PER_DAY, [1000, 2000, 3000, 4000]), load_curve)
+    assert not replaced
+    assert store.get_version() == version + 1
+    assert store.get_daily_value(EPOCH_DATE + timedelta(days=3)) == 4000
+    await store.async_close()
+
+
+
+def test_open_truncates_an_interrupted_append(tmp_path: Path) -> None:
+    """
+    Timestamps appended without their values, the process being stopped between the two files, are dropped instead of resetting the history
+    """
+    series: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    series.write(_readings(0, SECONDS_PER_DAY, [1, 2, 3]))
+    series.close()
+    with (tmp_path / 'series.ts').open(mode='ab') as f:
+        array('q', [3 * SECONDS_PER_DAY, 4 * SECONDS_PER_DAY]).tofile(f)
+    with (tmp_path / 'series.wh').open(mode='ab') as f:
+        f.write(b'\x01\x00')
+    series.open()
+    assert series.get_readings()[1].tolist() == [1, 2, 3]
+    assert series.get_last_timestamp() == 2 * SECONDS_PER_DAY
+    series.close()
+
+
+def test_open_completes_an_interrupted_rewrite(tmp_path: Path) -> None:
+    """
+    A rewrite stopped after the renaming of the timestamps is completed with the remaining temporary file of the values
+    """
+    series: ColumnarSeries = ColumnarSeries(tmp_path / 'series')
+    series.write(_readings(SECONDS_PER_DAY, SECONDS_PER_DAY, [2, 3]))
+    series.close()
+    with (tmp_path / 'series.ts').open(mode='wb') as f:
+        array('q', [0, SECONDS_PER_DAY, 2 * SECONDS_PER_DAY]).tofile(f)
+    with (tmp_path / 'series.wh.tmp').open(mode='wb') as f:
+        array('i', [1, 2, 3]).tofile(f)
+    series.open()
+    assert series.get_readings()[1].tolist() == [1, 2, 3]
+    assert not (tmp_path / 'series.wh.tmp').exists()
+    series.close()
+
+
+async def test_concurrent_poll_and_backfill(store: EnedisHistoryStore) -> None:
+    """
+    The writes of the polls and of a backfill running at the same time keep the files consistent
+    """
+    await store.async_open()
+    days: int = 60
+    polls: list = [store.async_write(_readings(i * SECONDS_PER_DAY, SECONDS_PER_DAY, [i + 1000]), _readings(i * SECONDS_PER_DAY, HALF_HOUR_SECONDS, [i] * 48)) for i in range(days // 2, days)]
+    backfill: list = [store.async_merge(_readings(i * SECONDS_PER_DAY, SECONDS_PER_DAY, [i + 1000]), _readings(i * SECONDS_PER_DAY, HALF_HOUR_SECONDS, [i] * 48)) for i in range(days // 2)]
+    await asyncio.gather(*(c for pair in zip(polls, backfill) for c in pair))
+    timestamps, values = store.get_daily().get_readings()
+    assert len(timestamps) == len(values) == days
+    assert values.tolist() == [i + 1000 for i in range(days)]
+    assert len(store.get_load_curve()) == days * 48
+    await store.async_close()
+    # the files are consistent when they are opened again
+    await store.async_open()
+    assert len(store.get_daily()) == days
+    assert len(store.get_load_curve()) == days * 48
+    await store.async_close()
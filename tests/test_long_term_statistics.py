@@ -0,0 +1,55 @@
+"""
+Tests of the import of the long-term statistics
+"""
+from array import array
+from datetime import datetime
+from pathlib import Path
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.ha_enedis_dataconnect.fetch_state import EnedisFetchState
+from custom_components.ha_enedis_dataconnect.history_store import EnedisHistoryStore, to_timestamp
+from custom_components.ha_enedis_dataconnect.long_term_statistics import EnedisStatisticsImporter, HOURLY_STATISTICS_MARK, DAILY_STATISTICS_MARK
+from custom_components.ha_enedis_dataconnect.models import SECONDS_PER_DAY, HALF_HOUR_SECONDS, MeterReadings
+
+PDL: str = '12345678901234'
+START: datetime = datetime(2024, 1, 1)
+
+
+def _readings(days: int) -> tuple[MeterReadings, MeterReadings]:
+    """
+    Build the daily readings and the load curve of the first days
+    :param days: the number of days
+    :return: the daily readings and the load curve
+    """
+    start: int = to_timestamp(START)
+    daily: MeterReadings = MeterReadings(array('q', [start + i * SECONDS_PER_DAY for i in range(days)]), array('i', [4800] * days))
+    load_curve: MeterReadings = MeterReadings(array('q', [start + i * HALF_HOUR_SECONDS for i in range(days * 48)]), array('i', [100] * days * 48))
+    return daily, load_curve
+
+
+async def test_import_from_the_high_water_marks(hass: HomeAssistant, tmp_path: Path, statistics: list[tuple[str, list]]) -> None:
+    """
+    The statistics are imported once, except the last period which is imported again with the next ones
+    """
+    hass.config.config_dir = str(tmp_path)
+    store: EnedisHistoryStore = EnedisHistoryStore(hass, PDL)
+    await store.async_open()
+    fetch_state: EnedisFetchState = EnedisFetchState(hass, PDL)
+    importer: EnedisStatisticsImporter = EnedisStatisticsImporter(hass, PDL, store, fetch_state)
+    hourly_id, daily_id = importer.get_statistic_ids()
+    await store.async_write(*_readings(2))
+    assert await importer.async_import() == 48 + 2
+    assert fetch_state.get_high_water_mark(HOURLY_STATISTICS_MARK) == datetime(2024, 1, 2, 23)
+    assert fetch_state.get_high_water_mark(DAILY_STATISTICS_MARK) == datetime(2024, 1, 2)
+    daily: list = [s for i, s in statistics if i == daily_id][0]
+    assert [s['sum'] for s in daily] == [4.8, 9.6]
+    statistics.clear()
+    # a new day is imported with the last periods of the previous import
+    await store.async_write(*_readings(3))
+    assert await importer.async_import() == 1 + 24 + 1 + 1
+    hourly: list = [s for i, s in statistics if i == hourly_id][0]
+    assert hourly[0]['start'].replace(tzinfo=None) == datetime(2024, 1, 2, 23)
+    assert hourly[0]['sum'] == 4.8 * 2
+    assert fetch_state.get_high_water_mark(DAILY_STATISTICS_MARK) == datetime(2024, 1, 3)
+    await store.async_close()
@@ -0,0 +1,67 @@
+"""
+Tests of the limiters of the rate of the requests
+"""
+import asyncio
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect.const import RequestPriorityEnum
+from custom_components.ha_enedis_dataconnect.rate_limiter import TokenBucketLimiter, GRANTED_METRIC, THROTTLED_METRIC
+
+
+async def _acquire(limiter: TokenBucketLimiter, priority: RequestPriorityEnum, name: str, granted: list[str]) -> None:
+    """
+    Wait for a token and record the caller
+    :param limiter: the limiter
+    :param priority: the priority of the caller
+    :param name: the name of the caller
+    :param granted: the names of the callers in the order of the tokens
+    """
+    await limiter.async_acquire(priority)
+    granted.append(name)
+
+
+async def test_tokens_are_granted_by_priority_then_arrival() -> None:
+    """
+    The queued callers get the tokens by priority, the callers of a same priority by arrival
+    """
+    limiter: TokenBucketLimiter = TokenBucketLimiter(rate=100, burst=1)
+    await limiter.async_acquire()
+    granted: list[str] = []
+    tasks: list[asyncio.Task] = []
+    for name, priority in (('backfill', RequestPriorityEnum.BACKFILL), ('poll-1', RequestPriorityEnum.SCHEDULED), ('validation', RequestPriorityEnum.INTERACTIVE), ('poll-2', RequestPriorityEnum.SCHEDULED)):
+        tasks.append(asyncio.create_task(_acquire(limiter, priority, name, granted)))
+        await asyncio.sleep(0)
+    assert limiter.get_queue_depth() == 4
+    await asyncio.gather(*tasks)
+    assert granted == ['validation', 'poll-1', 'poll-2', 'backfill']
+    assert limiter.get_metrics()[GRANTED_METRIC] == {'interactive': 1, 'scheduled': 3, 'backfill': 1}
+
+
+async def test_cancelled_caller_is_skipped() -> None:
+    """
+    A caller cancelled while waiting does not take a token
+    """
+    limiter: TokenBucketLimiter = TokenBucketLimiter(rate=100, burst=1)
+    await limiter.async_acquire()
+    granted: list[str] = []
+    cancelled: asyncio.Task = asyncio.create_task(_acquire(limiter, RequestPriorityEnum.INTERACTIVE, 'cancelled', granted))
+    waiting: asyncio.Task = asyncio.create_task(_acquire(limiter, RequestPriorityEnum.BACKFILL, 'waiting', granted))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert limiter.get_queue_depth() == 1
+    await waiting
+    assert granted == ['waiting']
+
+
+async def test_pause_delays_the_tokens() -> None:
+    """
+    The tokens are not granted while the limiter is paused
+    """
+    limiter: TokenBucketLimiter = TokenBucketLimiter(rate=1000, burst=5)
+    limiter.pause(0.1)
+    waited: float = await limiter.async_acquire()
+    assert 0.05 <= waited
+    assert limiter.get_metrics()[THROTTLED_METRIC] == 1
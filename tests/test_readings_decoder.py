@@ -0,0 +1,89 @@
+"""
+Tests of the decoding of the readings
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect.history_store import to_timestamp
+from custom_components.ha_enedis_dataconnect.models import MeterReadings
+from custom_components.ha_enedis_dataconnect.readings_decoder import ReadingsDecoder
+
+
+def _decode(body: bytes, load_curve: bool = False, size: int = 7) -> MeterReadings:
+    """
+    Decode a response received by small chunks
+    :param body: the response
+    :param load_curve: true to convert the readings of a load curve
+    :param size: the size of the chunks
+    :return: the readings
+    """
+    decoder: ReadingsDecoder = ReadingsDecoder(load_curve)
+    for i in range(0, len(body), size):
+        decoder.feed(body[i:i + size])
+    return decoder.close()
+
+
+def _response(readings: list[dict[str, str]]) -> bytes:
+    """
+    Build a response of the API
+    :param readings: the readings
+    :return: the body
+    """
+    return json.dumps({'meter_reading': {'usage_point_id': '12345678901234', 'reading_type': {'unit': 'Wh', 'aggregate': 'sum'}, 'interval_reading': readings}}, indent=2).encode('utf-8')
+
+
+def test_load_curve_is_converted_to_energy_at_the_start_of_the_intervals() -> None:
+    """
+    The average power at the end of an interval becomes the energy of the interval at its start
+    """
+    readings: MeterReadings = _decode(_response([
+        {'value': '1200', 'date': '2024-01-01 00:30:00', 'interval_length': 'PT30M'},
+        {'value': '600', 'date': '2024-01-01 01:00:00', 'interval_length': 'PT30M'},
+        {'value': '3000', 'date': '2024-01-01 01:10:00', 'interval_length': 'PT10M'}
+    ]), load_curve=True)
+    start: int = to_timestamp(datetime(2024, 1, 1))
+    assert readings.timestamps.tolist() == [start, start + 1800, start + 3600]
+    assert readings.values.tolist() == [600, 300, 500]
+
+
+def test_daily_readings_are_kept() -> None:
+    """
+    The daily readings are in Wh at the start of the day, the chunks splitting a multibyte character
+    """
+    body: bytes = _response([{'value': '4800', 'date': '2024-01-01'}, {'value': '5100', 'date': '2024-01-02'}]).replace(b'"Wh"', '"Wh é"'.encode('utf-8'))
+    for size in (1, 3, 7, len(body)):
+        readings: MeterReadings = _decode(body, size=size)
+        assert readings.timestamps.tolist() == [to_timestamp(datetime(2024, 1, 1)), to_timestamp(datetime(2024, 1, 2))]
+        assert readings.values.tolist() == [4800, 5100]
+
+
+def test_response_without_readings() -> None:
+    """
+    A response without readings gives no reading
+    """
+    assert len(_decode(b'{"meter_reading": {"usage_point_id": "12345678901234"}}')) == 0
+    assert len(_decode(_response([]))) == 0
+
+
+def test_malformed_input_is_rejected() -> None:
+    """
+    A reading without value or date and a truncated response are rejected
+    """
+    with pytest.raises(ValueError):
+        _decode(_response([{'date': '2024-01-01'}]))
+    with pytest.raises(ValueError):
+        _decode(_response([{'value': '4800'}]))
+    body: bytes = _response([{'value': '4800', 'date': '2024-01-01'}, {'value': '5100', 'date': '2024-01-02'}])
+    with pytest.raises(ValueError):
+        _decode(body[:body.index(b'5100')])
+
+
+def test_other_documents_are_rejected() -> None:
+    """
+    A document which is not a document of readings is rejected instead of giving no reading
+    """
+    for body in (b'<html><body>Bad gateway</body></html>', b'{"error": "x"}', b''):
+        with pytest.raises(ValueError):
+            _decode(body)
@@ -0,0 +1,107 @@
+"""
+Tests of the protections of the API during failures
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect import resilience
+from custom_components.ha_enedis_dataconnect.resilience import CircuitBreaker, CircuitStateEnum, RetryBudget, backoff_delay
+
+
+class _Clock:
+    """
+    A monotonic clock moved by the tests
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.now: float = 1000.0
+
+    def monotonic(self) -> float:
+        """
+        Return the current time
+        :return: the time in seconds
+        """
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    """
+    Replace the clock of the module
+    """
+    result: _Clock = _Clock()
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=result.monotonic))
+    return result
+
+
+def test_backoff_delay_is_bounded() -> None:
+    """
+    The delay doubles after each attempt, stays in the upper half of its range and never exceeds the maximum
+    """
+    for attempt, expected in ((1, 1.0), (2, 2.0), (3, 4.0), (10, 30.0), (1000, 30.0)):
+        for _ in range(20):
+            assert expected / 2 <= backoff_delay(attempt, 1.0, 30.0) <= expected
+
+
+def test_breaker_opens_and_probes(clock: _Clock) -> None:
+    """
+    The circuit opens after consecutive failures, a single request probes it after the delay and a failed probe doubles the delay
+    """
+    breaker: CircuitBreaker = CircuitBreaker('path', threshold=3, reset_timeout=60, max_reset_timeout=3600)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.get_state() == CircuitStateEnum.CLOSED
+    # a success resets the consecutive failures
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.get_state() == CircuitStateEnum.OPEN
+    assert not breaker.allow()
+    assert 30 <= breaker.get_retry_after() <= 60
+    clock.now += 60
+    assert breaker.get_state() == CircuitStateEnum.HALF_OPEN
+    assert breaker.allow()
+    # the other requests wait for the result of the probe
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.get_state() == CircuitStateEnum.OPEN
+    assert 60 <= breaker.get_retry_after() <= 120
+    clock.now += 120
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.get_state() == CircuitStateEnum.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_probe_is_taken_by_the_next_request(clock: _Clock) -> None:
+    """
+    A probe ended without result lets the next request probe the endpoint
+    """
+    breaker: CircuitBreaker = CircuitBreaker('path', threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_probe()
+    assert breaker.get_state() == CircuitStateEnum.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_retry_budget(clock: _Clock) -> None:
+    """
+    The retries are limited to a ratio of the requests of the window, a minimum being always allowed
+    """
+    budget: RetryBudget = RetryBudget(ratio=0.2, minimum=3, window=60)
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+    for _ in range(25):
+        budget.record_request()
+    assert [budget.try_acquire() for _ in range(3)] == [True, True, False]
+    assert budget.get_metrics() == {'requests': 25, 'retries': 5}
+    # the requests and the retries older than the window are forgotten
+    clock.now += 61
+    assert budget.get_metrics() == {'requests': 0, 'retries': 0}
+    assert budget.try_acquire()
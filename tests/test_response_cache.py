@@ -0,0 +1,64 @@
+"""
+Tests of the cache of the responses
+"""
+import time
+from datetime import date, timedelta
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.ha_enedis_dataconnect.enedis_client import START_PARAM, END_PARAM
+from custom_components.ha_enedis_dataconnect.response_cache import CachedResponse, EnedisResponseCache, compute_expiration
+
+
+def test_closed_period_never_expires() -> None:
+    """
+    A period ending before yesterday never expires, an open or undated one expires
+    """
+    today: date = date.today()
+    assert compute_expiration({START_PARAM: (today - timedelta(days=9)).isoformat(), END_PARAM: (today - timedelta(days=2)).isoformat()}) is None
+    assert compute_expiration({START_PARAM: (today - timedelta(days=7)).isoformat(), END_PARAM: today.isoformat()}) > time.time()
+    assert compute_expiration({}) > time.time()
+
+
+def test_expired_response_is_kept_for_its_validators(hass: HomeAssistant) -> None:
+    """
+    An expired response is a miss but is returned with its validators and revalidated without being fetched again
+    """
+    cache: EnedisResponseCache = EnedisResponseCache(hass)
+    key: str = cache.build_key('/path', {END_PARAM: '2024-01-02', START_PARAM: '2024-01-01'})
+    assert key == '/path?end=2024-01-02&start=2024-01-01'
+    cache.put(key, {'value': 1}, '"v1"', 'Mon, 01 Jan 2024 00:00:00 GMT', time.time() - 1)
+    entry: CachedResponse = cache.get(key)
+    assert not entry.is_fresh()
+    assert entry.get_conditional_headers() == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert cache.revalidate(key, entry, time.time() + 60) is entry
+    assert cache.get(key).is_fresh()
+    assert cache.get_metrics() == {'size': 1, 'hits': 1, 'misses': 1, 'revalidations': 1}
+
+
+def test_response_evicted_during_its_revalidation_is_stored_again(hass: HomeAssistant) -> None:
+    """
+    A response evicted by the responses stored while it was revalidated is stored again
+    """
+    cache: EnedisResponseCache = EnedisResponseCache(hass, size=2)
+    cache.put('a', {'value': 1}, '"v1"', None, time.time() - 1)
+    entry: CachedResponse = cache.get('a')
+    cache.put('b', {}, None, None, None)
+    cache.put('c', {}, None, None, None)
+    assert cache.get('a') is None
+    assert cache.revalidate('a', entry, time.time() + 60).body == {'value': 1}
+    assert cache.get('a') is entry and entry.is_fresh()
+    assert cache.get('b') is None
+
+
+def test_least_recently_used_response_is_evicted(hass: HomeAssistant) -> None:
+    """
+    Above the maximum size, the least recently used response is evicted
+    """
+    cache: EnedisResponseCache = EnedisResponseCache(hass, size=2)
+    cache.put('a', {}, None, None, None)
+    cache.put('b', {}, None, None, None)
+    cache.get('a')
+    cache.put('c', {}, None, None, None)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
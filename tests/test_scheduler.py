@@ -0,0 +1,89 @@
+"""
+Tests of the scheduler of the polls
+"""
+from array import array
+from datetime import date, datetime, timedelta
+
+from custom_components.ha_enedis_dataconnect.const import LATE_PUBLICATION_INTERVAL, PDL_JITTER, PUBLICATION_WINDOW_START_HOUR, EnedisDatasetEnum
+from custom_components.ha_enedis_dataconnect.models import HALF_HOUR_SECONDS, EnedisDataSnapshot, MeterReadings, day_to_timestamp
+from custom_components.ha_enedis_dataconnect.scheduler import LAST_INTERVAL_OFFSET, RANDOM_JITTER, EnedisPollingScheduler, is_day_complete
+
+PDL: str = '12345678901234'
+SCAN_INTERVAL: int = 120
+TODAY: date = date(2024, 3, 15)
+YESTERDAY: date = TODAY - timedelta(days=1)
+
+
+def _snapshot(daily: bool = True, last_interval: int = LAST_INTERVAL_OFFSET) -> EnedisDataSnapshot:
+    """
+    Build the data of a poll made today
+    :param daily: true if the daily consumption of yesterday is available
+    :param last_interval: the start of the last interval of the load curve of yesterday in seconds
+    :return: the snapshot
+    """
+    start: int = day_to_timestamp(YESTERDAY)
+    timestamps: array = array('q', range(start, start + last_interval + 1, HALF_HOUR_SECONDS))
+    return EnedisDataSnapshot(
+        pdl=PDL,
+        fetched_at=datetime.combine(TODAY, datetime.min.time()),
+        daily_consumption=MeterReadings(array('q', [start] if daily else []), array('i', [1000] if daily else [])),
+        load_curve=MeterReadings(timestamps, array('i', [10] * len(timestamps)))
+    )
+
+
+def _assert_interval(result: timedelta, expected: timedelta) -> None:
+    """
+    Check an interval, the random part of the jitter excluded
+    :param result: the interval
+    :param expected: the interval without the random part
+    """
+    assert expected <= result <= expected + timedelta(seconds=RANDOM_JITTER)
+
+
+def test_day_completion() -> None:
+    """
+    A day is complete when its daily consumption and the last interval of its load curve are available, the datasets not fetched being ignored
+    """
+    assert is_day_complete(_snapshot(), YESTERDAY)
+    assert not is_day_complete(None, YESTERDAY)
+    assert not is_day_complete(_snapshot(daily=False), YESTERDAY)
+    assert not is_day_complete(_snapshot(last_interval=LAST_INTERVAL_OFFSET - HALF_HOUR_SECONDS), YESTERDAY)
+    assert is_day_complete(_snapshot(last_interval=0), YESTERDAY, frozenset({EnedisDatasetEnum.DAILY_CONSUMPTION}))
+    assert is_day_complete(_snapshot(daily=False), YESTERDAY, frozenset({EnedisDatasetEnum.LOAD_CURVE}))
+
+
+def test_polls_around_the_publication_window() -> None:
+    """
+    Before the window, the poll waits for its start, inside the polls follow the scan interval, after they are hourly
+    """
+    scheduler: EnedisPollingScheduler = EnedisPollingScheduler(PDL, SCAN_INTERVAL)
+    start, end = scheduler.get_window(TODAY)
+    incomplete: EnedisDataSnapshot = _snapshot(daily=False)
+    _assert_interval(scheduler.next_interval(incomplete, start - timedelta(hours=2)), timedelta(hours=2))
+    _assert_interval(scheduler.next_interval(incomplete, start + timedelta(minutes=10)), timedelta(seconds=SCAN_INTERVAL))
+    _assert_interval(scheduler.next_interval(incomplete, end + timedelta(minutes=1)), timedelta(seconds=LATE_PUBLICATION_INTERVAL))
+    # the poll never happens before the scan interval, even just before the window
+    _assert_interval(scheduler.next_interval(incomplete, start - timedelta(seconds=1)), timedelta(seconds=SCAN_INTERVAL))
+
+
+def test_completed_day_waits_for_the_next_publication() -> None:
+    """
+    Once the previous day is complete, the next poll is at the start of the window of the next day
+    """
+    scheduler: EnedisPollingScheduler = EnedisPollingScheduler(PDL, SCAN_INTERVAL)
+    now: datetime = scheduler.get_window(TODAY)[0] + timedelta(minutes=10)
+    _assert_interval(scheduler.next_interval(_snapshot(), now), scheduler.get_window(TODAY + timedelta(days=1))[0] - now)
+
+
+def test_window_is_shifted_by_pdl() -> None:
+    """
+    The window of a PDL is always shifted by the same delay, the delays of the PDL being spread
+    """
+    windows: set[datetime] = set()
+    for i in range(10):
+        start, end = EnedisPollingScheduler(f"{i:014d}", SCAN_INTERVAL).get_window(TODAY)
+        shift: timedelta = start - datetime.combine(TODAY, datetime.min.time()) - timedelta(hours=PUBLICATION_WINDOW_START_HOUR)
+        assert timedelta(0) <= shift < timedelta(seconds=PDL_JITTER)
+        assert EnedisPollingScheduler(f"{i:014d}", SCAN_INTERVAL).get_window(TODAY) == (start, end)
+        windows.add(start)
+    assert len(windows) > 1
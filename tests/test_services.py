@@ -0,0 +1,35 @@
+"""
+Tests of the services
+"""
+from datetime import date, timedelta
+
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
+
+from custom_components.ha_enedis_dataconnect.const import DOMAIN, END_DATE_KEY, GET_HISTORY_SERVICE, PDL_KEY, SERIES_KEY, START_DATE_KEY, EnedisSeriesEnum
+from custom_components.ha_enedis_dataconnect.coordinators import EnedisDataUpdateCoordinator
+from custom_components.ha_enedis_dataconnect.services import TIMESTAMPS_KEY, UNIT_KEY, VALUES_KEY, async_setup_services
+
+
+async def test_get_history_returns_the_series_in_columns(hass: HomeAssistant, registered_coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    The daily series of the local history is returned as a column of timestamps and a column of values, an unknown PDL being rejected
+    """
+    pdl: str = registered_coordinator.get_pdl()
+    async_setup_services(hass)
+    start: date = date.today() - timedelta(days=7)
+    response: dict = await hass.services.async_call(DOMAIN, GET_HISTORY_SERVICE, {PDL_KEY: pdl, SERIES_KEY: EnedisSeriesEnum.DAILY, START_DATE_KEY: start.isoformat()}, blocking=True, return_response=True)
+    assert {k: response[k] for k in (PDL_KEY, SERIES_KEY, START_DATE_KEY, END_DATE_KEY, UNIT_KEY)} == {
+        PDL_KEY: pdl,
+        SERIES_KEY: EnedisSeriesEnum.DAILY,
+        START_DATE_KEY: start.isoformat(),
+        END_DATE_KEY: (date.today() + timedelta(days=1)).isoformat(),
+        UNIT_KEY: 'Wh'
+    }
+    # the data of the current day is never available
+    assert len(response[TIMESTAMPS_KEY]) == len(response[VALUES_KEY]) == 7
+    assert response[TIMESTAMPS_KEY][0] == f"{start.isoformat()}T00:00:00"
+    assert all(isinstance(v, int) for v in response[VALUES_KEY])
+    with pytest.raises(ServiceValidationError):
+        await hass.services.async_call(DOMAIN, GET_HISTORY_SERVICE, {PDL_KEY: '99999999999999', SERIES_KEY: EnedisSeriesEnum.DAILY, START_DATE_KEY: start.isoformat()}, blocking=True, return_response=True)
@@ -0,0 +1,97 @@
+"""
+Tests of the coalescing of concurrent calls
+"""
+import asyncio
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect.exceptions import CannotConnect
+from custom_components.ha_enedis_dataconnect.single_flight import SingleFlight
+
+KEY: str = 'key'
+
+
+class _Call:
+    """
+    A call completed when it is released
+    """
+
+    def __init__(self, error: Exception = None):
+        """
+        Constructor
+        :param error: the error raised by the call
+        """
+        self.count: int = 0
+        self.release: asyncio.Event = asyncio.Event()
+        self._error: Exception = error
+
+    async def __call__(self) -> int:
+        """
+        Wait for the release and return the number of calls
+        """
+        self.count += 1
+        await self.release.wait()
+        if self._error is not None:
+            raise self._error
+        return self.count
+
+
+async def test_concurrent_callers_share_a_single_call() -> None:
+    """
+    The callers arriving while a call is in progress receive its result, the next caller starts a new call
+    """
+    flight: SingleFlight = SingleFlight()
+    call: _Call = _Call()
+    tasks: list[asyncio.Task] = [asyncio.create_task(flight.async_run(KEY, call)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert flight.is_running(KEY)
+    call.release.set()
+    assert await asyncio.gather(*tasks) == [1, 1, 1]
+    assert not flight.is_running(KEY)
+    assert await flight.async_run(KEY, call) == 2
+
+
+async def test_error_is_shared() -> None:
+    """
+    The callers of a failed call receive its error
+    """
+    flight: SingleFlight = SingleFlight()
+    call: _Call = _Call(CannotConnect('failure'))
+    tasks: list[asyncio.Task] = [asyncio.create_task(flight.async_run(KEY, call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    call.release.set()
+    results: list = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, CannotConnect) for r in results)
+    assert call.count == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_call() -> None:
+    """
+    The caller which started a call can be cancelled, the other callers still receive the result
+    """
+    flight: SingleFlight = SingleFlight()
+    call: _Call = _Call()
+    owner: asyncio.Task = asyncio.create_task(flight.async_run(KEY, call))
+    await asyncio.sleep(0)
+    waiter: asyncio.Task = asyncio.create_task(flight.async_run(KEY, call))
+    await asyncio.sleep(0)
+    owner.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+    call.release.set()
+    assert await asyncio.wait_for(waiter, 1) == 1
+    assert call.count == 1
+
+
+async def test_cancel_stops_the_calls() -> None:
+    """
+    The calls in progress are cancelled on shutdown
+    """
+    flight: SingleFlight = SingleFlight()
+    waiter: asyncio.Task = asyncio.create_task(flight.async_run(KEY, _Call()))
+    await asyncio.sleep(0)
+    flight.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(waiter, 1)
+    await asyncio.sleep(0)
+    assert not flight.is_running(KEY)
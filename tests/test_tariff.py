@@ -0,0 +1,41 @@
+"""
+Tests of the tariff engine
+"""
+from array import array
+
+import pytest
+
+from custom_components.ha_enedis_dataconnect import tariff
+from custom_components.ha_enedis_dataconnect.tariff import TariffDefinition, TariffEngine, TariffOptionEnum, SLOT_SECONDS, SLOTS_PER_DAY, parse_off_peak_hours
+
+OFF_PEAK_WINDOWS: tuple[tuple[int, int], ...] = parse_off_peak_hours('HC (22H00-6H00)')
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+def engine(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> TariffEngine:
+    """
+    Return an engine using peak and off-peak prices, with and without NumPy
+    """
+    if not request.param:
+        monkeypatch.setattr(tariff, 'get_numpy', lambda: None)
+    return TariffEngine(TariffDefinition(option=TariffOptionEnum.PEAK_OFF_PEAK, base_price=0.2, peak_price=0.2, off_peak_price=0.1, off_peak_windows=OFF_PEAK_WINDOWS))
+
+
+def test_total_cost(engine: TariffEngine) -> None:
+    """
+    The total cost of a day uses the price of the slot of each interval
+    """
+    timestamps: array = array('q', [i * SLOT_SECONDS for i in range(SLOTS_PER_DAY)])
+    values: array = array('i', [1000] * SLOTS_PER_DAY)
+    # 16 off-peak slots (0:00-6:00 and 22:00-24:00) and 32 peak slots of 1 kWh
+    assert engine.total_cost(timestamps, values) == pytest.approx(16 * 0.1 + 32 * 0.2)
+    assert engine.total_cost(array('q'), array('i')) == 0.0
+
+
+def test_energy_split(engine: TariffEngine) -> None:
+    """
+    The energy is split between the peak and the off-peak hours
+    """
+    timestamps: array = array('q', [i * SLOT_SECONDS for i in range(SLOTS_PER_DAY)])
+    values: array = array('i', [100] * SLOTS_PER_DAY)
+    assert engine.energy_split(timestamps, values) == (3200, 1600)
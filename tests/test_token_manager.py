@@ -0,0 +1,139 @@
+"""
+Tests of the manager of the access tokens
+"""
+import asyncio
+import time
+
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker, AiohttpClientMockResponse
+
+from custom_components.ha_enedis_dataconnect.const import ENDPOINT_TOKEN_URL
+from custom_components.ha_enedis_dataconnect.exceptions import CannotConnect, InvalidClientSecret
+from custom_components.ha_enedis_dataconnect.token_manager import EnedisTokenManager, _CachedToken, TOKEN_EXPIRATION_MARGIN, TOKEN_REFRESH_MARGIN, get_token_manager
+
+TOKEN_URL: str = ENDPOINT_TOKEN_URL + 'token'
+CLIENT_ID: str = 'client'
+CLIENT_SECRET: str = 'secret'
+
+
+def _slow_response(status: int = 200, json: dict = None):
+    """
+    Build a response of the token endpoint returned after a switch of task, so the concurrent callers arrive while the call is in progress
+    :param status: the status
+    :param json: the body
+    :return: the side effect of the mock
+    """
+
+    async def _side_effect(method, url, _data):
+        """
+        Return the response
+        """
+        await asyncio.sleep(0.01)
+        return AiohttpClientMockResponse(method, url, status=status, json=json)
+
+    return _side_effect
+
+
+async def test_concurrent_callers_share_a_single_fetch(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    Concurrent callers wait for the same call of the token endpoint
+    """
+    aioclient_mock.post(TOKEN_URL, side_effect=_slow_response(json={'access_token': 'token-1', 'expires_in': 3600}))
+    manager: EnedisTokenManager = get_token_manager(hass)
+    tokens: list[str] = await asyncio.gather(*(manager.async_get_token(CLIENT_ID, CLIENT_SECRET) for _ in range(5)))
+    assert tokens == ['token-1'] * 5
+    assert aioclient_mock.call_count == 1
+    assert manager.get_fetch_count() == 1
+    # the cached token is served without calling the endpoint
+    assert await manager.async_get_token(CLIENT_ID, CLIENT_SECRET) == 'token-1'
+    assert aioclient_mock.call_count == 1
+    await manager.async_shutdown()
+
+
+async def test_invalidated_token_is_fetched_again(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A token rejected by the API is replaced by a new one on the next call
+    """
+    aioclient_mock.post(TOKEN_URL, json={'access_token': 'token-1', 'expires_in': 3600})
+    manager: EnedisTokenManager = get_token_manager(hass)
+    token: str = await manager.async_get_token(CLIENT_ID, CLIENT_SECRET)
+    manager.invalidate(CLIENT_ID, CLIENT_SECRET, 'another-token')
+    assert await manager.async_get_token(CLIENT_ID, CLIENT_SECRET) == token
+    assert aioclient_mock.call_count == 1
+    manager.invalidate(CLIENT_ID, CLIENT_SECRET, token)
+    await manager.async_get_token(CLIENT_ID, CLIENT_SECRET)
+    assert aioclient_mock.call_count == 2
+    await manager.async_shutdown()
+
+
+async def test_response_without_token_is_an_error(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A successful response of the token endpoint without access token is an error and is not cached
+    """
+    aioclient_mock.post(TOKEN_URL, json={'token_type': 'Bearer'})
+    manager: EnedisTokenManager = get_token_manager(hass)
+    for _ in range(2):
+        with pytest.raises(CannotConnect):
+            await manager.async_get_token(CLIENT_ID, CLIENT_SECRET)
+    assert aioclient_mock.call_count == 2
+    await manager.async_shutdown()
+
+
+async def test_error_is_shared_and_not_cached(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    The callers of a failed call receive its error and the next call requests a token again
+    """
+    aioclient_mock.post(TOKEN_URL, side_effect=_slow_response(status=401))
+    manager: EnedisTokenManager = get_token_manager(hass)
+    results: list = await asyncio.gather(*(manager.async_get_token(CLIENT_ID, CLIENT_SECRET) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, InvalidClientSecret) for r in results)
+    assert aioclient_mock.call_count == 1
+    with pytest.raises(InvalidClientSecret):
+        await manager.async_get_token(CLIENT_ID, CLIENT_SECRET)
+    assert aioclient_mock.call_count == 2
+
+
+async def test_used_token_is_refreshed_before_its_expiration(hass: HomeAssistant, aioclient_mock: AiohttpClientMocker) -> None:
+    """
+    A token used since it was issued is fetched again in background before it expires
+    """
+    lifetime: int = TOKEN_EXPIRATION_MARGIN + TOKEN_REFRESH_MARGIN + 1
+    aioclient_mock.post(TOKEN_URL, json={'access_token': 'token-1', 'expires_in': lifetime})
+    manager: EnedisTokenManager = get_token_manager(hass)
+    await manager.async_get_token(CLIENT_ID, CLIENT_SECRET)
+    await asyncio.sleep(1.5)
+    await hass.async_block_till_done()
+    assert aioclient_mock.call_count == 2
+    await manager.async_shutdown()
+
+
+async def test_cancelled_caller_does_not_cancel_the_waiting_callers(hass: HomeAssistant) -> None:
+    """
+    The callers waiting for a call started by a cancelled caller still receive the token
+    """
+    manager: EnedisTokenManager = EnedisTokenManager(hass)
+    started: asyncio.Event = asyncio.Event()
+    release: asyncio.Event = asyncio.Event()
+
+    async def _async_fetch(*_) -> _CachedToken:
+        """
+        Complete the call when it is released
+        """
+        started.set()
+        await release.wait()
+        return _CachedToken('token-1', time.monotonic() + 3600)
+
+    manager._async_fetch = _async_fetch  # pylint: disable=protected-access
+    owner: asyncio.Task = asyncio.create_task(manager.async_get_token(CLIENT_ID, CLIENT_SECRET))
+    await started.wait()
+    waiter: asyncio.Task = asyncio.create_task(manager.async_get_token(CLIENT_ID, CLIENT_SECRET))
+    await asyncio.sleep(0)
+    owner.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+    release.set()
+    assert await asyncio.wait_for(waiter, 1) == 'token-1'
+    # the token fetched for the cancelled caller is cached
+    assert await manager.async_get_token(CLIENT_ID, CLIENT_SECRET) == 'token-1'
+    await manager.async_shutdown()
@@ -0,0 +1,37 @@
+"""
+Tests of the websocket commands
+"""
+from datetime import date, timedelta
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from custom_components.ha_enedis_dataconnect.const import END_DATE_KEY, PDL_KEY, SERIES_KEY, START_DATE_KEY, WEBSOCKET_HISTORY_COMMAND, EnedisSeriesEnum
+from custom_components.ha_enedis_dataconnect.coordinators import EnedisDataUpdateCoordinator
+from custom_components.ha_enedis_dataconnect.services import TIMESTAMPS_KEY, VALUES_KEY
+from custom_components.ha_enedis_dataconnect.websocket_api import async_setup_websocket_api
+
+
+async def test_history_command(hass: HomeAssistant, hass_ws_client, registered_coordinator: EnedisDataUpdateCoordinator) -> None:
+    """
+    The command returns the series of a configured PDL, an unknown PDL is not found and an invalid range is rejected
+    """
+    pdl: str = registered_coordinator.get_pdl()
+    assert await async_setup_component(hass, 'websocket_api', {})
+    async_setup_websocket_api(hass)
+    client = await hass_ws_client(hass)
+    start: date = date.today() - timedelta(days=2)
+    await client.send_json({'id': 1, 'type': WEBSOCKET_HISTORY_COMMAND, PDL_KEY: pdl, SERIES_KEY: EnedisSeriesEnum.LOAD_CURVE, START_DATE_KEY: start.isoformat()})
+    message: dict = await client.receive_json()
+    assert message['success']
+    assert message['result'][PDL_KEY] == pdl
+    # the readings of the two complete days, by half-hour
+    assert len(message['result'][TIMESTAMPS_KEY]) == len(message['result'][VALUES_KEY]) == 96
+    await client.send_json({'id': 2, 'type': WEBSOCKET_HISTORY_COMMAND, PDL_KEY: '99999999999999', SERIES_KEY: EnedisSeriesEnum.DAILY, START_DATE_KEY: start.isoformat()})
+    message = await client.receive_json()
+    assert not message['success']
+    assert message['error']['code'] == websocket_api.ERR_NOT_FOUND
+    await client.send_json({'id': 3, 'type': WEBSOCKET_HISTORY_COMMAND, PDL_KEY: pdl, SERIES_KEY: EnedisSeriesEnum.DAILY, START_DATE_KEY: date.today().isoformat(), END_DATE_KEY: start.isoformat()})
+    message = await client.receive_json()
+    assert message['error']['code'] == websocket_api.ERR_INVALID_FORMAT